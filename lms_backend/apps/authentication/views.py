@@ -1,3 +1,5 @@
+import logging
+
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
@@ -7,16 +9,15 @@ from django.contrib.auth import logout
 from .serializers import UserRegistrationSerializer, UserLoginSerializer, UserSerializer
 from .models import User
 
+logger = logging.getLogger(__name__)
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def register(request):
     # Accept common alternate field names from various clients
     incoming = request.data.copy()
-    # Temporary debug logging to diagnose client payload shape
-    try:
-        print('[AUTH][register] Raw request.data:', dict(request.data))
-    except Exception:
-        print('[AUTH][register] Raw request.data present but could not be printed')
+    # Field names only: the payload carries passwords
+    logger.debug("register payload fields: %s", sorted(request.data.keys()))
 
     # Normalize possible variants for password confirmation
     if 'password_confirm' not in incoming or not incoming.get('password_confirm'):
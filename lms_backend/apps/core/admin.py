@@ -0,0 +1,67 @@
+import io
+import os
+import pstats
+
+from django.contrib import admin
+from django.db.models import Max
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
+
+from .models import ProfileRecord
+
+
+class LatestPerRouteFilter(admin.SimpleListFilter):
+    title = 'profiles'
+    parameter_name = 'latest'
+
+    def lookups(self, request, model_admin):
+        return [('1', 'Latest per route')]
+
+    def queryset(self, request, queryset):
+        if self.value() == '1':
+            latest = queryset.values('route').annotate(latest_id=Max('id')).values('latest_id')
+            return queryset.filter(id__in=latest)
+        return queryset
+
+
+@admin.register(ProfileRecord)
+class ProfileRecordAdmin(admin.ModelAdmin):
+    list_display = ['route', 'method', 'status_code', 'duration_ms', 'trigger', 'user', 'created_at', 'download_link']
+    list_filter = [LatestPerRouteFilter, 'trigger', 'method', 'route']
+    search_fields = ['route', 'path']
+    readonly_fields = ['route', 'method', 'path', 'status_code', 'duration_ms', 'trigger', 'user',
+                       'file_path', 'created_at', 'download_link', 'top_functions']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path('<int:record_id>/download/', self.admin_site.admin_view(self.download_view),
+                 name='core_profilerecord_download'),
+        ] + super().get_urls()
+
+    def download_view(self, request, record_id):
+        record = get_object_or_404(ProfileRecord, id=record_id)
+        if not os.path.exists(record.file_path):
+            raise Http404('Profile file no longer exists')
+        return FileResponse(open(record.file_path, 'rb'), as_attachment=True,
+                            filename=os.path.basename(record.file_path))
+
+    def download_link(self, obj):
+        return format_html('<a href="{}">.prof</a>', reverse('admin:core_profilerecord_download', args=[obj.id]))
+    download_link.short_description = 'Profile'
+
+    def top_functions(self, obj):
+        """Top 25 functions by cumulative time"""
+        if not os.path.exists(obj.file_path):
+            return 'Profile file no longer exists'
+        out = io.StringIO()
+        pstats.Stats(obj.file_path, stream=out).strip_dirs().sort_stats('cumulative').print_stats(25)
+        return format_html('<pre style="font-size: 11px">{}</pre>', out.getvalue())
+    top_functions.short_description = 'Top functions (cumulative)'
@@ -0,0 +1,89 @@
+"""
+Gateway for calls to the Gemini API.
+
+Both quiz generation and PDF analysis go through ``ai_gateway``. It caches
+one configured model object per (model name, API key), times every call in
+lms_ai_call_duration_seconds and offers the same call as ``generate`` (for
+sync views and background threads) and ``agenerate`` (for async views under
+ASGI). ``agenerate`` uses the SDK's native async call when available, and a
+per-event-loop semaphore (AI_MAX_CONCURRENCY) caps the number of in-flight
+calls so a burst of requests cannot exhaust the API quota.
+"""
+import asyncio
+import threading
+import weakref
+
+from django.conf import settings
+
+from . import metrics
+from .lazy_imports import optional_module
+
+
+class AIUnavailable(Exception):
+    """No API key configured or the Gemini SDK is not installed"""
+
+
+class AIGateway:
+    def __init__(self, max_concurrency=64):
+        self.max_concurrency = max_concurrency
+        self._models = {}
+        self._semaphores = weakref.WeakKeyDictionary()  # event loop -> Semaphore
+        self._lock = threading.Lock()
+
+    def _sdk(self):
+        genai = optional_module('google.generativeai')
+        if genai is None:
+            raise AIUnavailable('google-generativeai library not installed')
+        return genai
+
+    def model(self, model_name, api_key):
+        """Configured GenerativeModel for the key; raises AIUnavailable"""
+        if not api_key:
+            raise AIUnavailable('API key not configured')
+        key = (model_name, api_key)
+        with self._lock:
+            model = self._models.get(key)
+            if model is None:
+                genai = self._sdk()
+                genai.configure(api_key=api_key)
+                model = self._models[key] = genai.GenerativeModel(model_name)
+        return model
+
+    def _config(self, generation_config):
+        if not generation_config:
+            return None
+        return self._sdk().types.GenerationConfig(**generation_config)
+
+    def generate(self, service, prompt, model_name, api_key, generation_config=None):
+        """Blocking call; returns the response text"""
+        model = self.model(model_name, api_key)
+        kwargs = {'generation_config': self._config(generation_config)} if generation_config else {}
+        with metrics.ai_call_duration.time(service=service, outcome='error') as labels:
+            text = model.generate_content(prompt, **kwargs).text
+            labels['outcome'] = 'ok'
+        return text
+
+    def _semaphore(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            semaphore = self._semaphores.get(loop)
+            if semaphore is None:
+                semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    async def agenerate(self, service, prompt, model_name, api_key, generation_config=None):
+        """Awaitable call for async views; returns the response text"""
+        model = self.model(model_name, api_key)
+        kwargs = {'generation_config': self._config(generation_config)} if generation_config else {}
+        async with self._semaphore():
+            with metrics.ai_call_duration.time(service=service, outcome='error') as labels:
+                if hasattr(model, 'generate_content_async'):
+                    response = await model.generate_content_async(prompt, **kwargs)
+                else:
+                    response = await asyncio.to_thread(model.generate_content, prompt, **kwargs)
+                text = response.text
+                labels['outcome'] = 'ok'
+        return text
+
+
+ai_gateway = AIGateway(max_concurrency=getattr(settings, 'AI_MAX_CONCURRENCY', 64))
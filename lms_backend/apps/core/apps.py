@@ -0,0 +1,16 @@
+from django.apps import AppConfig
+
+
+class CoreConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.core'
+    verbose_name = 'Core'
+
+    def ready(self):
+        from django.conf import settings
+        from .query_budget import install_query_counting, install_serializer_timing
+        install_query_counting()
+        install_serializer_timing()
+        if getattr(settings, 'LOG_QUEUE_ENABLED', False):
+            from . import log_pipeline
+            log_pipeline.install()
@@ -0,0 +1,79 @@
+"""
+Minimal API plumbing for async function views.
+
+DRF's @api_view only wraps sync views, so the async AI-bound views use
+``async_api_view`` instead. It mirrors the parts of DRF those views rely on:
+token authentication (run in a thread, it hits the database), the body
+parsed into ``request.data`` by DRF's JSON, form and multipart parsers
+(bodies without a content type are read as JSON), the 405/401 responses and
+DRF's JSON encoding.
+
+    @async_api_view(['POST'])
+    async def create_quiz(request):
+        ...
+        return api_response(data, status=201)
+"""
+import functools
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.request import Request
+from rest_framework.utils.encoders import JSONEncoder
+
+# The parsers of the DRF views these replace (DEFAULT_PARSER_CLASSES)
+PARSERS = (JSONParser, FormParser, MultiPartParser)
+
+
+def api_response(data, status=200):
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+
+
+def _authenticate(request):
+    try:
+        result = TokenAuthentication().authenticate(request)
+    except exceptions.AuthenticationFailed as e:
+        return None, str(e.detail)
+    if result is None:
+        return None, 'Authentication credentials were not provided.'
+    return result[0], None
+
+
+def _parse(request):
+    """The request body as DRF's parsers read it; raises ParseError/UnsupportedMediaType"""
+    if not request.content_type:
+        # As before, clients that send no content type send JSON
+        try:
+            return json.loads(request.body or b'{}')
+        except (ValueError, UnicodeDecodeError):
+            raise exceptions.ParseError('Request must be JSON')
+    return Request(request, parsers=[parser() for parser in PARSERS]).data
+
+
+def async_api_view(methods):
+    """Authenticated JSON API decorator for ``async def`` views"""
+    methods = [method.upper() for method in methods]
+
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return api_response({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+
+            user, error = await sync_to_async(_authenticate)(request)
+            if user is None:
+                return api_response({'detail': error}, status=401)
+            request.user = user
+
+            try:
+                request.data = await sync_to_async(_parse)(request)
+            except exceptions.APIException as e:
+                return api_response({'error': str(e.detail)}, status=e.status_code)
+            return await view(request, *args, **kwargs)
+
+        return csrf_exempt(wrapper)
+    return decorator
@@ -0,0 +1,142 @@
+"""
+Cache-aside helpers on top of Django's cache framework.
+
+Keys live in namespaces with a version number stored in the cache itself:
+``invalidate(namespace)`` bumps the version, which orphans every key of the
+namespace at once (old entries simply expire). ``get_or_set`` recomputes a
+missing value under single-flight protection: one thread per process (and,
+with a shared backend, one process) computes while the others wait for its
+result instead of stampeding the database.
+
+    data = get_or_set('quiz_sessions', 'active', build_sessions, ttl=30)
+    invalidate('quiz_sessions')
+
+    @memoize('bank_topics', ttl=300)
+    def topics_for(teacher_id): ...
+"""
+import functools
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import metrics
+
+_MISSING = object()
+_local_locks = {}
+_local_locks_guard = threading.Lock()
+
+
+def _cache():
+    return caches[getattr(settings, 'CACHE_ALIAS', 'default')]
+
+
+def _version_key(namespace):
+    return f'ns:{namespace}:version'
+
+
+def namespace_version(namespace):
+    cache = _cache()
+    version = cache.get(_version_key(namespace))
+    if version is None:
+        # Start from a time-based version so a restarted locmem cache never
+        # reuses version numbers still present in a shared cache
+        version = int(time.time() * 1000)
+        if not cache.add(_version_key(namespace), version, timeout=None):
+            version = cache.get(_version_key(namespace), version)
+    return version
+
+
+def make_key(namespace, key):
+    return f'{namespace}:v{namespace_version(namespace)}:{key}'
+
+
+def invalidate(*namespaces):
+    """Drop every cached entry of the namespaces (by bumping their versions)"""
+    cache = _cache()
+    for namespace in namespaces:
+        try:
+            cache.incr(_version_key(namespace))
+        except ValueError:
+            cache.set(_version_key(namespace), int(time.time() * 1000), timeout=None)
+
+
+class _LocalLock:
+    """Per-key lock shared by the threads of this process, dropped when unused"""
+
+    def __init__(self, key):
+        self.key = key
+
+    def __enter__(self):
+        with _local_locks_guard:
+            entry = _local_locks.setdefault(self.key, [threading.Lock(), 0])
+            entry[1] += 1
+        entry[0].acquire()
+        self.entry = entry
+
+    def __exit__(self, *exc):
+        self.entry[0].release()
+        with _local_locks_guard:
+            self.entry[1] -= 1
+            if self.entry[1] == 0:
+                _local_locks.pop(self.key, None)
+
+
+def get_or_set(namespace, key, compute, ttl=None, lock_timeout=10):
+    """Return the cached value for ``key`` or compute, store and return it.
+
+    Only one caller recomputes a missing key; concurrent callers wait for it
+    (in-process via a lock, across processes via a cache.add() lease that
+    expires after ``lock_timeout`` seconds).
+    """
+    cache = _cache()
+    full_key = make_key(namespace, key)
+    value = cache.get(full_key, _MISSING)
+    if value is not _MISSING:
+        metrics.record_cache(namespace.split(':', 1)[0], True)
+        return value
+
+    with _LocalLock(full_key):
+        value = cache.get(full_key, _MISSING)
+        if value is not _MISSING:
+            metrics.record_cache(namespace.split(':', 1)[0], True)
+            return value
+
+        lease_key = f'lease:{full_key}'
+        leased = cache.add(lease_key, 1, timeout=lock_timeout)
+        if not leased:
+            # Another process is computing; wait for its result, then give up and compute
+            deadline = time.monotonic() + lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(0.05)
+                value = cache.get(full_key, _MISSING)
+                if value is not _MISSING:
+                    metrics.record_cache(namespace.split(':', 1)[0], True)
+                    return value
+
+        metrics.record_cache(namespace.split(':', 1)[0], False)
+        try:
+            value = compute()
+            cache.set(full_key, value, timeout=ttl if ttl is not None else getattr(settings, 'CACHE_TTL', 300))
+        finally:
+            if leased:
+                cache.delete(lease_key)
+        return value
+
+
+def memoize(namespace, ttl=None, key_func=None):
+    """Cache a function's result per arguments in ``namespace``"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if key_func is not None:
+                key = key_func(*args, **kwargs)
+            else:
+                raw = repr((args, sorted(kwargs.items())))
+                key = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+            return get_or_set(namespace, f'{func.__qualname__}:{key}', lambda: func(*args, **kwargs), ttl=ttl)
+        wrapper.invalidate = lambda: invalidate(namespace)
+        return wrapper
+    return decorator
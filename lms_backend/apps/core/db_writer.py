@@ -0,0 +1,177 @@
+"""
+Serialized database writer for background threads.
+
+SQLite allows one writer at a time. Background jobs (PDF conversion, PDF
+analysis) hand their small status/result writes to a single writer thread,
+which runs whatever has queued up in one transaction, each write in its own
+savepoint. Concurrent jobs therefore share a commit instead of each taking
+the write lock. A write that raises rolls back only its savepoint. SQLite
+checks foreign keys at COMMIT, though (e.g. a segment saved for a document
+deleted meanwhile), so when the commit fails the batch is replayed one write
+per transaction and only the offending write gets the error; writes must
+therefore be plain database work that is safe to run again.
+
+SQLite's busy handler backs off to 100 ms sleeps, so a writer waiting behind
+a stream of short request transactions would rarely get the lock. With
+IMMEDIATE transactions the writer thread polls for the lock every
+millisecond instead, up to the usual busy timeout.
+
+    from apps.core.db_writer import db_writer
+    db_writer.save(document, ['conversion_status'])          # waits for the commit
+    db_writer.submit(Model.objects.filter(pk=1).update, n=2)  # returns a Future
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import OperationalError, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class DatabaseWriter:
+    """One thread that applies queued write callables in batched transactions"""
+
+    def __init__(self, using='default', max_batch=100, max_wait=0.005, lock_timeout=20, lock_poll=0.001):
+        self.using = using
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.lock_timeout = lock_timeout
+        self.lock_poll = lock_poll
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.writes = 0
+        self.replays = 0
+
+    def submit(self, func, *args, **kwargs):
+        """Queue ``func(*args, **kwargs)`` to run on the writer thread; returns a Future"""
+        future = Future()
+        self._ensure_thread()
+        self._queue.put((future, func, args, kwargs))
+        return future
+
+    def run(self, func, *args, timeout=None, **kwargs):
+        """Run a write on the writer thread and wait for its result (re-raises its error)"""
+        if threading.current_thread() is self._thread:
+            return func(*args, **kwargs)
+        return self.submit(func, *args, **kwargs).result(timeout)
+
+    def save(self, instance, update_fields=None, timeout=None):
+        """instance.save() through the writer; pass update_fields for small writes"""
+        return self.run(instance.save, update_fields=update_fields, timeout=timeout)
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+                self._thread.start()
+
+    def _next_batch(self):
+        first = self._queue.get()
+        if first is _STOP:
+            return None
+        batch = [first]
+        while len(batch) < self.max_batch:
+            try:
+                item = self._queue.get(timeout=self.max_wait)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            batch = [item for item in batch if item[0].set_running_or_notify_cancel()]
+            try:
+                self._apply(batch)
+            except Exception as e:
+                connections[self.using].close()
+                if len(batch) == 1:
+                    self._fail(batch, e)
+                    continue
+                # The commit failed (e.g. a deferred foreign key check): nothing was
+                # written, so run each write in its own transaction to find the culprit
+                logger.warning('Database writer batch of %d failed (%s); replaying writes singly', len(batch), e)
+                self.replays += 1
+                for item in batch:
+                    try:
+                        self._apply([item])
+                    except Exception as e:
+                        connections[self.using].close()
+                        self._fail([item], e)
+
+    def _fail(self, batch, error):
+        logger.error('Database writer transaction failed: %s', error)
+        for future, *_ in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    def _poll_for_lock(self, connection):
+        """Whether to poll for the write lock rather than wait in SQLite's busy handler"""
+        if connection.vendor != 'sqlite' or getattr(connection, 'transaction_mode', None) not in ('IMMEDIATE', 'EXCLUSIVE'):
+            return False
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout = 0')
+        return True
+
+    def _apply(self, batch):
+        polling = self._poll_for_lock(connections[self.using])
+        deadline = time.monotonic() + self.lock_timeout
+        while True:
+            results, begun = [], False
+            try:
+                with transaction.atomic(using=self.using):
+                    begun = True
+                    for future, func, args, kwargs in batch:
+                        try:
+                            with transaction.atomic(using=self.using):
+                                results.append((future, True, func(*args, **kwargs)))
+                        except Exception as e:
+                            results.append((future, False, e))
+                break
+            except OperationalError as e:
+                # Only BEGIN can find the lock taken; retry it shortly
+                if not polling or begun or 'locked' not in str(e) or time.monotonic() >= deadline:
+                    raise
+                time.sleep(self.lock_poll)
+        # Resolve only after the commit so callers never see uncommitted writes
+        for future, ok, value in results:
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+        self.batches += 1
+        self.writes += len(batch)
+
+    def stop(self, timeout=5):
+        """Apply queued writes and stop the thread"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+
+db_writer = DatabaseWriter(
+    max_batch=getattr(settings, 'DB_WRITER_MAX_BATCH', 100),
+    max_wait=getattr(settings, 'DB_WRITER_MAX_WAIT_MS', 5) / 1000,
+    lock_timeout=getattr(settings, 'SQLITE_BUSY_TIMEOUT_MS', 20000) / 1000,
+)
+atexit.register(db_writer.stop)
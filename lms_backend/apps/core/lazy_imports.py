@@ -0,0 +1,44 @@
+"""
+Deferred imports for heavy dependencies.
+
+google.generativeai, PyPDF2 and pyttsx3 take a noticeable share of process
+start-up, while most requests (auth, quiz listing) never touch them. Modules
+that need them call ``optional_module``/``require_module`` at the point of
+use instead of importing at module level; the import happens once, on first
+use, and is cached by Python's module system afterwards. Measure start-up
+with ``python benchmarks/import_time.py``.
+"""
+import importlib
+import threading
+
+_missing = set()
+_lock = threading.Lock()
+
+
+def require_module(name):
+    """Import ``name`` on first use.
+
+    Raises ModuleNotFoundError naming the missing package (other import
+    errors propagate unchanged).
+    """
+    try:
+        return importlib.import_module(name)
+    except ModuleNotFoundError as e:
+        if e.name not in (name, name.partition('.')[0]):
+            # Something the module itself imports is missing
+            raise
+        raise ModuleNotFoundError(
+            f"{name} is required for this feature but is not installed (see requirements.txt)", name=name,
+        ) from e
+
+
+def optional_module(name):
+    """Import ``name`` on first use, or return None if it is unavailable"""
+    if name in _missing:
+        return None
+    try:
+        return importlib.import_module(name)
+    except Exception:  # ImportError or any env-related error
+        with _lock:
+            _missing.add(name)
+        return None
@@ -0,0 +1,171 @@
+"""
+Non-blocking logging pipeline.
+
+install() moves the handlers configured in settings.LOGGING behind a bounded
+in-memory queue: loggers get a QueueHandler that only enqueues the record, and
+one background thread writes records to the real handlers (console, files).
+Request threads therefore never wait on stdout or disk. When the queue is
+full, records are dropped and counted instead of blocking.
+
+Debug records are rate limited per call site (LOG_DEBUG_RATE records per
+second), so a debug statement inside a loop cannot flood the pipeline.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+
+from django.conf import settings
+
+_STANDARD_ATTRS = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+_STOP = object()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record; ``extra={...}`` fields become top-level keys"""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket per call site for records at or below ``max_level``"""
+
+    def __init__(self, rate=10.0, burst=None, max_level=logging.DEBUG):
+        super().__init__()
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(rate, 1))
+        self.max_level = max_level
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.suppressed = 0
+
+    def filter(self, record):
+        if record.levelno > self.max_level or self.rate <= 0:
+            return True
+        site = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(site, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens < 1:
+                self._buckets[site] = (tokens, now)
+                self.suppressed += 1
+                return False
+            self._buckets[site] = (tokens - 1, now)
+        return True
+
+
+class LogDispatcher:
+    """Single background thread that hands queued records to their target handlers"""
+
+    def __init__(self, maxsize=10000):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='log-dispatcher', daemon=True)
+                self._thread.start()
+
+    def put(self, handlers, record):
+        try:
+            self.queue.put_nowait((handlers, record))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                return
+            handlers, record = item
+            for handler in handlers:
+                if record.levelno >= handler.level:
+                    try:
+                        handler.handle(record)
+                    except Exception:
+                        handler.handleError(record)
+
+    def stop(self, timeout=5):
+        """Flush queued records and stop the thread"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        try:
+            self.queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        thread.join(timeout)
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+    """Enqueue records for ``targets``; formatting and I/O happen on the dispatcher thread"""
+
+    def __init__(self, dispatcher, targets):
+        super().__init__(dispatcher.queue)
+        self.dispatcher = dispatcher
+        self.targets = tuple(targets)
+
+    def enqueue(self, record):
+        self.dispatcher.put(self.targets, record)
+
+    def prepare(self, record):
+        # Same process: only resolve the message (args may be mutated later)
+        # and render the traceback while the frames are still alive
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+dispatcher = None
+debug_rate_limit = None
+
+
+def install():
+    """Put every configured logger's handlers behind the queue (idempotent)"""
+    global dispatcher, debug_rate_limit
+    if dispatcher is not None:
+        return dispatcher
+
+    dispatcher = LogDispatcher(maxsize=getattr(settings, 'LOG_QUEUE_SIZE', 10000))
+    debug_rate_limit = RateLimitFilter(rate=getattr(settings, 'LOG_DEBUG_RATE', 10))
+
+    names = ['', 'django', 'django.server'] + list(getattr(settings, 'LOGGING', {}).get('loggers', {}))
+    for name in names:
+        logger = logging.getLogger(name)
+        targets = [h for h in logger.handlers if not isinstance(h, logging.handlers.QueueHandler)]
+        if not targets:
+            continue
+        handler = QueueHandler(dispatcher, targets)
+        handler.addFilter(debug_rate_limit)
+        for target in targets:
+            logger.removeHandler(target)
+        logger.addHandler(handler)
+
+    dispatcher.start()
+    atexit.register(dispatcher.stop)
+    return dispatcher
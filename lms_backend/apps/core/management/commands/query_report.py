@@ -0,0 +1,80 @@
+"""
+Management command to summarize the per-request query statistics
+collected by QueryBudgetMiddleware (QUERY_STATS_FILE)
+"""
+import json
+import math
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+class Command(BaseCommand):
+    help = 'Print p50/p95 query counts and latency per endpoint from the query stats log'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=None, help='Stats file (default: QUERY_STATS_FILE setting)')
+        parser.add_argument('--hours', type=float, default=None, help='Only include the last N hours')
+        parser.add_argument('--sort', choices=['queries', 'latency', 'count'], default='queries',
+                            help='Sort endpoints by p95 queries, p95 latency or request count')
+
+    def handle(self, *args, **options):
+        path = options['file'] or settings.QUERY_STATS_FILE
+        since = time.time() - options['hours'] * 3600 if options['hours'] else None
+
+        endpoints = defaultdict(list)
+        try:
+            with open(path, encoding='utf-8') as stats_file:
+                for line in stats_file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if since and entry.get('ts', 0) < since:
+                        continue
+                    endpoints[(entry['method'], entry['route'])].append(entry)
+        except FileNotFoundError:
+            raise CommandError(f'No query stats found at {path}')
+
+        if not endpoints:
+            self.stdout.write(self.style.SUCCESS('No requests recorded.'))
+            return
+
+        max_queries = settings.QUERY_BUDGET.get('max_queries', 50)
+        max_db_ms = settings.QUERY_BUDGET.get('max_db_ms', 500)
+        rows = []
+        for (method, route), entries in endpoints.items():
+            queries = [e['queries'] for e in entries]
+            latency = [e['total_ms'] for e in entries]
+            rows.append({
+                'endpoint': f'{method} /{route.lstrip("/")}',
+                'count': len(entries),
+                'q50': percentile(queries, 50),
+                'q95': percentile(queries, 95),
+                'ms50': percentile(latency, 50),
+                'ms95': percentile(latency, 95),
+                'db95': percentile([e['db_ms'] for e in entries], 95),
+                'ser95': percentile([e.get('serializer_ms', 0) for e in entries], 95),
+                'over': sum(1 for e in entries if e['queries'] > max_queries or e['db_ms'] > max_db_ms),
+            })
+
+        sort_key = {'queries': 'q95', 'latency': 'ms95', 'count': 'count'}[options['sort']]
+        rows.sort(key=lambda r: r[sort_key], reverse=True)
+
+        width = max(len(r['endpoint']) for r in rows)
+        header = (f"{'endpoint':<{width}}  {'reqs':>6}  {'q p50':>6}  {'q p95':>6}  "
+                  f"{'ms p50':>8}  {'ms p95':>8}  {'db p95':>8}  {'ser p95':>8}  {'over':>5}")
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for r in rows:
+            line = (f"{r['endpoint']:<{width}}  {r['count']:>6}  {r['q50']:>6}  {r['q95']:>6}  "
+                    f"{r['ms50']:>8.1f}  {r['ms95']:>8.1f}  {r['db95']:>8.1f}  {r['ser95']:>8.1f}  {r['over']:>5}")
+            self.stdout.write(self.style.WARNING(line) if r['over'] else line)
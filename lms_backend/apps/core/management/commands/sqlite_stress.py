@@ -0,0 +1,144 @@
+"""
+Management command to stress the SQLite configuration with concurrent writers.
+
+Runs request-style writers (read-then-write transactions), background-job
+writers (through the serialized DatabaseWriter) and readers against a scratch
+copy of the configured database settings, then reports throughput and
+"database is locked" errors. Use --baseline to run the same load with
+SQLite's default settings and direct background writes for comparison.
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections, transaction
+
+from apps.core.db_writer import DatabaseWriter
+
+ALIAS = 'sqlite_stress'
+
+
+class Command(BaseCommand):
+    help = 'Concurrent read/write stress test of the SQLite settings; fails on lock errors'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=10, help='Test duration')
+        parser.add_argument('--request-threads', type=int, default=8, help='Request-style writer threads')
+        parser.add_argument('--job-threads', type=int, default=4, help='Background-job writer threads')
+        parser.add_argument('--readers', type=int, default=4, help='Reader threads')
+        parser.add_argument('--target', type=float, default=200, help='Minimum committed writes per second')
+        parser.add_argument('--baseline', action='store_true',
+                            help='Default SQLite options and direct background writes')
+
+    def handle(self, *args, **options):
+        default = connections.settings['default']
+        if default['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('sqlite_stress only applies to the sqlite3 backend')
+
+        workdir = tempfile.mkdtemp(prefix='sqlite_stress_')
+        config = dict(default, NAME=os.path.join(workdir, 'stress.sqlite3'))
+        if options['baseline']:
+            config['OPTIONS'] = {}
+        connections.settings[ALIAS] = config
+
+        writer = None if options['baseline'] else DatabaseWriter(using=ALIAS)
+        try:
+            self.setup_tables()
+            stats = self.run_load(options, writer)
+        finally:
+            if writer is not None:
+                writer.stop()
+            connections[ALIAS].close()
+            del connections.settings[ALIAS]
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        self.report(stats, options)
+
+    def setup_tables(self):
+        with connections[ALIAS].cursor() as cursor:
+            cursor.execute('CREATE TABLE counter (id INTEGER PRIMARY KEY, hits INTEGER NOT NULL)')
+            cursor.execute('CREATE TABLE event (id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT, payload TEXT)')
+            cursor.executemany('INSERT INTO counter (id, hits) VALUES (%s, 0)', [(i,) for i in range(100)])
+
+    def run_load(self, options, writer):
+        stats = defaultdict(lambda: {'ops': 0, 'locked': 0, 'errors': 0, 'latency': []})
+        lock = threading.Lock()
+        deadline = time.monotonic() + options['seconds']
+
+        def request_write(n):
+            # Read-then-write: the pattern that fails lock upgrades under DEFERRED transactions
+            with transaction.atomic(using=ALIAS):
+                with connections[ALIAS].cursor() as cursor:
+                    cursor.execute('SELECT hits FROM counter WHERE id = %s', [n % 100])
+                    hits = cursor.fetchone()[0]
+                    cursor.execute('UPDATE counter SET hits = %s WHERE id = %s', [hits + 1, n % 100])
+                    cursor.execute('INSERT INTO event (kind, payload) VALUES (%s, %s)', ['request', 'x' * 200])
+
+        def job_write(n):
+            def write():
+                with connections[ALIAS].cursor() as cursor:
+                    cursor.execute('INSERT INTO event (kind, payload) VALUES (%s, %s)', ['job', 'y' * 200])
+            if writer is None:
+                with transaction.atomic(using=ALIAS):
+                    write()
+            else:
+                writer.run(write)
+
+        def read(n):
+            with connections[ALIAS].cursor() as cursor:
+                cursor.execute('SELECT kind, COUNT(*) FROM event GROUP BY kind')
+                cursor.fetchall()
+
+        def worker(kind, op):
+            local = {'ops': 0, 'locked': 0, 'errors': 0, 'latency': []}
+            n = 0
+            while time.monotonic() < deadline:
+                n += 1
+                start = time.perf_counter()
+                try:
+                    op(n)
+                    local['ops'] += 1
+                    local['latency'].append(time.perf_counter() - start)
+                except OperationalError as e:
+                    local['locked' if 'locked' in str(e) else 'errors'] += 1
+            connections[ALIAS].close()
+            with lock:
+                for key in ('ops', 'locked', 'errors'):
+                    stats[kind][key] += local[key]
+                stats[kind]['latency'].extend(local['latency'])
+
+        threads = (
+            [threading.Thread(target=worker, args=('request', request_write)) for _ in range(options['request_threads'])]
+            + [threading.Thread(target=worker, args=('job', job_write)) for _ in range(options['job_threads'])]
+            + [threading.Thread(target=worker, args=('read', read)) for _ in range(options['readers'])]
+        )
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return stats
+
+    def report(self, stats, options):
+        seconds = options['seconds']
+        mode = 'baseline (default SQLite settings)' if options['baseline'] else 'configured settings'
+        self.stdout.write(f'SQLite stress test, {mode}, {seconds:g}s')
+        self.stdout.write(f"{'kind':<8}  {'ops':>8}  {'ops/s':>8}  {'p95 ms':>8}  {'locked':>7}  {'errors':>7}")
+        for kind in ('request', 'job', 'read'):
+            s = stats[kind]
+            latency = sorted(s['latency'])
+            p95 = latency[max(0, int(len(latency) * 0.95) - 1)] * 1000 if latency else 0.0
+            self.stdout.write(f"{kind:<8}  {s['ops']:>8}  {s['ops'] / seconds:>8.1f}  {p95:>8.1f}  "
+                              f"{s['locked']:>7}  {s['errors']:>7}")
+
+        writes_per_second = (stats['request']['ops'] + stats['job']['ops']) / seconds
+        locked = sum(s['locked'] for s in stats.values())
+        if locked:
+            raise CommandError(f'{locked} "database is locked" errors')
+        if writes_per_second < options['target']:
+            raise CommandError(f'{writes_per_second:.1f} writes/s is below the target of {options["target"]:g}')
+        self.stdout.write(self.style.SUCCESS(
+            f'No lock errors; {writes_per_second:.1f} writes/s (target {options["target"]:g})'))
@@ -0,0 +1,311 @@
+"""
+In-process metrics exposed in the Prometheus text format at /metrics.
+
+Counters, gauges and histograms are plain dicts keyed by label values and
+guarded by one lock per metric, so recording a sample is a dict update under
+an uncontended lock. Gauges that describe database state (live rooms, job
+queue depth) are refreshed by collectors when /metrics is scraped rather than
+on every write. Values are per process: with several worker processes each
+one is scraped (or aggregated) separately.
+"""
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+JOB_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+AI_BUCKETS = (0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{_escape(extra[1])}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def samples(self):
+        """(suffix, label_values, extra_label, value) tuples"""
+        with self._lock:
+            return [('', key, None, value) for key, value in self._values.items()]
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for suffix, key, extra, value in self.samples():
+            lines.append(f'{self.name}{suffix}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}')
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts plus +Inf, sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with-block; labels may be updated inside it"""
+        start = time.perf_counter()
+        try:
+            yield labels
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            snapshot = [(key, list(state[0]), state[1], state[2]) for key, state in self._values.items()]
+        samples = []
+        for key, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                samples.append(('_bucket', key, ('le', _format_value(float(bound))), cumulative))
+            samples.append(('_sum', key, None, round(total, 6)))
+            samples.append(('_count', key, None, count))
+        return samples
+
+
+class Registry:
+    """Holds metrics in registration order plus scrape-time collectors"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f'Metric {metric.name} is already registered')
+            self._metrics[metric.name] = metric
+        return metric
+
+    def register_collector(self, func):
+        """Register a callable run before each scrape (e.g. to refresh gauges)"""
+        with self._lock:
+            self._collectors.append(func)
+        return func
+
+    def render(self):
+        for collector in list(self._collectors):
+            try:
+                collector()
+            except Exception:
+                logger.exception('Metrics collector %s failed', getattr(collector, '__name__', collector))
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def counter(name, documentation, labelnames=()):
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name, documentation, labelnames=()):
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# HTTP
+http_request_duration = histogram(
+    'lms_http_request_duration_seconds', 'HTTP request latency by route', ['method', 'route'])
+http_requests = counter(
+    'lms_http_requests_total', 'HTTP requests by route and status class', ['method', 'route', 'status'])
+
+# Live quiz rooms
+live_rooms = gauge('lms_live_rooms', 'Active live quiz rooms')
+live_participants = gauge('lms_live_participants', 'Participants in active live quiz rooms')
+
+# Background jobs
+job_queue_depth = gauge('lms_job_queue_depth', 'Background jobs waiting or running', ['queue', 'state'])
+job_duration = histogram(
+    'lms_job_duration_seconds', 'Background job run time', ['queue', 'outcome'], buckets=JOB_BUCKETS)
+job_queue_wait = histogram(
+    'lms_job_queue_wait_seconds', 'Time from enqueue to a worker claiming the job', ['queue'], buckets=JOB_BUCKETS)
+
+# Text-to-speech worker processes
+tts_workers = gauge('lms_tts_workers', 'TTS worker processes by state', ['state'])
+tts_worker_restarts = counter('lms_tts_worker_restarts_total', 'TTS worker restarts by reason', ['reason'])
+
+# AI calls
+ai_call_duration = histogram(
+    'lms_ai_call_duration_seconds', 'Latency of calls to the AI model', ['service', 'outcome'], buckets=AI_BUCKETS)
+
+# Errors and fallbacks
+errors = counter('lms_errors_total', 'Handled errors by component', ['component'])
+fallbacks = counter('lms_fallbacks_total', 'Times a degraded fallback path was used', ['kind'])
+
+# Caches
+cache_requests = counter('lms_cache_requests_total', 'Cache lookups by result', ['cache', 'result'])
+cache_hit_ratio = gauge('lms_cache_hit_ratio', 'Cache hits / lookups since process start', ['cache'])
+
+
+def record_cache(cache, hit):
+    cache_requests.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+@REGISTRY.register_collector
+def collect_cache_ratios():
+    lookups = {}
+    for _, (cache, result), _, value in cache_requests.samples():
+        hits, total = lookups.get(cache, (0, 0))
+        lookups[cache] = (hits + (value if result == 'hit' else 0), total + value)
+    for cache, (hits, total) in lookups.items():
+        cache_hit_ratio.set(round(hits / total, 4) if total else 0.0, cache=cache)
+
+
+@REGISTRY.register_collector
+def collect_database_gauges():
+    """Live room and job queue gauges, read from the database at scrape time"""
+    from django.apps import apps
+    from django.db.models import Count
+
+    LiveQuizSession = apps.get_model('quiz_system', 'LiveQuizSession')
+    LiveParticipant = apps.get_model('quiz_system', 'LiveParticipant')
+    live_rooms.set(LiveQuizSession.objects.filter(is_active=True).count())
+    live_participants.set(LiveParticipant.objects.filter(session__is_active=True).count())
+
+    queues = [
+        ('pdf_conversion', apps.get_model('pdf_converter', 'ConversionJob'), 'status', ['queued', 'running']),
+        ('pdf_analysis', apps.get_model('pdf_analyzer', 'AnalysisRequest'), 'status', ['queued', 'processing']),
+    ]
+    for queue, model, field, states in queues:
+        counts = dict(
+            model.objects.filter(**{f'{field}__in': states}).values_list(field).annotate(n=Count('pk'))
+        )
+        for state in states:
+            job_queue_depth.set(counts.get(state, 0), queue=queue, state=state)
+
+
+class MetricsMiddleware:
+    """Record request latency per URL pattern (not per path, to bound label cardinality)"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'METRICS_ENABLED', True)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        status_code = 500
+        try:
+            response = self.get_response(request)
+            status_code = response.status_code
+            return response
+        finally:
+            self.record(request, start, status_code)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+
+        start = time.perf_counter()
+        status_code = 500
+        try:
+            response = await self.get_response(request)
+            status_code = response.status_code
+            return response
+        finally:
+            self.record(request, start, status_code)
+
+    def record(self, request, start, status_code):
+        match = getattr(request, 'resolver_match', None)
+        route = match.route if match is not None and match.route else 'unmatched'
+        http_request_duration.observe(time.perf_counter() - start, method=request.method, route=route)
+        http_requests.inc(method=request.method, route=route, status=f'{status_code // 100}xx')
@@ -0,0 +1,29 @@
+from django.db import models
+from django.contrib.auth import get_user_model
+
+User = get_user_model()
+
+
+class ProfileRecord(models.Model):
+    """A cProfile dump of one request, written by ProfilingMiddleware"""
+    TRIGGER_CHOICES = [
+        ('requested', 'Requested'),
+        ('sampled', 'Sampled'),
+    ]
+
+    route = models.CharField(max_length=255)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    status_code = models.IntegerField()
+    duration_ms = models.FloatField()
+    trigger = models.CharField(max_length=10, choices=TRIGGER_CHOICES)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    file_path = models.CharField(max_length=500)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.method} {self.route} ({self.duration_ms:.0f} ms)"
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['route', '-created_at'], name='profile_route_created_idx')]
@@ -0,0 +1,162 @@
+"""
+On-demand and sampled request profiling.
+
+ProfilingMiddleware runs a request under cProfile when a staff user asks for
+it (``X-Profile: 1`` header or ``?profile=1``) or, with PROFILE_SAMPLE_EVERY
+set to N, for one in every N API requests. The profile is dumped in pstats
+format (open it with snakeviz, gprof2dot or ``python -m pstats``) under
+PROFILE_DIR and recorded as a ProfileRecord, browsable per route in the admin.
+Only PROFILE_KEEP_PER_ROUTE profiles are kept for each route.
+"""
+import cProfile
+import itertools
+import logging
+import os
+import re
+import threading
+import time
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_SLUG_RE = re.compile(r'[^A-Za-z0-9]+')
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _request_user(request):
+    """Session user, or the DRF token user (token auth runs later, in the view)"""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user
+    from rest_framework.authentication import TokenAuthentication
+    from rest_framework.exceptions import AuthenticationFailed
+    try:
+        result = TokenAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+
+def _profile_requested(request):
+    return request.headers.get('X-Profile') == '1' or request.GET.get('profile') == '1'
+
+
+def is_profiling_allowed(user):
+    return user is not None and (user.is_staff or getattr(user, 'user_type', None) == 'admin')
+
+
+def profile_path(route, method):
+    slug = _SLUG_RE.sub('_', route).strip('_') or 'root'
+    stamp = timezone.now().strftime('%Y%m%dT%H%M%S%f')
+    directory = os.path.join(_setting('PROFILE_DIR', 'profiles'), slug)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f'{stamp}-{method.lower()}.prof')
+
+
+def prune_profiles(route, keep):
+    """Delete all but the newest ``keep`` profiles of a route (rows and files)"""
+    from .models import ProfileRecord
+    stale = list(ProfileRecord.objects.filter(route=route).order_by('-created_at')
+                 .values_list('id', 'file_path')[keep:])
+    for _, file_path in stale:
+        try:
+            os.unlink(file_path)
+        except FileNotFoundError:
+            pass
+    ProfileRecord.objects.filter(id__in=[pk for pk, _ in stale]).delete()
+
+
+class ProfilingMiddleware:
+    """Profile staff-requested or sampled requests with cProfile"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_every = _setting('PROFILE_SAMPLE_EVERY', 0)
+        self.prefixes = tuple(_setting('PROFILE_PATH_PREFIXES', ['/api/']))
+        self._counter = itertools.count(1)
+        # cProfile hooks the interpreter; one profiled request at a time keeps overhead bounded
+        self._active = threading.Lock()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _trigger(self, request):
+        if _profile_requested(request):
+            user = _request_user(request)
+            if is_profiling_allowed(user):
+                return 'requested', user
+            return None, None
+        if self.sample_every and request.path.startswith(self.prefixes):
+            if next(self._counter) % self.sample_every == 0:
+                return 'sampled', None
+        return None, None
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        trigger, user = self._trigger(request)
+        if trigger is None or not self._active.acquire(blocking=False):
+            return self.get_response(request)
+        return self._profile(request, trigger, user, self.get_response)
+
+    async def __acall__(self, request):
+        # Token lookup touches the database: only leave the event loop for it
+        # when a profile was asked for
+        if _profile_requested(request):
+            trigger, user = await sync_to_async(self._trigger)(request)
+        else:
+            trigger, user = self._trigger(request)
+        if trigger is None or not self._active.acquire(blocking=False):
+            return await self.get_response(request)
+        # cProfile only sees its own thread, so the profiled request runs the
+        # rest of the chain from a worker thread: sync views and sync_to_async
+        # calls run on that thread, as when Django adapted this middleware
+        return await sync_to_async(self._profile)(request, trigger, user, async_to_sync(self.get_response))
+
+    def _profile(self, request, trigger, user, get_response):
+        """Run get_response under cProfile and save the profile; the caller holds _active"""
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            profiler.enable()
+            try:
+                response = get_response(request)
+            finally:
+                profiler.disable()
+        finally:
+            self._active.release()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        try:
+            self.save(request, response, profiler, elapsed_ms, trigger, user)
+        except Exception:
+            logger.exception('Failed to save profile for %s', request.path)
+        return response
+
+    def save(self, request, response, profiler, elapsed_ms, trigger, user):
+        from .models import ProfileRecord
+        from .query_budget import route_name
+
+        route = route_name(request)
+        file_path = profile_path(route, request.method)
+        profiler.dump_stats(file_path)
+        record = ProfileRecord.objects.create(
+            route=route,
+            method=request.method,
+            path=request.get_full_path()[:500],
+            status_code=response.status_code,
+            duration_ms=round(elapsed_ms, 2),
+            trigger=trigger,
+            user=user,
+            file_path=file_path,
+        )
+        prune_profiles(route, _setting('PROFILE_KEEP_PER_ROUTE', 20))
+        if trigger == 'requested':
+            response['X-Profile-Id'] = str(record.id)
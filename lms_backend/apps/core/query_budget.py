@@ -0,0 +1,199 @@
+"""
+Per-request query budget instrumentation.
+
+QueryBudgetMiddleware counts the SQL queries a request runs, their total time
+and repeated statements (N+1 fingerprints), plus the time spent in DRF
+serializers. Every request is written as one JSON line to the
+'apps.core.query_stats' logger (read back by the query_report management
+command), and requests over the configured budget are logged as warnings.
+"""
+import contextvars
+import hashlib
+import json
+import logging
+import re
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+stats_logger = logging.getLogger('apps.core.query_stats')
+budget_logger = logging.getLogger('apps.core.query_budget')
+
+_IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+_current_stats = contextvars.ContextVar('query_budget_stats', default=None)
+
+
+def _budget(name, default):
+    return getattr(settings, 'QUERY_BUDGET', {}).get(name, default)
+
+
+def fingerprint(sql):
+    """Stable short id for a statement shape (IN lists of any length collapse)"""
+    normalized = _IN_LIST_RE.sub('IN (...)', sql)
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:12], normalized
+
+
+class RequestStats:
+    """Query and serializer counters for one request"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+        self.statements = Counter()
+        self.samples = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        """Execute wrapper hook (see install_query_counting)"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+            key, normalized = fingerprint(sql)
+            self.statements[key] += 1
+            self.samples.setdefault(key, normalized)
+
+    def duplicates(self, limit=5):
+        return [
+            {'fingerprint': key, 'count': count, 'sql': self.samples[key][:300]}
+            for key, count in self.statements.most_common(limit) if count > 1
+        ]
+
+
+def install_serializer_timing():
+    """Wrap BaseSerializer.data so serializer time is attributed to the current request.
+
+    ListSerializer and Serializer both reach BaseSerializer.data through
+    super(), so nested evaluation is only counted once.
+    """
+    from rest_framework.serializers import BaseSerializer
+
+    original = BaseSerializer.data
+    if getattr(original, '_query_budget_wrapped', False):
+        return
+
+    def data(self):
+        stats = _current_stats.get()
+        if stats is None:
+            return original.fget(self)
+        stats.serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            return original.fget(self)
+        finally:
+            stats.serializer_depth -= 1
+            if stats.serializer_depth == 0:
+                stats.serializer_time += time.perf_counter() - start
+
+    wrapped = property(data)
+    wrapped.fget._query_budget_wrapped = True
+    BaseSerializer.data = wrapped
+
+
+def _execute_hook(execute, sql, params, many, context):
+    stats = _current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats(execute, sql, params, many, context)
+
+
+def _add_execute_hook(sender, connection, **kwargs):
+    if _execute_hook not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute_hook)
+
+
+def install_query_counting():
+    """Count queries on every connection, whichever thread it belongs to.
+
+    Each new connection gets an execute wrapper that adds to the current
+    request's stats (a context variable, so it follows the request into
+    sync_to_async threads and is absent outside requests).
+    """
+    connection_created.connect(_add_execute_hook, dispatch_uid='query_budget_execute_hook')
+    for conn in connections.all(initialized_only=True):
+        _add_execute_hook(None, conn)
+
+
+def route_name(request):
+    """URL pattern of the resolved view (e.g. 'api/quiz/<uuid:quiz_id>/'), or the path"""
+    match = getattr(request, 'resolver_match', None)
+    if match is not None and match.route:
+        return match.route
+    return request.path
+
+
+class QueryBudgetMiddleware:
+    """Record per-request query counts and flag views that exceed the budget"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'QUERY_STATS_ENABLED', True)
+        self.prefixes = tuple(_budget('path_prefixes', ['/api/']))
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled or not request.path.startswith(self.prefixes):
+            return self.get_response(request)
+
+        stats = RequestStats()
+        token = _current_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_stats.reset(token)
+        self.record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        if not self.enabled or not request.path.startswith(self.prefixes):
+            return await self.get_response(request)
+
+        # Sync views and sync_to_async calls run in worker threads; the
+        # context (and with it these stats) is copied into them
+        stats = RequestStats()
+        token = _current_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_stats.reset(token)
+        self.record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    def record(self, request, response, stats, elapsed):
+        entry = {
+            'ts': round(time.time(), 3),
+            'method': request.method,
+            'route': route_name(request),
+            'path': request.path,
+            'status': response.status_code,
+            'queries': stats.queries,
+            'db_ms': round(stats.db_time * 1000, 2),
+            'serializer_ms': round(stats.serializer_time * 1000, 2),
+            'total_ms': round(elapsed * 1000, 2),
+            'duplicates': stats.duplicates(),
+        }
+        stats_logger.info(json.dumps(entry))
+
+        max_queries = _budget('max_queries', 50)
+        max_db_ms = _budget('max_db_ms', 500)
+        if stats.queries > max_queries or entry['db_ms'] > max_db_ms:
+            budget_logger.warning(
+                "Query budget exceeded: %s %s ran %d queries (%.1f ms DB, budget %d queries / %d ms); "
+                "repeated statements: %s",
+                request.method, entry['route'], stats.queries, entry['db_ms'], max_queries, max_db_ms,
+                ', '.join(f"{d['fingerprint']}x{d['count']}" for d in entry['duplicates']) or 'none',
+            )
@@ -0,0 +1,330 @@
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import threading
+from types import SimpleNamespace
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.db import IntegrityError
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from rest_framework.authtoken.models import Token
+
+from apps.pdf_converter.models import ConversionJob, PDFDocument
+
+from . import log_pipeline
+from .ai_gateway import AIGateway, AIUnavailable
+from .async_api import api_response, async_api_view
+from .db_writer import DatabaseWriter
+from .lazy_imports import optional_module, require_module
+from .models import ProfileRecord
+from .profiling import ProfilingMiddleware
+from .query_budget import QueryBudgetMiddleware
+from .views import metrics
+
+User = get_user_model()
+
+
+def profile_record(route, user_id=None):
+    return ProfileRecord(route=route, method='GET', path=f'/{route}', status_code=200,
+                         duration_ms=1, trigger='sampled', user_id=user_id, file_path='')
+
+
+class DatabaseWriterTests(TransactionTestCase):
+    def setUp(self):
+        # A long batching window so the writes below share one transaction
+        self.writer = DatabaseWriter(max_wait=0.2)
+        self.user = User.objects.create_user(username='teacher', password='x', user_type='teacher')
+
+    def tearDown(self):
+        self.writer.stop()
+
+    def test_failing_write_rolls_back_only_itself(self):
+        def fail():
+            profile_record('doomed').save()
+            raise ValueError('boom')
+
+        ok = self.writer.submit(profile_record('kept').save)
+        bad = self.writer.submit(fail)
+        with self.assertRaises(ValueError):
+            bad.result(timeout=10)
+        ok.result(timeout=10)
+
+        self.assertEqual(self.writer.replays, 0)
+        self.assertEqual(list(ProfileRecord.objects.values_list('route', flat=True)), ['kept'])
+
+    def test_commit_failure_is_charged_to_the_offending_write(self):
+        # SQLite checks the foreign key only at COMMIT, failing the whole batch
+        before = self.writer.submit(profile_record('before', self.user.pk).save)
+        orphan = self.writer.submit(profile_record('orphan', user_id=self.user.pk + 1000).save)
+        after = self.writer.submit(profile_record('after').save)
+
+        with self.assertRaises(IntegrityError):
+            orphan.result(timeout=10)
+        before.result(timeout=10)
+        after.result(timeout=10)
+
+        self.assertEqual(self.writer.replays, 1)
+        self.assertEqual(sorted(ProfileRecord.objects.values_list('route', flat=True)), ['after', 'before'])
+
+    def test_lone_write_failing_at_commit_gets_the_error(self):
+        with self.assertRaises(IntegrityError):
+            self.writer.run(profile_record('orphan', user_id=self.user.pk + 1000).save, timeout=10)
+        self.assertEqual(self.writer.replays, 0)
+        self.assertFalse(ProfileRecord.objects.exists())
+        # The writer keeps working afterwards
+        self.writer.run(profile_record('next').save, timeout=10)
+        self.assertTrue(ProfileRecord.objects.filter(route='next').exists())
+
+
+@override_settings(METRICS_ENABLED=True)
+class MetricsAuthTests(TestCase):
+    def scrape(self, token=None):
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token is not None else {}
+        # The database gauges are collected at scrape time and must not fail
+        with self.assertNoLogs(level='ERROR'):
+            return metrics(RequestFactory().get('/metrics', **headers))
+
+    @override_settings(METRICS_TOKEN='', DEBUG=False)
+    def test_hidden_without_a_token_outside_debug(self):
+        self.assertEqual(self.scrape().status_code, 404)
+
+    @override_settings(METRICS_TOKEN='', DEBUG=True)
+    def test_open_without_a_token_in_debug(self):
+        owner = User.objects.create_user(username='teacher', password='x', user_type='teacher')
+        document = PDFDocument.objects.create(title='Doc', pdf_file='pdfs/doc.pdf', uploaded_by=owner)
+        ConversionJob.objects.create(document=document, owner=owner)
+
+        response = self.scrape()
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('lms_live_rooms 0', body)
+        self.assertIn('lms_job_queue_depth{queue="pdf_conversion",state="queued"} 1', body)
+
+    @override_settings(METRICS_TOKEN='s3cret', DEBUG=False)
+    def test_token_is_required_when_configured(self):
+        self.assertEqual(self.scrape().status_code, 403)
+        self.assertEqual(self.scrape('wrong').status_code, 403)
+        self.assertEqual(self.scrape('s3cret').status_code, 200)
+
+
+@async_api_view(['POST'])
+async def echo(request):
+    return api_response({'user': request.user.username, 'data': dict(request.data.items())})
+
+
+class AsyncApiViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='teacher', password='x', user_type='teacher')
+        self.token = Token.objects.create(user=self.user)
+        self.factory = RequestFactory(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def call(self, request):
+        response = async_to_sync(echo)(request)
+        return response.status_code, json.loads(response.content)
+
+    def test_method_and_authentication(self):
+        self.assertEqual(self.call(self.factory.get('/echo'))[0], 405)
+        self.assertEqual(self.call(RequestFactory().post('/echo'))[0], 401)
+        bad = RequestFactory(HTTP_AUTHORIZATION='Token nope').post('/echo')
+        self.assertEqual(self.call(bad)[0], 401)
+
+    def test_bodies_are_parsed_by_content_type(self):
+        json_body = self.factory.post('/echo', {'topic': 'Maths'}, content_type='application/json')
+        form = self.factory.post('/echo', 'topic=Maths', content_type='application/x-www-form-urlencoded')
+        multipart = self.factory.post('/echo', {'topic': 'Maths'})
+        untyped = self.factory.post('/echo', '{"topic": "Maths"}', content_type='')
+        for request in (json_body, form, multipart, untyped):
+            self.assertEqual(self.call(request), (200, {'user': 'teacher', 'data': {'topic': 'Maths'}}))
+
+    def test_unparseable_bodies_are_rejected(self):
+        malformed = self.factory.post('/echo', '{"topic"', content_type='application/json')
+        self.assertEqual(self.call(malformed)[0], 400)
+        unsupported = self.factory.post('/echo', '<topic/>', content_type='application/xml')
+        self.assertEqual(self.call(unsupported)[0], 415)
+
+
+class FakeModel:
+    def __init__(self, name):
+        self.name = name
+        self.running = self.peak = 0
+
+    def generate_content(self, prompt, **kwargs):
+        return SimpleNamespace(text=f'{self.name}: {prompt}')
+
+    async def generate_content_async(self, prompt, **kwargs):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+        return self.generate_content(prompt)
+
+
+class AIGatewayTests(SimpleTestCase):
+    def setUp(self):
+        self.gateway = AIGateway(max_concurrency=2)
+        self.sdk = SimpleNamespace(configure=mock.Mock(), GenerativeModel=FakeModel,
+                                   types=SimpleNamespace(GenerationConfig=dict))
+        patcher = mock.patch.object(self.gateway, '_sdk', return_value=self.sdk)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_models_are_configured_once_per_key(self):
+        model = self.gateway.model('gemini', 'key-1')
+        self.assertIs(self.gateway.model('gemini', 'key-1'), model)
+        self.assertIsNot(self.gateway.model('gemini', 'key-2'), model)
+        self.assertEqual(self.sdk.configure.call_count, 2)
+        with self.assertRaises(AIUnavailable):
+            self.gateway.model('gemini', '')
+
+    def test_generate(self):
+        self.assertEqual(self.gateway.generate('quiz', 'Hi', 'gemini', 'key', {'temperature': 0.1}), 'gemini: Hi')
+
+    def test_async_calls_are_capped(self):
+        async def burst():
+            return await asyncio.gather(*(self.gateway.agenerate('quiz', str(n), 'gemini', 'key') for n in range(6)))
+
+        self.assertEqual(asyncio.run(burst()), [f'gemini: {n}' for n in range(6)])
+        self.assertEqual(self.gateway.model('gemini', 'key').peak, 2)
+
+
+class LazyImportTests(SimpleTestCase):
+    def test_missing_module_is_named(self):
+        with self.assertRaisesMessage(ModuleNotFoundError, 'not_a_real_package is required'):
+            require_module('not_a_real_package')
+
+    def test_optional_module_is_none_when_missing(self):
+        self.assertIsNone(optional_module('not_a_real_package'))
+        self.assertIs(optional_module('json'), json)
+
+
+def three_queries():
+    for _ in range(3):
+        User.objects.count()
+    return HttpResponse('ok')
+
+
+async def three_queries_async(request):
+    return await sync_to_async(three_queries)()
+
+
+@override_settings(QUERY_STATS_ENABLED=True, QUERY_BUDGET={'max_queries': 2, 'max_db_ms': 10_000})
+class QueryBudgetTests(TestCase):
+    def request(self):
+        return RequestFactory().get('/api/quiz/')
+
+    def assertBudgetExceeded(self, call):
+        with self.assertLogs('apps.core.query_stats', 'INFO') as stats, \
+                self.assertLogs('apps.core.query_budget', 'WARNING') as budget:
+            self.assertEqual(call().status_code, 200)
+        entry = json.loads(stats.records[0].getMessage())
+        self.assertEqual(entry['queries'], 3)
+        self.assertEqual(entry['duplicates'][0]['count'], 3)
+        self.assertIn('ran 3 queries', budget.records[0].getMessage())
+
+    def test_sync_requests_over_budget_are_flagged(self):
+        middleware = QueryBudgetMiddleware(lambda request: three_queries())
+        self.assertBudgetExceeded(lambda: middleware(self.request()))
+
+    def test_async_requests_count_queries_in_worker_threads(self):
+        middleware = QueryBudgetMiddleware(three_queries_async)
+        self.assertBudgetExceeded(lambda: async_to_sync(middleware)(self.request()))
+
+    @override_settings(QUERY_BUDGET={'max_queries': 5, 'max_db_ms': 10_000})
+    def test_requests_within_budget_are_only_recorded(self):
+        middleware = QueryBudgetMiddleware(lambda request: three_queries())
+        with self.assertLogs('apps.core.query_stats', 'INFO'), self.assertNoLogs('apps.core.query_budget'):
+            middleware(self.request())
+
+
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        profile_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(profile_dir.cleanup)
+        profile_override = override_settings(PROFILE_DIR=profile_dir.name, PROFILE_SAMPLE_EVERY=0)
+        profile_override.enable()
+        self.addCleanup(profile_override.disable)
+        self.middleware = ProfilingMiddleware(lambda request: HttpResponse('ok'))
+
+    def request(self, user=None, **headers):
+        request = RequestFactory().get('/api/quiz/', **headers)
+        request.user = user or AnonymousUser()
+        return request
+
+    def test_requests_are_not_profiled_by_default(self):
+        response = self.middleware(self.request())
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertFalse(ProfileRecord.objects.exists())
+
+    def test_profiles_requested_by_non_staff_are_ignored(self):
+        student = User.objects.create_user(username='student', password='x', user_type='student')
+        token = Token.objects.create(user=student)
+        response = self.middleware(self.request(HTTP_X_PROFILE='1', HTTP_AUTHORIZATION=f'Token {token.key}'))
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertFalse(ProfileRecord.objects.exists())
+
+    def test_staff_can_request_a_profile(self):
+        staff = User.objects.create_user(username='staff', password='x', user_type='teacher', is_staff=True)
+        response = self.middleware(self.request(staff, HTTP_X_PROFILE='1'))
+
+        record = ProfileRecord.objects.get()
+        self.assertEqual(response['X-Profile-Id'], str(record.id))
+        self.assertEqual((record.trigger, record.user), ('requested', staff))
+        self.assertTrue(os.path.exists(record.file_path))
+
+    @override_settings(PROFILE_SAMPLE_EVERY=2)
+    def test_sampling_profiles_one_in_every_n_requests(self):
+        middleware = ProfilingMiddleware(lambda request: HttpResponse('ok'))
+        for _ in range(4):
+            middleware(self.request())
+        self.assertEqual(list(ProfileRecord.objects.values_list('trigger', flat=True)), ['sampled', 'sampled'])
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+        self.threads = set()
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+        self.threads.add(threading.current_thread().name)
+
+
+class LogPipelineTests(SimpleTestCase):
+    def setUp(self):
+        self.target = ListHandler()
+        self.dispatcher = log_pipeline.LogDispatcher(maxsize=100)
+        self.logger = logging.getLogger('apps.core.tests.log_pipeline')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.DEBUG)
+        handler = log_pipeline.QueueHandler(self.dispatcher, [self.target])
+        self.logger.addHandler(handler)
+        self.addCleanup(self.logger.removeHandler, handler)
+        self.addCleanup(self.dispatcher.stop)
+
+    def test_queued_records_are_written_on_the_dispatcher_thread_and_flushed_on_stop(self):
+        self.dispatcher.start()
+        args = ['first']
+        self.logger.info('record %s', args)
+        args[0] = 'changed'
+        for n in range(50):
+            self.logger.info('record %d', n)
+        self.dispatcher.stop()
+
+        self.assertEqual(len(self.target.lines), 51)
+        self.assertEqual(self.target.lines[0], "record ['first']")
+        self.assertEqual(self.target.lines[-1], 'record 49')
+        self.assertEqual(self.target.threads, {'log-dispatcher'})
+
+    def test_records_are_dropped_when_the_queue_is_full(self):
+        # Not started: nothing drains the queue
+        for n in range(105):
+            self.logger.info('record %d', n)
+        self.assertEqual(self.dispatcher.dropped, 5)
+        self.assertEqual(self.target.lines, [])
@@ -0,0 +1,24 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseNotFound
+
+from .metrics import REGISTRY
+
+
+def metrics(request):
+    """Prometheus scrape endpoint (text exposition format).
+
+    Requires ``Authorization: Bearer <METRICS_TOKEN>``. Without a token
+    configured the endpoint is only served with DEBUG on, and is a 404 otherwise.
+    """
+    if not getattr(settings, 'METRICS_ENABLED', True):
+        return HttpResponseNotFound()
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token and not settings.DEBUG:
+        return HttpResponseNotFound()
+    if token:
+        provided = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+        if not hmac.compare_digest(provided, token):
+            return HttpResponseForbidden()
+    return HttpResponse(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,18 @@
+from django.contrib import admin
+from .models import DocumentPage, StoredDocument
+
+
+@admin.register(StoredDocument)
+class StoredDocumentAdmin(admin.ModelAdmin):
+    list_display = ['sha256', 'size', 'extraction_status', 'page_count', 'text_chars', 'created_at']
+    list_filter = ['extraction_status', 'created_at']
+    search_fields = ['sha256']
+    readonly_fields = ['sha256', 'size', 'page_count', 'text_chars', 'text_preview', 'extraction_error', 'created_at']
+
+
+@admin.register(DocumentPage)
+class DocumentPageAdmin(admin.ModelAdmin):
+    list_display = ['document', 'number', 'status']
+    list_filter = ['status']
+    search_fields = ['document__sha256']
+    raw_id_fields = ['document']
@@ -0,0 +1,7 @@
+from django.apps import AppConfig
+
+
+class DocumentStoreConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.document_store'
+    verbose_name = 'Document Store'
@@ -0,0 +1,290 @@
+"""
+PDF text extraction in a process pool.
+
+PyPDF2 parsing is pure-Python and CPU-bound. In request or background threads,
+concurrent extractions serialize on the GIL and starve the threads serving
+requests. Extraction is therefore handed to a shared ProcessPoolExecutor sized
+by PDF_EXTRACT_WORKERS (0 runs inline). The document store (store.extract)
+runs it once per stored PDF, with ``clean`` text, for both the converter and
+the analyzer.
+
+Workers receive a file path, never the file's bytes, so nothing large is
+pickled between processes. ``local_path`` provides a path for uploads and
+for storage files that are not on local disk.
+
+    with local_path(uploaded_file) as path:
+        pages, page_count = run_extraction(path)
+
+Large documents are split into page ranges that are extracted in parallel;
+every page gets a record with its text and status. PageStream yields the
+records as they are ready, so consumers can write them out incrementally
+instead of holding the whole document (see run_extraction for a list);
+write_text streams the text to a file.
+
+This module must stay importable without Django models: worker processes
+(started with PDF_EXTRACT_START_METHOD, 'spawn' by default) import it to
+unpickle the task. Spawned workers also re-import the main module, so scripts
+that extract must keep their code under ``if __name__ == '__main__':``
+(manage.py and ASGI/WSGI servers already do).
+"""
+import atexit
+import itertools
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from apps.core.lazy_imports import require_module
+
+logger = logging.getLogger(__name__)
+
+# Raised when the pool does not produce a document's pages: a shard ran
+# past PDF_EXTRACT_TIMEOUT, or a worker died twice in a row
+POOL_ERRORS = (TimeoutError, BrokenProcessPool)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _page_text(page, clean):
+    """Text of one page, trying the extraction strategies in turn"""
+    # Strategy 1: Standard extraction
+    try:
+        page_text = page.extract_text() or ''
+    except Exception:
+        if not clean:
+            raise
+        page_text = ''
+
+    if clean:
+        # Strategy 2: Layout mode, which some PDFs need for word spacing
+        if not page_text.strip():
+            try:
+                page_text = page.extract_text(extraction_mode="layout", layout_mode_space_vertically=False) or ''
+            except Exception:
+                pass
+
+        # Remove excessive whitespace but keep structure
+        page_text = '\n'.join(line.strip() for line in page_text.split('\n') if line.strip())
+    return page_text
+
+
+def count_pages(path):
+    PyPDF2 = require_module('PyPDF2')
+    with open(path, 'rb') as pdf_file:
+        return len(PyPDF2.PdfReader(pdf_file).pages)
+
+
+def _iter_range(reader, clean, first=1, last=None):
+    """Yield page records for pages ``first``..``last`` of an open PdfReader"""
+    last = len(reader.pages) if last is None else min(last, len(reader.pages))
+    for page_num in range(first, last + 1):
+        try:
+            text = _page_text(reader.pages[page_num - 1], clean)
+        except Exception as e:
+            yield {'page': page_num, 'text': '', 'status': 'error', 'error': str(e)}
+            continue
+        yield {'page': page_num, 'text': text, 'status': 'ok' if text.strip() else 'empty'}
+
+
+def extract_pages(path, clean=True, first=1, last=None):
+    """Extract pages ``first``..``last`` (1-based, inclusive) of the PDF at ``path``.
+
+    Runs in a worker process. Returns ``(pages, page_count)``; ``pages`` has
+    one ``{'page': n, 'text': ..., 'status': ...}`` record per page in the
+    range, where status is 'ok', 'empty' (no text, e.g. a scanned page) or
+    'error' (with an 'error' message). With ``clean`` it also tries layout
+    extraction for empty pages and strips blank lines; without it, the text
+    is left as PyPDF2 returns it. The document store always extracts clean
+    text, which the converter and the analyzer share (the analyzer read raw
+    PyPDF2 output before the store).
+    """
+    PyPDF2 = require_module('PyPDF2')
+    with open(path, 'rb') as pdf_file:
+        reader = PyPDF2.PdfReader(pdf_file)
+        return list(_iter_range(reader, clean, first, last)), len(reader.pages)
+
+
+def page_ranges(page_count, shards, min_pages=1, max_pages=None):
+    """Split pages 1..page_count into about ``shards`` contiguous (first, last) ranges.
+
+    Ranges hold at least ``min_pages`` pages and, when given, at most
+    ``max_pages`` (which then wins and yields more ranges than ``shards``).
+    """
+    if page_count <= 0:
+        return []
+    size = max(min_pages, -(-page_count // max(shards, 1)))
+    if max_pages:
+        size = min(size, max_pages)
+    return [(first, min(first + size - 1, page_count)) for first in range(1, page_count + 1, size)]
+
+
+def _workers():
+    workers = getattr(settings, 'PDF_EXTRACT_WORKERS', None)
+    if workers is None:
+        return os.cpu_count() or 1
+    return workers
+
+
+def get_executor():
+    """The shared extraction pool; None when extraction runs inline"""
+    global _executor
+    if _workers() <= 0:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            context = multiprocessing.get_context(getattr(settings, 'PDF_EXTRACT_START_METHOD', 'spawn'))
+            _executor = ProcessPoolExecutor(max_workers=_workers(), mp_context=context)
+        return _executor
+
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+atexit.register(shutdown)
+
+
+def _submit(func, *args):
+    try:
+        return get_executor().submit(func, *args)
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); start a fresh pool once
+        logger.warning('PDF extraction pool was broken; restarting it')
+        shutdown()
+        return get_executor().submit(func, *args)
+
+
+class PageStream:
+    """Page records of the PDF at ``path``, in page order, produced shard by shard.
+
+    Iterating yields the records of extract_pages() one at a time. The
+    document is split into page ranges (at least PDF_EXTRACT_SHARD_MIN_PAGES
+    and at most PDF_EXTRACT_SHARD_MAX_PAGES pages, about one per worker)
+    that are extracted in parallel. Only a window of two ranges per worker is
+    in flight, so memory stays bounded by the window, not the document size.
+    Without a pool the pages are read inline, one at a time.
+
+        stream = PageStream(path)
+        for record in stream:
+            out.write(record['text'])
+
+    ``executor`` overrides the shared pool and ``shards`` its size (benchmarks).
+    """
+
+    def __init__(self, path, clean=True, executor=None, shards=None):
+        self.path = path
+        self.clean = clean
+        self.timeout = getattr(settings, 'PDF_EXTRACT_TIMEOUT', None)
+        if executor is not None:
+            self._submit = executor.submit
+        elif get_executor() is not None:
+            self._submit = _submit
+        else:
+            self._submit = None
+
+        if self._submit is None:
+            self.page_count = count_pages(path)
+        else:
+            self.page_count = self._submit(count_pages, path).result(timeout=self.timeout)
+        workers = shards or _workers()
+        self.ranges = page_ranges(
+            self.page_count, workers,
+            getattr(settings, 'PDF_EXTRACT_SHARD_MIN_PAGES', 25), getattr(settings, 'PDF_EXTRACT_SHARD_MAX_PAGES', 100),
+        )
+        self.window = max(2 * workers, 2)
+
+    def __iter__(self):
+        if self._submit is None:
+            PyPDF2 = require_module('PyPDF2')
+            with open(self.path, 'rb') as pdf_file:
+                yield from _iter_range(PyPDF2.PdfReader(pdf_file), self.clean)
+            return
+
+        ranges = iter(self.ranges)
+        pending = deque(self._submit(extract_pages, self.path, self.clean, first, last)
+                        for first, last in itertools.islice(ranges, self.window))
+        try:
+            while pending:
+                records, _ = pending.popleft().result(timeout=self.timeout)
+                next_range = next(ranges, None)
+                if next_range is not None:
+                    pending.append(self._submit(extract_pages, self.path, self.clean, *next_range))
+                # Ranges are contiguous and in order, so this keeps page order
+                yield from records
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def run_extraction(path, clean=True, executor=None, shards=None):
+    """All page records of the PDF at ``path`` as a list; returns ``(pages, page_count)``"""
+    stream = PageStream(path, clean, executor=executor, shards=shards)
+    return list(stream), stream.page_count
+
+
+def write_text(path, out, preview_chars=5000, on_page=None):
+    """Write the text of the PDF at ``path`` to the binary file ``out``, page by page.
+
+    Pages are extracted with ``clean`` and those with text are separated by
+    blank lines; ``on_page`` is called with every page record. Returns
+    ``(preview, total_chars, page_count)`` where preview is the first
+    ``preview_chars`` characters. Errors are raised.
+    """
+    stream = PageStream(path)
+    preview = []
+    preview_len = total = 0
+    for record in stream:
+        if on_page is not None:
+            on_page(record)
+        if record['status'] != 'ok':
+            continue
+        chunk = record['text'] if total == 0 else "\n\n" + record['text']
+        out.write(chunk.encode('utf-8'))
+        total += len(chunk)
+        if preview_len < preview_chars:
+            preview.append(chunk[:preview_chars - preview_len])
+            preview_len += len(preview[-1])
+    return "".join(preview), total, stream.page_count
+
+
+@contextmanager
+def local_path(file):
+    """Yield a local filesystem path for a path, FieldFile or uploaded file"""
+    if isinstance(file, (str, os.PathLike)):
+        yield os.fspath(file)
+        return
+
+    for attr in ('temporary_file_path', 'path'):
+        try:
+            value = getattr(file, attr)
+            path = value() if callable(value) else value
+        except (AttributeError, NotImplementedError, ValueError):
+            continue
+        if path and os.path.exists(path):
+            yield path
+            return
+
+    # In-memory upload or remote storage: spool to a temporary file
+    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_file:
+        try:
+            file.seek(0)
+        except Exception:
+            pass
+        shutil.copyfileobj(file, temp_file)
+    try:
+        yield temp_file.name
+    finally:
+        os.unlink(temp_file.name)
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:08
+
+import apps.document_store.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('file', models.FileField(upload_to=apps.document_store.models.blob_path)),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('text_file', models.FileField(blank=True, null=True, upload_to='store/texts/')),
+                ('text_preview', models.TextField(blank=True)),
+                ('text_chars', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
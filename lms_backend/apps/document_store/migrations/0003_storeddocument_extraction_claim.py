@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-19 08:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('document_store', '0002_storeddocument_extraction_error_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storeddocument',
+            name='extraction_started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='storeddocument',
+            name='extraction_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('extracting', 'Extracting'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+    ]
@@ -0,0 +1,70 @@
+from django.db import models
+
+
+def blob_path(instance, filename):
+    """Content-addressed location: store/ab/abcdef....pdf"""
+    return f'store/{instance.sha256[:2]}/{instance.sha256}.pdf'
+
+
+class StoredDocument(models.Model):
+    """One stored copy of a PDF, keyed by the SHA-256 of its bytes.
+
+    Every upload of the same file points at the same row, so the PDF is
+    stored and extracted once however many users upload it. Feature rows
+    (converter PDFDocument, analyzer AnalysisDocument) reference it.
+    """
+    EXTRACTION_CHOICES = [
+        ('pending', 'Pending'),
+        ('extracting', 'Extracting'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(upload_to=blob_path)
+    size = models.PositiveBigIntegerField(default=0)
+    # Extraction results, shared by every upload of this content: the page
+    # table (pages), the full text as a file and a preview of it
+    extraction_status = models.CharField(max_length=20, choices=EXTRACTION_CHOICES, default='pending')
+    extraction_error = models.TextField(blank=True)
+    # When the running extraction claimed the document (see store.extract)
+    extraction_started_at = models.DateTimeField(null=True, blank=True)
+    page_count = models.PositiveIntegerField(default=0)
+    text_file = models.FileField(upload_to='store/texts/', blank=True, null=True)
+    text_preview = models.TextField(blank=True)
+    text_chars = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.size} bytes)"
+
+    @property
+    def extracted(self):
+        return self.extraction_status in ('done', 'failed')
+
+    class Meta:
+        ordering = ['-created_at']
+
+
+class DocumentPage(models.Model):
+    """Extracted text of one page of a stored document"""
+    STATUS_CHOICES = [
+        ('ok', 'OK'),
+        ('empty', 'Empty'),
+        ('error', 'Error'),
+    ]
+
+    document = models.ForeignKey(StoredDocument, on_delete=models.CASCADE, related_name='pages')
+    number = models.PositiveIntegerField()
+    text = models.TextField(blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='ok')
+    error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"{self.document.sha256[:12]} page {self.number}"
+
+    class Meta:
+        ordering = ['document', 'number']
+        constraints = [
+            models.UniqueConstraint(fields=['document', 'number'], name='document_page_number_uniq'),
+        ]
@@ -0,0 +1,254 @@
+"""
+Content-addressed PDF storage.
+
+Uploads are hashed (SHA-256) and stored once under ``store/<ab>/<sha256>.pdf``.
+A second upload of the same bytes, by any user, gets the existing
+StoredDocument back without writing anything to disk, and the features
+built on it (text extraction, audio) can reuse what was already produced.
+
+    document, stored, created = store_referenced(
+        uploaded_file, lambda stored: PDFDocument.objects.create(..., pdf_file=stored.file.name, stored=stored)
+    )
+
+extract() then runs the text extraction once per stored PDF, whichever
+feature asks first, into a page table (DocumentPage) plus the full text as
+a file; the converter and the analyzer both read from there. The extraction
+is claimed in the database ('extracting'), so a web process and a
+conversion worker asking at the same time extract it once; the other waits.
+
+Rows that point at a StoredDocument must not delete its files themselves;
+release() removes them once the last reference is gone (release_on_delete
+connects it for a model). A dedup hit may be the document another row is
+releasing at that moment, so referencing rows are created through
+store_referenced(), which saves them only if the document still exists.
+"""
+import hashlib
+import logging
+import tempfile
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import File
+from django.db import IntegrityError, transaction
+from django.db.models import ProtectedError, Q
+from django.db.models.signals import post_delete
+from django.utils import timezone
+
+from apps.core import metrics
+from apps.core.db_writer import db_writer
+from apps.core.lazy_imports import require_module
+from .extraction import local_path, write_text
+from .models import DocumentPage, StoredDocument, blob_path
+
+logger = logging.getLogger(__name__)
+
+# Page rows are written in batches as the extraction pool returns them
+PAGE_BATCH = 100
+
+# store_referenced(): the stored document was released before the row was saved
+_RELEASED = object()
+
+
+def content_hash(file):
+    """SHA-256 hex digest of a Django File / uploaded file, read in chunks"""
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def store_file(file):
+    """Store ``file`` by content; returns ``(stored_document, created)``"""
+    sha256 = content_hash(file)
+    stored = StoredDocument.objects.filter(sha256=sha256).first()
+    if stored is not None and stored.file.storage.exists(stored.file.name):
+        metrics.record_cache('document_store', True)
+        logger.info("Upload matches stored document %s", sha256[:12])
+        return stored, False
+
+    metrics.record_cache('document_store', False)
+    if stored is not None:
+        # Row survived but the file is gone: store it again
+        stored.file.save(blob_path(stored, file.name), file, save=False)
+        stored.save(update_fields=['file'])
+        return stored, False
+
+    stored = StoredDocument(sha256=sha256, size=file.size)
+    stored.file.save(blob_path(stored, file.name), file, save=False)
+    try:
+        with transaction.atomic():
+            stored.save()
+    except IntegrityError:
+        # A concurrent upload of the same content won; use its copy
+        stored.file.delete(save=False)
+        return StoredDocument.objects.get(sha256=sha256), False
+    return stored, True
+
+
+def _reference(stored, create):
+    with transaction.atomic():
+        # Locks the row where the database can, so release() waits for the reference
+        if not StoredDocument.objects.select_for_update().filter(pk=stored.pk).exists():
+            return _RELEASED
+        return create(stored)
+
+
+def store_referenced(file, create, prepare=None):
+    """Store ``file`` and save the row that references it; returns ``(row, stored, created)``.
+
+    ``create(stored)`` saves the row. It runs on the writer, in the same
+    transaction as a check that the stored document still exists, so a
+    concurrent release() of a deduplicated document cannot delete it before
+    the row is saved; if it already has, the file is stored again.
+    ``prepare(stored)`` (e.g. extract) runs first and returns the document to
+    reference; if it raises, a document this call created is released.
+    """
+    while True:
+        stored, created = store_file(file)
+        if prepare is not None:
+            try:
+                stored = prepare(stored)
+            except Exception:
+                if created:
+                    release(stored.id)
+                raise
+        row = db_writer.run(_reference, stored, create)
+        if row is not _RELEASED:
+            return row, stored, created
+        logger.info("Stored document %s was released meanwhile; storing it again", stored.sha256[:12])
+
+
+def _flush_pages(batch):
+    if batch:
+        db_writer.run(DocumentPage.objects.bulk_create, list(batch), ignore_conflicts=True)
+        batch.clear()
+
+
+def _claimable(now):
+    """Documents whose extraction can be claimed: pending ones, and claims older than
+    PDF_EXTRACT_CLAIM_SECONDS (their extraction died with its process)"""
+    stale = now - timedelta(seconds=getattr(settings, 'PDF_EXTRACT_CLAIM_SECONDS', 1800))
+    return Q(extraction_status='pending') | Q(extraction_status='extracting', extraction_started_at__lt=stale)
+
+
+def _claim_extraction(stored):
+    """Mark the document 'extracting' for this caller; returns the claim time, or None if taken"""
+    now = timezone.now()
+    claimed = StoredDocument.objects.filter(_claimable(now), pk=stored.pk) \
+        .update(extraction_status='extracting', extraction_started_at=now)
+    return now if claimed else None
+
+
+def _finish_extraction(stored, claimed_at, **fields):
+    """Record the extraction's outcome if the claim is still ours; returns whether it was"""
+    return bool(StoredDocument.objects.filter(
+        pk=stored.pk, extraction_status='extracting', extraction_started_at=claimed_at
+    ).update(**fields))
+
+
+def extract(stored):
+    """Extract the stored PDF's text if that has not been done; returns ``stored``.
+
+    Writes a DocumentPage per page (clean text, see extract_pages), the full
+    text to text_file and the first PDF_TEXT_PREVIEW_CHARS characters to
+    text_preview. Unreadable PDFs are marked 'failed' with the reason. Other
+    errors are raised without recording anything, so the next call tries again.
+    While another process or thread extracts the document, this waits for it
+    (polling every PDF_EXTRACT_CLAIM_POLL seconds).
+    """
+    poll = getattr(settings, 'PDF_EXTRACT_CLAIM_POLL', 0.5)
+    while not stored.extracted:
+        # Waiting is read-only; only a claimable document costs a write
+        if StoredDocument.objects.filter(_claimable(timezone.now()), pk=stored.pk).exists():
+            claimed_at = db_writer.run(_claim_extraction, stored)
+            if claimed_at is not None:
+                return _extract_claimed(stored, claimed_at)
+        time.sleep(poll)
+        stored.refresh_from_db()
+    return stored
+
+
+def _extract_claimed(stored, claimed_at):
+    PyPDF2 = require_module('PyPDF2')
+    batch, failed = [], []
+
+    def on_page(record):
+        if record['status'] == 'error':
+            failed.append(record['page'])
+        batch.append(DocumentPage(
+            document=stored, number=record['page'], text=record['text'],
+            status=record['status'], error=record.get('error', ''),
+        ))
+        if len(batch) >= PAGE_BATCH:
+            _flush_pages(batch)
+
+    try:
+        # Leftovers of an interrupted extraction
+        db_writer.run(stored.pages.all().delete)
+        with local_path(stored.file) as path, tempfile.TemporaryFile() as text_out:
+            preview, total_chars, page_count = write_text(
+                path, text_out, getattr(settings, 'PDF_TEXT_PREVIEW_CHARS', 5000), on_page
+            )
+            _flush_pages(batch)
+            text_out.seek(0)
+            stored.text_file.save(f"{stored.sha256}.txt", File(text_out), save=False)
+    except PyPDF2.errors.PdfReadError as e:
+        logger.warning("Stored document %s is not a readable PDF: %s", stored.sha256[:12], e)
+        db_writer.run(_finish_extraction, stored, claimed_at, extraction_status='failed', extraction_error=str(e))
+        stored.refresh_from_db()
+        return stored
+    except BaseException:
+        # Not recorded: give the claim back so the next call tries again
+        db_writer.run(_finish_extraction, stored, claimed_at, extraction_status='pending')
+        raise
+
+    if failed:
+        logger.warning("Could not extract text from pages %s of %s", failed, stored.sha256[:12])
+    finished = db_writer.run(
+        _finish_extraction, stored, claimed_at,
+        text_file=stored.text_file.name, text_preview=preview, text_chars=total_chars,
+        page_count=page_count, extraction_status='done',
+    )
+    if not finished:
+        # The claim went stale and another extraction took over; keep its results
+        logger.warning("Extraction of stored document %s was taken over; discarding this one", stored.sha256[:12])
+        stored.text_file.delete(save=False)
+    else:
+        logger.info("Extracted stored document %s: %d pages, %d characters",
+                    stored.sha256[:12], page_count, total_chars)
+    stored.refresh_from_db()
+    return stored
+
+
+def release(stored_id):
+    """Delete a stored document and its files if nothing references it any more"""
+    try:
+        stored = StoredDocument.objects.get(pk=stored_id)
+    except StoredDocument.DoesNotExist:
+        return False
+    files = [stored.file, stored.text_file]
+    try:
+        with transaction.atomic():
+            stored.delete()
+    except (ProtectedError, IntegrityError):
+        # Referenced again, possibly by a row saved while this ran
+        return False
+    for field_file in files:
+        if field_file:
+            field_file.delete(save=False)
+    logger.info("Released stored document %s", stored.sha256[:12])
+    return True
+
+
+def _release_on_delete(sender, instance, **kwargs):
+    stored_id = getattr(instance, 'stored_id', None)
+    if stored_id is not None:
+        transaction.on_commit(lambda: release(stored_id))
+
+
+def release_on_delete(model):
+    """Release the stored document when a ``model`` row that references it (via ``stored``) is deleted"""
+    post_delete.connect(_release_on_delete, sender=model, dispatch_uid=f'document_store_release_{model._meta.label_lower}')
@@ -0,0 +1,203 @@
+import os
+import tempfile
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from apps.core.db_writer import db_writer
+from apps.pdf_converter.models import PDFDocument
+from benchmarks.synthetic_pdf import write_pdf
+from . import store
+from .extraction import PageStream, extract_pages, page_ranges
+from .models import DocumentPage, StoredDocument
+from .store import extract, release, store_file, store_referenced
+
+User = get_user_model()
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class StoreReleaseTests(TransactionTestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_override = override_settings(MEDIA_ROOT=media.name)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        self.owner = User.objects.create_user(username='owner', password='x', user_type='teacher')
+
+    def upload(self):
+        return SimpleUploadedFile('notes.pdf', b'%PDF-1.4 the same bytes', content_type='application/pdf')
+
+    def create(self, stored):
+        return PDFDocument.objects.create(title='Notes', pdf_file=stored.file.name, stored=stored,
+                                          uploaded_by=self.owner)
+
+    def test_same_content_is_stored_once(self):
+        first, stored, created = store_referenced(self.upload(), self.create)
+        second, again, created_again = store_referenced(self.upload(), self.create)
+
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertEqual(again.pk, stored.pk)
+        self.assertEqual(StoredDocument.objects.count(), 1)
+
+    def test_referenced_documents_are_not_released(self):
+        document, stored, _ = store_referenced(self.upload(), self.create)
+        self.assertFalse(release(stored.id))
+        self.assertTrue(stored.file.storage.exists(stored.file.name))
+
+        # Deleting the last reference releases the row and its file
+        document.delete()
+        self.assertFalse(StoredDocument.objects.exists())
+        self.assertFalse(stored.file.storage.exists(stored.file.name))
+
+    def test_document_released_before_the_reference_is_stored_again(self):
+        released = []
+
+        def release_first(stored):
+            # Another row's deletion releases the dedup hit right before it is referenced
+            if not released:
+                released.append(release(stored.id))
+            return stored
+
+        document, stored, _ = store_referenced(self.upload(), self.create, prepare=release_first)
+
+        self.assertEqual(released, [True])
+        self.assertEqual(document.stored, stored)
+        self.assertTrue(StoredDocument.objects.filter(pk=stored.pk).exists())
+        self.assertTrue(stored.file.storage.exists(stored.file.name))
+
+
+@override_settings(PDF_EXTRACT_WORKERS=0, PDF_EXTRACT_CLAIM_POLL=0.01)
+class ExtractTests(TransactionTestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_override = override_settings(MEDIA_ROOT=media.name)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+    def upload(self, pages=3):
+        path = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), 'book.pdf')
+        write_pdf(path, pages=pages, lines_per_page=2)
+        with open(path, 'rb') as pdf:
+            return SimpleUploadedFile('book.pdf', pdf.read(), content_type='application/pdf')
+
+    def test_pages_text_and_preview_are_recorded(self):
+        stored, _ = store_file(self.upload(pages=3))
+        stored = extract(stored)
+
+        self.assertEqual(stored.extraction_status, 'done')
+        self.assertEqual(stored.page_count, 3)
+        pages = list(DocumentPage.objects.filter(document=stored).order_by('number'))
+        self.assertEqual([(p.number, p.status) for p in pages], [(1, 'ok'), (2, 'ok'), (3, 'ok')])
+        self.assertTrue(pages[1].text.startswith('Page 2'))
+        with stored.text_file.open('rb') as text_file:
+            text = text_file.read().decode()
+        self.assertEqual(len(text), stored.text_chars)
+        self.assertTrue(text.startswith(stored.text_preview[:50]))
+
+    def test_same_content_is_extracted_once(self):
+        stored, _ = store_file(self.upload())
+        extract(stored)
+        again, created = store_file(self.upload())
+
+        self.assertFalse(created)
+        with mock.patch.object(store, 'write_text') as write_text:
+            self.assertEqual(extract(again).extraction_status, 'done')
+        write_text.assert_not_called()
+        self.assertEqual(DocumentPage.objects.count(), 3)
+
+    def test_corrupt_pdf_is_marked_failed(self):
+        stored, _ = store_file(SimpleUploadedFile('broken.pdf', b'not a pdf at all'))
+        stored = extract(stored)
+
+        self.assertEqual(stored.extraction_status, 'failed')
+        self.assertTrue(stored.extraction_error)
+        self.assertFalse(DocumentPage.objects.exists())
+
+    def test_errors_give_the_claim_back(self):
+        stored, _ = store_file(self.upload())
+        with mock.patch.object(store, 'write_text', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                extract(stored)
+        stored.refresh_from_db()
+        self.assertEqual(stored.extraction_status, 'pending')
+        self.assertEqual(extract(stored).extraction_status, 'done')
+
+    def test_waits_for_an_extraction_claimed_elsewhere(self):
+        stored, _ = store_file(self.upload())
+        # Another process claimed it and finishes a little later
+        StoredDocument.objects.filter(pk=stored.pk).update(
+            extraction_status='extracting', extraction_started_at=timezone.now())
+        finisher = threading.Timer(0.2, db_writer.run, [StoredDocument.objects.filter(pk=stored.pk).update],
+                                   {'extraction_status': 'done', 'page_count': 3})
+        finisher.start()
+        self.addCleanup(finisher.join)
+
+        with mock.patch.object(store, 'write_text') as write_text:
+            stored = extract(StoredDocument.objects.get(pk=stored.pk))
+        write_text.assert_not_called()
+        self.assertEqual((stored.extraction_status, stored.page_count), ('done', 3))
+
+    def test_stale_claims_are_taken_over(self):
+        stored, _ = store_file(self.upload())
+        StoredDocument.objects.filter(pk=stored.pk).update(
+            extraction_status='extracting', extraction_started_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(extract(StoredDocument.objects.get(pk=stored.pk)).extraction_status, 'done')
+
+
+class ExtractionPoolTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.executor = ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context('spawn'))
+        cls.addClassCleanup(cls.executor.shutdown)
+        cls.path = os.path.join(cls.enterClassContext(tempfile.TemporaryDirectory()), 'book.pdf')
+        write_pdf(cls.path, pages=7, lines_per_page=2)
+
+    def test_pages_are_extracted_in_a_worker_process(self):
+        pages, page_count = self.executor.submit(extract_pages, self.path, True, 3, 5).result(timeout=60)
+
+        self.assertEqual(page_count, 7)
+        self.assertEqual([(p['page'], p['status']) for p in pages], [(3, 'ok'), (4, 'ok'), (5, 'ok')])
+        self.assertTrue(pages[0]['text'].startswith('Page 3'))
+
+    @override_settings(PDF_EXTRACT_SHARD_MIN_PAGES=1, PDF_EXTRACT_SHARD_MAX_PAGES=1)
+    def test_sharded_stream_keeps_page_order(self):
+        stream = PageStream(self.path, executor=self.executor, shards=2)
+        # More ranges than the window of two per worker, so ranges are submitted as others finish
+        self.assertEqual(len(stream.ranges), 7)
+        self.assertEqual(stream.window, 4)
+
+        records = list(stream)
+        self.assertEqual(stream.page_count, 7)
+        self.assertEqual([(r['page'], r['status']) for r in records], [(n, 'ok') for n in range(1, 8)])
+        self.assertTrue(all(r['text'].startswith(f"Page {r['page']}") for r in records))
+
+
+class PageRangesTests(SimpleTestCase):
+    def test_no_pages(self):
+        self.assertEqual(page_ranges(0, 4), [])
+        self.assertEqual(page_ranges(-1, 4), [])
+
+    def test_uneven_split_leaves_a_short_last_range(self):
+        self.assertEqual(page_ranges(10, 3), [(1, 4), (5, 8), (9, 10)])
+
+    def test_fewer_pages_than_shards(self):
+        self.assertEqual(page_ranges(2, 4), [(1, 1), (2, 2)])
+        self.assertEqual(page_ranges(3, 0), [(1, 3)])
+
+    def test_min_pages_means_fewer_ranges(self):
+        self.assertEqual(page_ranges(10, 4, min_pages=5), [(1, 5), (6, 10)])
+
+    def test_max_pages_wins_over_shards(self):
+        self.assertEqual(page_ranges(10, 2, max_pages=3), [(1, 3), (4, 6), (7, 9), (10, 10)])
+        self.assertEqual(page_ranges(10, 2, min_pages=5, max_pages=3), [(1, 3), (4, 6), (7, 9), (10, 10)])
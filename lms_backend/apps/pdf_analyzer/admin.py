@@ -33,10 +33,10 @@ class ChatMessageAdmin(admin.ModelAdmin):
 # Admin for new PDF Analysis module models
 @admin.register(AnalysisDocument)
 class AnalysisDocumentAdmin(admin.ModelAdmin):
-    list_display = ['file_id', 'uploaded_by', 'page_count', 'created_at', 'expires_at']
+    list_display = ['file_id', 'uploaded_by', 'filename', 'page_count', 'created_at', 'expires_at']
     list_filter = ['created_at', 'expires_at']
-    search_fields = ['file_id', 'uploaded_by__username']
-    readonly_fields = ['file_id', 'created_at']
+    search_fields = ['file_id', 'filename', 'uploaded_by__username']
+    readonly_fields = ['file_id', 'stored', 'created_at']
     date_hierarchy = 'created_at'
 
 
@@ -0,0 +1,139 @@
+"""
+Async version of the analyze endpoint, used when ASYNC_AI_VIEWS is set.
+
+Under ASGI the analysis runs as a task on the server's event loop: the Gemini
+call is awaited and status writes go through the database writer without
+holding a thread, so many analyses can be in flight at once. When the view
+runs without a long-lived loop (WSGI), it falls back to the thread worker.
+"""
+import asyncio
+import logging
+import threading
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.utils import timezone
+from rest_framework import status
+
+from apps.core import metrics
+from apps.core.async_api import api_response, async_api_view
+from apps.core.db_writer import db_writer
+from .analysis_service import get_analysis_service
+from .analysis_views import process_analysis_request
+from .models import AnalysisDocument, AnalysisRequest
+from .serializers import AnalysisRequestSerializer
+
+logger = logging.getLogger(__name__)
+
+# Strong references to running analyses; the event loop only keeps weak ones
+_tasks = set()
+
+
+async def _save(instance, update_fields):
+    await asyncio.wrap_future(db_writer.submit(instance.save, update_fields=update_fields))
+
+
+async def aprocess_analysis_request(request_id):
+    """Event-loop version of process_analysis_request"""
+    started = time.perf_counter()
+    outcome = 'error'
+    analysis_request = None
+    try:
+        analysis_request = await AnalysisRequest.objects.select_related('document').aget(request_id=request_id)
+        analysis_request.status = 'processing'
+        await _save(analysis_request, ['status', 'updated_at'])
+
+        analysis_service = await sync_to_async(get_analysis_service)()
+        if analysis_service is None:
+            analysis_request.status = 'error'
+            analysis_request.error = 'AI service not available'
+            await _save(analysis_request, ['status', 'error', 'updated_at'])
+            metrics.fallbacks.inc(kind='analysis_unavailable')
+            return
+
+        task_options = analysis_request.task_options.copy()
+        response_format = task_options.pop('response_format', 'text')
+        result = await analysis_service.aanalyze_content(
+            task=analysis_request.task,
+            task_options=task_options,
+            pdf_content=await sync_to_async(analysis_request.document.get_text)(),
+            response_format=response_format
+        )
+
+        analysis_request.status = 'done'
+        analysis_request.result = result
+        analysis_request.model_used = analysis_service.model_name
+        analysis_request.cost_estimate = None
+        await _save(analysis_request, ['status', 'result', 'model_used', 'cost_estimate', 'updated_at'])
+        outcome = 'done'
+
+    except AnalysisRequest.DoesNotExist:
+        outcome = 'missing'
+    except Exception as e:
+        logger.exception("Analysis request %s failed", request_id)
+        metrics.errors.inc(component='pdf_analysis')
+        if analysis_request is not None:
+            try:
+                analysis_request.status = 'error'
+                analysis_request.error = str(e)
+                await _save(analysis_request, ['status', 'error', 'updated_at'])
+            except Exception:
+                pass
+    finally:
+        metrics.job_duration.observe(time.perf_counter() - started, queue='pdf_analysis', outcome=outcome)
+
+
+def _create_request(user, data):
+    document = AnalysisDocument.objects.get(file_id=data['file_id'], uploaded_by=user)
+    if document.expires_at and document.expires_at < timezone.now():
+        return None
+    task_options = data.get('task_options', {}).copy()
+    task_options['response_format'] = data.get('response_format', 'text')
+    return AnalysisRequest.objects.create(
+        request_id=str(uuid.uuid4()),
+        document=document,
+        user=user,
+        task=data['task'],
+        task_options=task_options,
+        status='queued'
+    )
+
+
+@async_api_view(['POST'])
+async def analyze(request):
+    """
+    Ask a question or request a task (summary/explain/qa) about a previously uploaded PDF.
+    POST /api/pdf-analysis/analyze
+    """
+    serializer = AnalysisRequestSerializer(data=request.data)
+    if not await sync_to_async(serializer.is_valid)():
+        return api_response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        analysis_request = await sync_to_async(_create_request)(request.user, serializer.validated_data)
+    except AnalysisDocument.DoesNotExist:
+        return api_response({'error': 'Document not found'}, status=status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        return api_response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    if analysis_request is None:
+        return api_response({'error': 'Document has expired'}, status=status.HTTP_410_GONE)
+
+    request_id = analysis_request.request_id
+    if isinstance(request, ASGIRequest):
+        task = asyncio.create_task(aprocess_analysis_request(request_id))
+        _tasks.add(task)
+        task.add_done_callback(_tasks.discard)
+    else:
+        thread = threading.Thread(target=process_analysis_request, args=(request_id,))
+        thread.daemon = True
+        thread.start()
+
+    return api_response({
+        'request_id': request_id,
+        'status': 'queued',
+        'result': None,
+        'model_used': None,
+        'cost_estimate': None
+    }, status=status.HTTP_202_ACCEPTED)
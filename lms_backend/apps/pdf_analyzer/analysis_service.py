@@ -1,6 +1,7 @@
 """
 Service for PDF Analysis module - handles AI interactions using Google Gemini API
 """
+import logging
 import os
 import uuid
 import json
@@ -8,15 +9,9 @@ import re
 from datetime import timedelta
 from django.conf import settings
 from django.utils import timezone
-try:
-    import google.generativeai as genai
-except ImportError:
-    genai = None
+from apps.core.ai_gateway import AIUnavailable, ai_gateway
 
-try:
-    from PyPDF2 import PdfReader
-except ImportError:
-    PdfReader = None
+logger = logging.getLogger(__name__)
 
 
 class PDFAnalysisService:
@@ -25,63 +20,20 @@ class PDFAnalysisService:
     def __init__(self):
         """Initialize Gemini client with API key from environment"""
         api_key = os.getenv('AI_API_KEY') or getattr(settings, 'AI_API_KEY', None)
-        if not api_key or genai is None:
-            raise ValueError("AI_API_KEY environment variable not set or google-generativeai library not installed")
-        
+        # Using gemini-2.5-flash as default (stable and widely available)
+        model_name = getattr(settings, 'PDF_ANALYSIS_MODEL', 'gemini-2.5-flash')
         try:
-            genai.configure(api_key=api_key)
-            # Using gemini-2.5-flash as default (stable and widely available)
-            model_name = getattr(settings, 'PDF_ANALYSIS_MODEL', 'gemini-2.5-flash')
-            self.model = genai.GenerativeModel(model_name)
-            self.model_name = model_name
+            ai_gateway.model(model_name, api_key)
+        except AIUnavailable:
+            raise ValueError("AI_API_KEY environment variable not set or google-generativeai library not installed")
         except Exception as e:
             raise ValueError(f"Failed to initialize Gemini API: {str(e)}")
+        self.api_key = api_key
+        self.model_name = model_name
         
         self.max_tokens = 2400
         self.temperature = 0.2
     
-    def extract_text_from_pdf(self, pdf_file):
-        """Extract text content from PDF file with page information"""
-        try:
-            pdf_file.seek(0)
-        except Exception:
-            pass
-        
-        if PdfReader is None:
-            # Fallback: try to decode raw bytes
-            try:
-                raw = pdf_file.read()
-                if not raw:
-                    return [], 0
-                try:
-                    text = raw.decode('utf-8', errors='ignore')
-                    text = text.replace('\x00', ' ').strip()
-                    return [{'page': 1, 'text': text}], 1
-                except Exception:
-                    return [], 0
-            except Exception:
-                return [], 0
-        
-        try:
-            pdf_reader = PdfReader(pdf_file)
-            pages = []
-            
-            for page_num, page in enumerate(pdf_reader.pages, start=1):
-                try:
-                    page_text = page.extract_text() or ''
-                    if page_text.strip():
-                        pages.append({
-                            'page': page_num,
-                            'text': page_text
-                        })
-                except Exception:
-                    continue
-            
-            return pages, len(pdf_reader.pages)
-        except Exception as e:
-            print(f"Error extracting text from PDF: {e}")
-            return [], 0
-    
     def split_into_chunks(self, pages, max_chunk_size=3000):
         """Split pages into chunks for processing"""
         chunks = []
@@ -164,53 +116,64 @@ Answer the question using only the provided content."""
         
         return prompt
     
+    def _full_prompt(self, task, task_options, pdf_content):
+        prompt = self.generate_prompt(task, task_options, pdf_content)
+        
+        # Add system instruction to the prompt for Gemini
+        return f"""You are a helpful assistant that analyzes PDF documents and provides accurate, well-referenced answers.
+
+{prompt}"""
+    
+    def _generation_config(self):
+        return {
+            'temperature': self.temperature,
+            'max_output_tokens': self.max_tokens,
+        }
+    
     def analyze_content(self, task, task_options, pdf_content, response_format='text'):
         """Analyze PDF content using Google Gemini API"""
         try:
-            prompt = self.generate_prompt(task, task_options, pdf_content)
-            
-            # Add system instruction to the prompt for Gemini
-            full_prompt = f"""You are a helpful assistant that analyzes PDF documents and provides accurate, well-referenced answers.
-
-{prompt}"""
-            
-            # Configure generation config using genai.types.GenerationConfig
-            generation_config = genai.types.GenerationConfig(
-                temperature=self.temperature,
-                max_output_tokens=self.max_tokens,
+            content = ai_gateway.generate(
+                'pdf_analysis', self._full_prompt(task, task_options, pdf_content),
+                self.model_name, self.api_key, generation_config=self._generation_config()
             )
-            
-            response = self.model.generate_content(
-                full_prompt,
-                generation_config=generation_config
+            return self._format_result(task, content, pdf_content, response_format)
+        except Exception as e:
+            raise Exception(f"Error analyzing content: {str(e)}")
+    
+    async def aanalyze_content(self, task, task_options, pdf_content, response_format='text'):
+        """Async variant of analyze_content for the async analyze view"""
+        try:
+            content = await ai_gateway.agenerate(
+                'pdf_analysis', self._full_prompt(task, task_options, pdf_content),
+                self.model_name, self.api_key, generation_config=self._generation_config()
             )
-            
-            content = response.text
-            
-            # Extract page references from content (simple heuristic)
-            references = self._extract_page_references(content, pdf_content)
-            
-            result = {
-                'type': task,
-                'content': content,
-                'references': references
-            }
-            
-            # Format response based on response_format
-            if response_format == 'json':
-                return result
-            elif response_format == 'bulleted':
-                # Convert to bulleted format
-                lines = content.split('\n')
-                bulleted = '\n'.join([f"• {line.strip()}" if line.strip() and not line.strip().startswith('•') else line for line in lines])
-                result['content'] = bulleted
-                return result
-            else:  # text
-                return result
-        
+            return self._format_result(task, content, pdf_content, response_format)
         except Exception as e:
             raise Exception(f"Error analyzing content: {str(e)}")
     
+    def _format_result(self, task, content, pdf_content, response_format):
+        # Extract page references from content (simple heuristic)
+        references = self._extract_page_references(content, pdf_content)
+        
+        result = {
+            'type': task,
+            'content': content,
+            'references': references
+        }
+        
+        # Format response based on response_format
+        if response_format == 'json':
+            return result
+        elif response_format == 'bulleted':
+            # Convert to bulleted format
+            lines = content.split('\n')
+            bulleted = '\n'.join([f"• {line.strip()}" if line.strip() and not line.strip().startswith('•') else line for line in lines])
+            result['content'] = bulleted
+            return result
+        else:  # text
+            return result
+    
     def _extract_page_references(self, content, pdf_content):
         """Extract page references from content (simple heuristic)"""
         references = []
@@ -271,7 +234,7 @@ def get_analysis_service():
         try:
             _analysis_service = PDFAnalysisService()
         except ValueError as e:
-            print(f"Warning: {e}")
+            logger.warning("Analysis service unavailable: %s", e)
             return None
     return _analysis_service
 
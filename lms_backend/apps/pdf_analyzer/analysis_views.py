@@ -1,9 +1,11 @@
 """
 Views for PDF Analysis module - spec-compliant endpoints
 """
+import logging
 import uuid
 import threading
 import json
+import time
 from datetime import timedelta
 from django.utils import timezone
 from rest_framework import status
@@ -19,6 +21,12 @@ from .serializers import (
     AnalysisStatusSerializer
 )
 from .analysis_service import get_analysis_service
+from apps.core import metrics
+from apps.core.db_writer import db_writer
+from apps.document_store.extraction import POOL_ERRORS
+from apps.document_store.store import extract, store_referenced
+
+logger = logging.getLogger(__name__)
 
 
 @api_view(['POST'])
@@ -64,23 +72,32 @@ def upload_pdf(request):
                 status=status.HTTP_503_SERVICE_UNAVAILABLE
             )
         
-        # Extract text from PDF
-        pages, page_count = analysis_service.extract_text_from_pdf(pdf_file)
-        extracted_text = '\n\n'.join([f"Page {p['page']}:\n{p['text']}" for p in pages])
-        
-        # Calculate expiration time (1 hour retention as per spec)
+        # Store and extract the PDF once per content; the page table is
+        # shared with the converter (and with earlier uploads of the file).
+        # Expires after 1 hour, the retention in the spec
         expires_at = timezone.now() + timedelta(seconds=3600)
-        
-        # Create document record
-        document = AnalysisDocument.objects.create(
-            uploaded_by=request.user,
-            file_id=file_id,
-            pdf_file=pdf_file,
-            metadata=metadata,
-            extracted_text=extracted_text,
-            page_count=page_count,
-            expires_at=expires_at
-        )
+        try:
+            document, _, _ = store_referenced(
+                pdf_file,
+                lambda stored: AnalysisDocument.objects.create(
+                    uploaded_by=request.user,
+                    file_id=file_id,
+                    pdf_file=stored.file.name,
+                    stored=stored,
+                    filename=pdf_file.name,
+                    metadata=metadata,
+                    page_count=stored.page_count,
+                    expires_at=expires_at
+                ),
+                prepare=extract,
+            )
+        except POOL_ERRORS as e:
+            # A copy stored by this upload has been released already
+            logger.warning("Could not extract uploaded PDF %s: %r", pdf_file.name, e)
+            return Response(
+                {'error': 'PDF text extraction is busy or unavailable. Please try again later.'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
         
         # Serialize the document for response
         document_serializer = AnalysisDocumentSerializer(document)
@@ -102,10 +119,12 @@ def upload_pdf(request):
 
 def process_analysis_request(request_id):
     """Background task to process analysis request"""
+    started = time.perf_counter()
+    outcome = 'error'
     try:
         analysis_request = AnalysisRequest.objects.get(request_id=request_id)
         analysis_request.status = 'processing'
-        analysis_request.save()
+        db_writer.save(analysis_request, ['status', 'updated_at'])
         
         # Get the document
         document = analysis_request.document
@@ -115,7 +134,8 @@ def process_analysis_request(request_id):
         if analysis_service is None:
             analysis_request.status = 'error'
             analysis_request.error = 'AI service not available'
-            analysis_request.save()
+            db_writer.save(analysis_request, ['status', 'error', 'updated_at'])
+            metrics.fallbacks.inc(kind='analysis_unavailable')
             return
         
         # Get task and options
@@ -128,7 +148,7 @@ def process_analysis_request(request_id):
         result = analysis_service.analyze_content(
             task=task,
             task_options=task_options,
-            pdf_content=document.extracted_text,
+            pdf_content=document.get_text(),
             response_format=response_format
         )
         
@@ -140,17 +160,22 @@ def process_analysis_request(request_id):
         analysis_request.result = result
         analysis_request.model_used = analysis_service.model_name
         analysis_request.cost_estimate = cost_estimate
-        analysis_request.save()
+        db_writer.save(analysis_request, ['status', 'result', 'model_used', 'cost_estimate', 'updated_at'])
+        outcome = 'done'
     
     except AnalysisRequest.DoesNotExist:
-        pass
+        outcome = 'missing'
     except Exception as e:
+        logger.exception("Analysis request %s failed", request_id)
+        metrics.errors.inc(component='pdf_analysis')
         try:
             analysis_request.status = 'error'
             analysis_request.error = str(e)
-            analysis_request.save()
+            db_writer.save(analysis_request, ['status', 'error', 'updated_at'])
         except Exception:
             pass
+    finally:
+        metrics.job_duration.observe(time.perf_counter() - started, queue='pdf_analysis', outcome=outcome)
 
 
 @api_view(['POST'])
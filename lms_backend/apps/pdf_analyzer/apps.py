@@ -5,3 +5,8 @@ class PdfAnalyzerConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.pdf_analyzer'
     verbose_name = 'PDF Analyzer'
+
+    def ready(self):
+        from apps.document_store.store import release_on_delete
+        from .models import AnalysisDocument
+        release_on_delete(AnalysisDocument)
@@ -40,8 +40,9 @@ class Command(BaseCommand):
             deleted_count = 0
             for doc in expired_docs:
                 try:
-                    # Delete the file if it exists
-                    if doc.pdf_file and os.path.exists(doc.pdf_file.path):
+                    # Delete the file if it exists (stored PDFs are shared and
+                    # released with their last reference)
+                    if doc.stored_id is None and doc.pdf_file and os.path.exists(doc.pdf_file.path):
                         os.remove(doc.pdf_file.path)
                     
                     # Delete the database record
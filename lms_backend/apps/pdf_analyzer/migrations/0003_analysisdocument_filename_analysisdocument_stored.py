@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('document_store', '0002_storeddocument_extraction_error_and_more'),
+        ('pdf_analyzer', '0002_analysisdocument_analysisrequest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysisdocument',
+            name='filename',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='analysisdocument',
+            name='stored',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='analysis_documents', to='document_store.storeddocument'),
+        ),
+    ]
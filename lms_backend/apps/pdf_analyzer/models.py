@@ -61,7 +61,14 @@ class AnalysisDocument(models.Model):
     """Model to store uploaded PDF documents for the new PDF Analysis module"""
     uploaded_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='analysis_documents')
     file_id = models.CharField(max_length=100, unique=True, db_index=True)
+    # New uploads share the stored PDF and its page table with the converter;
+    # extracted_text is only filled for documents uploaded before the store
     pdf_file = models.FileField(upload_to='pdf_analysis/temp/')
+    stored = models.ForeignKey(
+        'document_store.StoredDocument', on_delete=models.PROTECT,
+        null=True, blank=True, related_name='analysis_documents'
+    )
+    filename = models.CharField(max_length=255, blank=True)
     metadata = models.JSONField(default=dict, blank=True)
     extracted_text = models.TextField(blank=True)
     page_count = models.IntegerField(default=0)
@@ -76,6 +83,13 @@ class AnalysisDocument(models.Model):
     def __str__(self):
         return f"Analysis Document {self.file_id} - {self.uploaded_by.username}"
 
+    def get_text(self):
+        """Page-labelled text for analysis, read from the shared page table when stored"""
+        if self.stored_id is None:
+            return self.extracted_text
+        pages = self.stored.pages.filter(status='ok').values_list('number', 'text')
+        return '\n\n'.join(f"Page {number}:\n{text}" for number, text in pages)
+
 
 class AnalysisRequest(models.Model):
     """Model to track analysis requests (summarize, explain, answer)"""
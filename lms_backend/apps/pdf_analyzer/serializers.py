@@ -126,6 +126,8 @@ class AnalysisDocumentSerializer(serializers.ModelSerializer):
         """Extract title from metadata or use filename"""
         if obj.metadata and 'title' in obj.metadata:
             return obj.metadata['title']
+        if obj.filename:
+            return obj.filename.split('/')[-1].replace('.pdf', '')
         # Extract filename from pdf_file path
         if obj.pdf_file:
             return obj.pdf_file.name.split('/')[-1].replace('.pdf', '')
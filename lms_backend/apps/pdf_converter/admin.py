@@ -1,22 +1,37 @@
 from django.contrib import admin
-from .models import PDFDocument
+from .models import AudioSegment, ConversionJob, PDFDocument
 
 @admin.register(PDFDocument)
 class PDFDocumentAdmin(admin.ModelAdmin):
     list_display = ['title', 'uploaded_by', 'conversion_status', 'created_at']
     list_filter = ['conversion_status', 'created_at', 'uploaded_by__user_type']
     search_fields = ['title', 'uploaded_by__username']
-    readonly_fields = ['text_content', 'created_at', 'updated_at']
+    readonly_fields = ['stored', 'text_content', 'created_at', 'updated_at']
 
     fieldsets = (
         ('Document Info', {
-            'fields': ('title', 'uploaded_by', 'pdf_file')
+            'fields': ('title', 'uploaded_by', 'pdf_file', 'stored')
         }),
         ('Conversion', {
-            'fields': ('conversion_status', 'audio_file', 'text_content')
+            'fields': ('conversion_status', 'audio_file', 'audio_is_fallback', 'text_file', 'text_content')
         }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
-    )
\ No newline at end of file
+    )
+
+
+@admin.register(ConversionJob)
+class ConversionJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'document', 'owner', 'status', 'attempts', 'lease_owner', 'lease_expires_at', 'created_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['document__title', 'owner__username', 'lease_owner']
+    readonly_fields = ['created_at', 'started_at', 'finished_at', 'heartbeat_at']
+
+
+@admin.register(AudioSegment)
+class AudioSegmentAdmin(admin.ModelAdmin):
+    list_display = ['document', 'index', 'start', 'duration', 'text_chars', 'created_at']
+    search_fields = ['document__title']
+    readonly_fields = ['created_at']
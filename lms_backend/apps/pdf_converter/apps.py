@@ -2,4 +2,22 @@ from django.apps import AppConfig
 
 class PdfConverterConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'apps.pdf_converter'
\ No newline at end of file
+    name = 'apps.pdf_converter'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+        from django.conf import settings
+        if getattr(settings, 'PDF_JOBS_IN_PROCESS', True):
+            # Start the conversion workers with the first request, so only
+            # processes that serve HTTP (not migrate, shell, ...) run them
+            from django.core.signals import request_started
+            request_started.connect(_start_conversion_pool, dispatch_uid='pdf_conversion_pool')
+
+
+def _start_conversion_pool(**kwargs):
+    from django.core.signals import request_started
+    from .jobs import pool
+
+    request_started.disconnect(dispatch_uid='pdf_conversion_pool')
+    pool.start()
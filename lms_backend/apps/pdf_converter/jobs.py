@@ -0,0 +1,260 @@
+"""
+Durable job queue for PDF-to-audio conversion.
+
+Uploads and retries enqueue a ConversionJob row instead of starting a thread.
+A fixed-size ConversionWorkerPool claims jobs one at a time. It runs in-process
+(PDF_JOBS_IN_PROCESS, started with the first request) or in its own process
+with ``manage.py conversion_worker``.
+
+- Leases: a claimed job holds a lease of PDF_JOB_LEASE_SECONDS that the pool
+  renews every PDF_JOB_HEARTBEAT_SECONDS. When a worker dies, the lease
+  runs out and recover_stale() requeues the job, up to PDF_JOB_MAX_ATTEMPTS
+  claims. It also requeues documents left 'pending'/'processing' with no
+  live job.
+- Fairness: the next job comes from the owner with the fewest running jobs
+  (oldest job first on ties). Owners at PDF_JOB_MAX_RUNNING_PER_USER (0 = no
+  cap) are skipped, so one user's batch of uploads cannot take every worker.
+- Global cap: no more than PDF_JOB_MAX_RUNNING jobs run at once across every
+  process claiming from the queue (each web worker runs its own in-process
+  pool), so more web processes do not mean more concurrent conversions.
+
+Queue writes go through the serialized database writer like the other
+background writes.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, F, Min
+from django.utils import timezone
+
+from apps.core import metrics
+from apps.core.db_writer import db_writer
+from .models import ConversionJob, PDFDocument
+from . import tts
+from .utils import process_pdf_to_audio
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATES = ('queued', 'running')
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def enqueue_conversion(document):
+    """Queue a conversion for the document unless one is already queued or running"""
+    with transaction.atomic():
+        job = ConversionJob.objects.filter(document=document, status__in=ACTIVE_STATES).first()
+        if job is None:
+            job = ConversionJob.objects.create(document=document, owner_id=document.uploaded_by_id)
+    if _setting('PDF_JOBS_IN_PROCESS', True):
+        transaction.on_commit(lambda: pool.start().wake())
+    return job
+
+
+def queue_depth(owner=None):
+    """Queued/running job counts, overall or for one owner"""
+    jobs = ConversionJob.objects.filter(status__in=ACTIVE_STATES)
+    if owner is not None:
+        jobs = jobs.filter(owner=owner)
+    counts = dict(jobs.values_list('status').annotate(n=Count('pk')))
+    return {state: counts.get(state, 0) for state in ACTIVE_STATES}
+
+
+def claim_next(worker_id):
+    """Lease the next job for ``worker_id``; None when nothing is claimable"""
+    now = timezone.now()
+    max_per_user = _setting('PDF_JOB_MAX_RUNNING_PER_USER', 0)
+    max_running = _setting('PDF_JOB_MAX_RUNNING', 0)
+    with transaction.atomic():
+        running = dict(
+            ConversionJob.objects.filter(status='running').values_list('owner').annotate(n=Count('pk'))
+        )
+        if max_running and sum(running.values()) >= max_running:
+            return None
+        heads = ConversionJob.objects.filter(status='queued').values('owner').annotate(first_id=Min('id'))
+        candidates = [
+            (running.get(head['owner'], 0), head['first_id'])
+            for head in heads
+            if not max_per_user or running.get(head['owner'], 0) < max_per_user
+        ]
+        if not candidates:
+            return None
+        _, job_id = min(candidates)
+        claimed = ConversionJob.objects.filter(pk=job_id, status='queued').update(
+            status='running',
+            attempts=F('attempts') + 1,
+            lease_owner=worker_id,
+            lease_expires_at=now + timedelta(seconds=_setting('PDF_JOB_LEASE_SECONDS', 60)),
+            heartbeat_at=now,
+            started_at=now,
+        )
+        if not claimed:
+            return None
+        return ConversionJob.objects.select_related('document').get(pk=job_id)
+
+
+def heartbeat(worker_ids):
+    """Extend the leases held by ``worker_ids``; returns the number renewed"""
+    now = timezone.now()
+    return ConversionJob.objects.filter(status='running', lease_owner__in=worker_ids).update(
+        heartbeat_at=now,
+        lease_expires_at=now + timedelta(seconds=_setting('PDF_JOB_LEASE_SECONDS', 60)),
+    )
+
+
+def finish_job(job, ok, error=''):
+    """Record the outcome, unless the lease was lost and the job handed to another worker"""
+    return ConversionJob.objects.filter(pk=job.pk, status='running', lease_owner=job.lease_owner).update(
+        status='done' if ok else 'failed',
+        error=error,
+        lease_owner='',
+        lease_expires_at=None,
+        finished_at=timezone.now(),
+    )
+
+
+def recover_stale():
+    """Requeue or fail jobs whose lease expired and re-enqueue orphaned documents"""
+    now = timezone.now()
+    max_attempts = _setting('PDF_JOB_MAX_ATTEMPTS', 3)
+    requeued = failed = orphaned = 0
+    with transaction.atomic():
+        stale = ConversionJob.objects.filter(status='running', lease_expires_at__lt=now).select_related('document')
+        for job in stale:
+            document = job.document
+            if job.attempts < max_attempts:
+                job.status = 'queued'
+                document.conversion_status = 'pending'
+                requeued += 1
+            else:
+                job.status = 'failed'
+                job.error = f'Lease expired after {job.attempts} attempts'
+                job.finished_at = now
+                document.conversion_status = 'failed'
+                failed += 1
+            job.lease_owner = ''
+            job.lease_expires_at = None
+            job.save(update_fields=['status', 'error', 'finished_at', 'lease_owner', 'lease_expires_at'])
+            document.save(update_fields=['conversion_status', 'updated_at'])
+
+        # Documents whose conversion thread died with the process (before the queue existed)
+        orphans = (PDFDocument.objects.filter(conversion_status__in=['pending', 'processing'])
+                   .exclude(conversion_jobs__status__in=ACTIVE_STATES))
+        for document in orphans:
+            ConversionJob.objects.create(document=document, owner_id=document.uploaded_by_id)
+            if document.conversion_status != 'pending':
+                document.conversion_status = 'pending'
+                document.save(update_fields=['conversion_status', 'updated_at'])
+            orphaned += 1
+
+    if requeued or failed or orphaned:
+        logger.warning("Recovered conversion jobs: %d requeued, %d failed, %d orphaned documents queued",
+                       requeued, failed, orphaned)
+    return requeued + orphaned
+
+
+class ConversionWorkerPool:
+    """Fixed number of worker threads draining the conversion queue"""
+
+    def __init__(self, size=2, name=None):
+        self.size = size
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.active = {}  # worker id -> job id
+        self._wake = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return self
+            self._stop.clear()
+            try:
+                db_writer.run(recover_stale)
+            except Exception:
+                logger.exception('Conversion job recovery failed')
+            self._threads = [
+                threading.Thread(target=self._work, args=(f'{self.name}:{n}',), name=f'conversion-{n}', daemon=True)
+                for n in range(self.size)
+            ]
+            self._threads.append(threading.Thread(target=self._supervise, name='conversion-supervisor', daemon=True))
+            for thread in self._threads:
+                thread.start()
+        logger.info("Conversion worker pool %s started with %d workers", self.name, self.size)
+        return self
+
+    def wake(self):
+        with self._wake:
+            self._wake.notify_all()
+
+    def stop(self, timeout=None):
+        """Stop claiming jobs and wait for running conversions to finish"""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        self._stop.set()
+        self.wake()
+        for thread in threads:
+            thread.join(timeout)
+
+    def _work(self, worker_id):
+        poll = _setting('PDF_JOB_POLL_SECONDS', 2)
+        while not self._stop.is_set():
+            try:
+                job = db_writer.run(claim_next, worker_id)
+            except Exception:
+                logger.exception('Failed to claim a conversion job')
+                job = None
+            if job is None:
+                with self._wake:
+                    self._wake.wait(poll)
+                continue
+            self._run_job(job, worker_id)
+        close_old_connections()
+
+    def _run_job(self, job, worker_id):
+        self.active[worker_id] = job.pk
+        # TTS engines start with the first job this process runs (and stay warm
+        # for the next), so processes that never get a job spawn no TTS workers
+        tts.pool.start()
+        metrics.job_queue_wait.observe(
+            (job.started_at - job.created_at).total_seconds(), queue='pdf_conversion')
+        try:
+            ok = process_pdf_to_audio(job.document)
+            error = '' if ok else 'Conversion failed'
+        except Exception as e:
+            logger.exception("Conversion job %s crashed", job.pk)
+            ok, error = False, str(e)
+        finally:
+            self.active.pop(worker_id, None)
+        try:
+            db_writer.run(finish_job, job, ok, error)
+        except Exception:
+            # The lease runs out and recovery takes it from here
+            logger.exception("Failed to record the outcome of conversion job %s", job.pk)
+
+    def _supervise(self):
+        interval = _setting('PDF_JOB_HEARTBEAT_SECONDS', 15)
+        recovery_every = _setting('PDF_JOB_LEASE_SECONDS', 60)
+        last_recovery = time.monotonic()
+        while not self._stop.wait(interval):
+            try:
+                worker_ids = list(self.active)
+                if worker_ids:
+                    db_writer.run(heartbeat, worker_ids)
+                if time.monotonic() - last_recovery >= recovery_every:
+                    last_recovery = time.monotonic()
+                    if db_writer.run(recover_stale):
+                        self.wake()
+            except Exception:
+                logger.exception('Conversion pool heartbeat failed')
+
+pool = ConversionWorkerPool(size=_setting('PDF_JOB_WORKERS', 2))
@@ -0,0 +1,40 @@
+"""
+Management command to run PDF-to-audio conversion workers.
+
+Run it as its own process (with PDF_JOBS_IN_PROCESS=0 for the web server) to
+keep extraction and TTS out of the web workers. Ctrl+C stops claiming new jobs
+and waits for running conversions; jobs of a killed worker are requeued once
+their lease expires.
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.pdf_converter.jobs import ConversionWorkerPool, queue_depth, recover_stale
+
+
+class Command(BaseCommand):
+    help = 'Process queued PDF-to-audio conversions with a fixed-size worker pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Worker threads (default: PDF_JOB_WORKERS)')
+        parser.add_argument('--recover-only', action='store_true',
+                            help='Requeue stale jobs and orphaned documents, then exit')
+
+    def handle(self, *args, **options):
+        if options['recover_only']:
+            recovered = recover_stale()
+            self.stdout.write(self.style.SUCCESS(f'Requeued {recovered} conversion(s); queue: {queue_depth()}'))
+            return
+
+        size = options['workers'] or getattr(settings, 'PDF_JOB_WORKERS', 2)
+        pool = ConversionWorkerPool(size=size).start()
+        self.stdout.write(self.style.SUCCESS(f'Conversion worker {pool.name} running with {size} workers'))
+        try:
+            while True:
+                time.sleep(60)
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping; waiting for running conversions to finish...')
+            pool.stop()
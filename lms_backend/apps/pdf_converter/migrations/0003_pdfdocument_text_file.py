@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdf_converter', '0002_conversionjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfdocument',
+            name='text_file',
+            field=models.FileField(blank=True, null=True, upload_to='texts/'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('document_store', '0001_initial'),
+        ('pdf_converter', '0003_pdfdocument_text_file'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfdocument',
+            name='stored',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='pdf_documents', to='document_store.storeddocument'),
+        ),
+    ]
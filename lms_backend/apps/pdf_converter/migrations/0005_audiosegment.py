@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdf_converter', '0004_pdfdocument_stored'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AudioSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField()),
+                ('audio_file', models.FileField(upload_to='audio/segments/')),
+                ('start', models.FloatField(help_text='Offset of the segment in the full audio, in seconds')),
+                ('duration', models.FloatField(help_text='Seconds')),
+                ('text_chars', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='audio_segments', to='pdf_converter.pdfdocument')),
+            ],
+            options={
+                'ordering': ['document', 'index'],
+                'unique_together': {('document', 'index')},
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-19 08:14
+
+from django.db import migrations, models
+
+
+def flag_dummy_audio(apps, schema_editor):
+    # Conversions before the flag left the silent placeholder as *_dummy.wav
+    PDFDocument = apps.get_model('pdf_converter', 'PDFDocument')
+    PDFDocument.objects.filter(audio_file__endswith='_dummy.wav').update(audio_is_fallback=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdf_converter', '0005_audiosegment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfdocument',
+            name='audio_is_fallback',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(flag_dummy_audio, migrations.RunPython.noop),
+    ]
@@ -5,10 +5,20 @@ User = get_user_model()
 
 class PDFDocument(models.Model):
     title = models.CharField(max_length=255)
+    # New uploads point pdf_file at the shared, content-addressed copy in stored
     pdf_file = models.FileField(upload_to='pdfs/')
+    stored = models.ForeignKey(
+        'document_store.StoredDocument', on_delete=models.PROTECT,
+        null=True, blank=True, related_name='pdf_documents'
+    )
     audio_file = models.FileField(upload_to='audio/', blank=True, null=True)
+    # audio_file is the silent placeholder written when TTS produced nothing;
+    # such conversions can be retried and are never reused for other uploads
+    audio_is_fallback = models.BooleanField(default=False)
     uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Preview of the extracted text (PDF_TEXT_PREVIEW_CHARS); the full text is in text_file
     text_content = models.TextField(blank=True)
+    text_file = models.FileField(upload_to='texts/', blank=True, null=True)
     conversion_status = models.CharField(
         max_length=20,
         choices=[
@@ -26,4 +36,57 @@ class PDFDocument(models.Model):
         return f"{self.title} - {self.uploaded_by.username}"
 
     class Meta:
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+
+class ConversionJob(models.Model):
+    """Queued PDF-to-audio conversion, claimed by a worker under a renewable lease"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    document = models.ForeignKey(PDFDocument, on_delete=models.CASCADE, related_name='conversion_jobs')
+    # Denormalized from document.uploaded_by for per-user fair scheduling
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversion_jobs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    lease_owner = models.CharField(max_length=100, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Conversion job {self.id} - {self.document_id} - {self.status}"
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='conversion_job_status_idx'),
+            models.Index(fields=['status', 'lease_expires_at'], name='conversion_job_lease_idx'),
+        ]
+
+class AudioSegment(models.Model):
+    """A playable piece of a document's audio, saved as soon as it is synthesized.
+
+    Segments let clients start playback while the rest of the document is
+    still being converted; the complete audio is in PDFDocument.audio_file.
+    """
+    document = models.ForeignKey(PDFDocument, on_delete=models.CASCADE, related_name='audio_segments')
+    index = models.PositiveIntegerField()
+    audio_file = models.FileField(upload_to='audio/segments/')
+    start = models.FloatField(help_text='Offset of the segment in the full audio, in seconds')
+    duration = models.FloatField(help_text='Seconds')
+    text_chars = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Audio segment {self.index} - {self.document_id}"
+
+    class Meta:
+        ordering = ['document', 'index']
+        unique_together = ['document', 'index']
@@ -1,13 +1,21 @@
 from rest_framework import serializers
-from .models import PDFDocument
+from .models import AudioSegment, PDFDocument
 
 class PDFDocumentSerializer(serializers.ModelSerializer):
     uploaded_by = serializers.StringRelatedField(read_only=True)
+    # The first PDF_TEXT_PREVIEW_CHARS characters; the full text is text_file
+    # (or documents/<id>/text/)
+    text_preview = serializers.CharField(source='text_content', read_only=True)
 
     class Meta:
         model = PDFDocument
-        fields = ['id', 'title', 'pdf_file', 'audio_file', 'uploaded_by', 'conversion_status', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'audio_file', 'uploaded_by', 'conversion_status', 'created_at', 'updated_at']
+        fields = ['id', 'title', 'pdf_file', 'audio_file', 'audio_is_fallback', 'text_preview', 'text_file', 'uploaded_by', 'conversion_status', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'audio_file', 'audio_is_fallback', 'text_file', 'uploaded_by', 'conversion_status', 'created_at', 'updated_at']
+
+class AudioSegmentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AudioSegment
+        fields = ['index', 'audio_file', 'start', 'duration', 'text_chars']
 
 class PDFUploadSerializer(serializers.ModelSerializer):
     class Meta:
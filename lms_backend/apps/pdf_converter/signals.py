@@ -0,0 +1,20 @@
+"""Cache invalidation for document listings and release of stored files"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.core.cache import invalidate
+from apps.document_store.store import release_on_delete
+from .models import PDFDocument
+
+
+def documents_namespace(user_id=None):
+    """Per-owner listing namespace; admins list every document ('all')"""
+    return f'pdf_documents:{user_id if user_id is not None else "all"}'
+
+
+@receiver([post_save, post_delete], sender=PDFDocument)
+def document_changed(sender, instance, **kwargs):
+    invalidate(documents_namespace(instance.uploaded_by_id), documents_namespace())
+
+
+release_on_delete(PDFDocument)
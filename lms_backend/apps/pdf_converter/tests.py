@@ -0,0 +1,426 @@
+import os
+import sys
+import tempfile
+import time
+import wave
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.signals import request_started
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+from apps.document_store.models import StoredDocument
+
+from . import tts, tts_cache
+from .jobs import claim_next, enqueue_conversion, finish_job, heartbeat, recover_stale
+from .models import AudioSegment, ConversionJob, PDFDocument
+from .serializers import PDFDocumentSerializer
+from .utils import convert_text_to_audio, copy_conversion, find_conversion
+
+User = get_user_model()
+
+# Stand-in pyttsx3 whose engine can never start (like pyttsx3 without eSpeak)
+BROKEN_PYTTSX3 = '''
+def init(*args, **kwargs):
+    raise RuntimeError('no speech engine')
+'''
+
+
+@override_settings(TTS_WORKERS=1, TTS_RESTART_BACKOFF=60, TTS_START_METHOD='spawn')
+class TTSWorkerPoolInitFailureTests(SimpleTestCase):
+    def setUp(self):
+        self.stub_dir = tempfile.TemporaryDirectory()
+        with open(os.path.join(self.stub_dir.name, 'pyttsx3.py'), 'w') as stub:
+            stub.write(BROKEN_PYTTSX3)
+        # Spawned workers inherit sys.path, so they import the stub too
+        sys.path.insert(0, self.stub_dir.name)
+        self.saved_module = sys.modules.pop('pyttsx3', None)
+        self.pool = tts.TTSWorkerPool(size=1)
+        self.workdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.pool.stop()
+        sys.path.remove(self.stub_dir.name)
+        sys.modules.pop('pyttsx3', None)
+        if self.saved_module is not None:
+            sys.modules['pyttsx3'] = self.saved_module
+        self.stub_dir.cleanup()
+        self.workdir.cleanup()
+
+    def submit(self):
+        return self.pool.submit('Hello.', os.path.join(self.workdir.name, 'chunk.wav'))
+
+    def test_chunks_fail_with_unavailable_and_dispatcher_survives(self):
+        with self.assertRaises(tts.TTSUnavailable):
+            self.submit().result(timeout=60)
+        thread = self.pool._thread
+        # Give a broken dispatcher time to trip over the stopped worker
+        time.sleep(1.5)
+        self.assertTrue(thread.is_alive())
+
+        # Within the back off: failed at once, on the same thread, with no new workers
+        started = time.monotonic()
+        with self.assertRaises(tts.TTSUnavailable):
+            self.submit().result(timeout=60)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertIs(self.pool._thread, thread)
+        self.assertEqual(self.pool.restarts, 0)
+        self.assertTrue(all(worker.closed for worker in self.pool._workers))
+
+
+class DocumentTextTests(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        request_started.disconnect(dispatch_uid='pdf_conversion_pool')
+        request_started.disconnect(dispatch_uid='quiz_expiry_sweeper')
+
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        settings_override = override_settings(MEDIA_ROOT=self.media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(self.media.cleanup)
+        self.owner = User.objects.create_user(username='owner', password='x', user_type='teacher')
+        self.client.force_authenticate(self.owner)
+
+    def document(self, **kwargs):
+        return PDFDocument.objects.create(title='Notes', pdf_file='pdfs/notes.pdf', uploaded_by=self.owner, **kwargs)
+
+    def test_full_text_is_served_from_text_file(self):
+        full_text = 'word ' * 3000
+        document = self.document(text_content=full_text[:100], conversion_status='completed')
+        document.text_file.save('notes.txt', ContentFile(full_text.encode()))
+
+        data = PDFDocumentSerializer(document).data
+        self.assertEqual(data['text_preview'], full_text[:100])
+        self.assertNotIn('text_content', data)
+
+        response = self.client.get(f'/api/pdf/documents/{document.id}/text/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content).decode(), full_text)
+
+    def test_documents_converted_before_text_files_serve_text_content(self):
+        document = self.document(text_content='The whole text.', conversion_status='completed')
+        response = self.client.get(f'/api/pdf/documents/{document.id}/text/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content.decode(), 'The whole text.')
+
+    def test_text_of_other_users_documents_is_not_served(self):
+        document = self.document(text_content='Private.', conversion_status='completed')
+        other = User.objects.create_user(username='other', password='x', user_type='student')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(f'/api/pdf/documents/{document.id}/text/').status_code, 404)
+
+
+@override_settings(
+    PDF_JOBS_IN_PROCESS=False, PDF_JOB_MAX_RUNNING=0, PDF_JOB_MAX_RUNNING_PER_USER=0, PDF_JOB_MAX_ATTEMPTS=2,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class ConversionQueueTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='x', user_type='teacher')
+        self.bob = User.objects.create_user(username='bob', password='x', user_type='teacher')
+
+    def enqueue(self, owner):
+        document = PDFDocument.objects.create(title='Doc', pdf_file='pdfs/doc.pdf', uploaded_by=owner)
+        return enqueue_conversion(document)
+
+    def expire(self, job):
+        ConversionJob.objects.filter(pk=job.pk).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+
+    def test_a_document_has_one_active_job(self):
+        job = self.enqueue(self.alice)
+        self.assertEqual(enqueue_conversion(job.document), job)
+        self.assertEqual(ConversionJob.objects.count(), 1)
+
+    def test_owners_with_fewer_running_jobs_go_first(self):
+        first, second = self.enqueue(self.alice), self.enqueue(self.alice)
+        bobs = self.enqueue(self.bob)
+
+        self.assertEqual(claim_next('w1'), first)
+        # Alice has a job running, so Bob's later job is claimed before her second
+        self.assertEqual(claim_next('w2'), bobs)
+        self.assertEqual(claim_next('w3'), second)
+        self.assertIsNone(claim_next('w4'))
+
+    def test_running_caps(self):
+        for owner in (self.alice, self.alice, self.bob):
+            self.enqueue(owner)
+        with self.settings(PDF_JOB_MAX_RUNNING_PER_USER=1):
+            self.assertEqual(claim_next('w1').owner, self.alice)
+            self.assertEqual(claim_next('w2').owner, self.bob)
+            self.assertIsNone(claim_next('w3'))
+        with self.settings(PDF_JOB_MAX_RUNNING=2):
+            self.assertIsNone(claim_next('w3'))
+
+    def test_expired_leases_are_requeued_until_attempts_run_out(self):
+        job = self.enqueue(self.alice)
+        claim_next('w1')
+        self.assertEqual(heartbeat(['w1']), 1)
+        self.assertEqual(recover_stale(), 0)
+
+        self.expire(job)
+        self.assertEqual(recover_stale(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.lease_owner), ('queued', ''))
+
+        lost = claim_next('w2')
+        self.expire(job)
+        recover_stale()
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.document.conversion_status, 'failed')
+        # The worker that lost the lease cannot overwrite the outcome
+        self.assertEqual(finish_job(lost, ok=True), 0)
+
+    def test_documents_without_a_live_job_are_queued(self):
+        document = PDFDocument.objects.create(title='Orphan', pdf_file='pdfs/orphan.pdf',
+                                              uploaded_by=self.alice, conversion_status='processing')
+        self.assertEqual(recover_stale(), 1)
+        document.refresh_from_db()
+        self.assertEqual(document.conversion_status, 'pending')
+        self.assertEqual(document.conversion_jobs.get().status, 'queued')
+
+
+class TTSPoolSizeTests(SimpleTestCase):
+    @override_settings(TTS_WORKERS=None)
+    def test_unset_worker_count_is_not_one_per_cpu(self):
+        with mock.patch.object(tts.os, 'cpu_count', return_value=64):
+            self.assertEqual(tts._workers(), tts.DEFAULT_WORKERS)
+
+
+class TTSChunkingTests(SimpleTestCase):
+    TEXT = ('The first sentence is short. The second one is a little longer than that!\n'
+            'It goes on: over a line break.\n\n'
+            'A new paragraph starts here. ' + 'word ' * 30 + 'end.')
+
+    def test_chunks_respect_the_limit_and_sentence_boundaries(self):
+        chunks = list(tts.split_paragraph('One two. Three four five. Six.', max_chars=20))
+        self.assertEqual(chunks, ['One two.', 'Three four five.', 'Six.'])
+        self.assertEqual(list(tts.split_paragraph('Short. Also short.', max_chars=40)), ['Short. Also short.'])
+
+    def test_long_sentences_are_split_at_words(self):
+        chunks = list(tts.split_paragraph('word ' * 30, max_chars=24))
+        self.assertTrue(all(len(chunk) <= 24 for chunk in chunks))
+        self.assertEqual(' '.join(chunks).split(), ['word'] * 30)
+
+    def test_paragraphs_never_share_a_chunk(self):
+        chunks = list(tts.split_text(self.TEXT, max_chars=60))
+        self.assertTrue(all(len(chunk) <= 60 for chunk in chunks))
+        # The first paragraph's last chunk ends it, though the next sentence would fit
+        self.assertIn('over a line break.', chunks)
+        self.assertEqual(chunks[chunks.index('over a line break.') + 1], 'A new paragraph starts here.')
+        self.assertEqual(' '.join(chunks).split(), self.TEXT.split())
+
+    def test_file_chunks_match_string_chunks(self):
+        with tempfile.TemporaryDirectory() as root:
+            storage = FileSystemStorage(location=root)
+            name = storage.save('text.txt', ContentFile(self.TEXT.encode('utf-8')))
+            with storage.open(name) as field_file:
+                from_file = list(tts.iter_file_chunks(field_file, max_chars=60))
+        self.assertEqual(from_file, list(tts.split_text(self.TEXT, max_chars=60)))
+
+
+class AudioSegmentTests(SimpleTestCase):
+    RATE = 1000
+
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.workdir.cleanup)
+
+    def chunk(self, name, seconds):
+        path = os.path.join(self.workdir.name, name)
+        with wave.open(path, 'wb') as out:
+            out.setnchannels(1)
+            out.setsampwidth(2)
+            out.setframerate(self.RATE)
+            out.writeframes(b'\0\0' * int(seconds * self.RATE))
+        return path
+
+    def test_first_chunk_is_a_segment_and_the_rest_are_grouped(self):
+        segments = []
+
+        def on_segment(index, wav_file, start, duration, text_chars):
+            segments.append((index, start, duration, text_chars))
+
+        grouped = tts.Segments(on_segment, seconds=3)
+        for n in range(6):
+            grouped.add(self.chunk(f'{n}.wav', 1), 'abcd')
+        grouped.close()
+
+        self.assertEqual(segments, [(0, 0.0, 1.0, 4), (1, 1.0, 3.0, 12), (2, 4.0, 2.0, 8)])
+
+
+@override_settings(PDF_JOBS_IN_PROCESS=False,
+                   CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ConversionReuseTests(APITransactionTestCase):
+    def setUp(self):
+        request_started.disconnect(dispatch_uid='pdf_conversion_pool')
+        request_started.disconnect(dispatch_uid='quiz_expiry_sweeper')
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_override = override_settings(MEDIA_ROOT=media.name)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        self.owner = User.objects.create_user(username='owner', password='x', user_type='teacher')
+        self.stored = StoredDocument.objects.create(sha256='a' * 64, file='store/aa/notes.pdf')
+
+    def document(self, **kwargs):
+        return PDFDocument.objects.create(title='Notes', pdf_file=self.stored.file.name, stored=self.stored,
+                                          uploaded_by=self.owner, **kwargs)
+
+    def test_fallback_audio_is_marked_and_not_reused(self):
+        with mock.patch.object(tts, 'write_wav', side_effect=tts.TTSUnavailable('no engine')):
+            audio = convert_text_to_audio('Hello.', 'Notes')
+        self.assertTrue(audio.is_fallback)
+
+        silent = self.document(conversion_status='completed', audio_file='audio/Notes_dummy.wav',
+                               audio_is_fallback=True)
+        self.assertIsNone(find_conversion(self.stored.id))
+        spoken = self.document(conversion_status='completed', audio_file='audio/Notes.wav')
+        self.assertEqual(find_conversion(self.stored.id, exclude=silent.pk), spoken)
+
+    def test_fallback_conversions_can_be_retried(self):
+        silent = self.document(conversion_status='completed', audio_file='audio/Notes_dummy.wav',
+                               audio_is_fallback=True)
+        self.client.force_authenticate(self.owner)
+        response = self.client.post(f'/api/pdf/documents/{silent.id}/retry/')
+
+        self.assertEqual(response.status_code, 200)
+        silent.refresh_from_db()
+        self.assertEqual(silent.conversion_status, 'pending')
+        self.assertFalse(silent.audio_is_fallback)
+        self.assertEqual(silent.conversion_jobs.get().status, 'queued')
+
+    def test_reused_conversions_share_the_audio_segments(self):
+        source = self.document(conversion_status='completed', audio_file='audio/Notes.wav')
+        for index in range(2):
+            segment = AudioSegment(document=source, index=index, start=index * 60.0, duration=60.0, text_chars=10)
+            segment.audio_file.save(f'Notes_{index:04d}.wav', ContentFile(b'RIFF'), save=False)
+            segment.save()
+        copy = self.document()
+        copy_conversion(copy, source)
+        copy.save()
+
+        self.client.force_authenticate(self.owner)
+        playlist = self.client.get(f'/api/pdf/documents/{copy.id}/audio/').data
+        self.assertTrue(playlist['complete'])
+        self.assertEqual([s['index'] for s in playlist['segments']], [0, 1])
+        self.assertEqual(playlist['duration'], 120.0)
+
+        # Deleting the copy keeps the files the source still plays
+        self.client.delete(f'/api/pdf/documents/{copy.id}/delete/')
+        for segment in source.audio_segments.all():
+            self.assertTrue(segment.audio_file.storage.exists(segment.audio_file.name))
+
+
+def write_tone(path, seconds=0.1, rate=1000):
+    """A silent mono 16-bit WAV of ``seconds``"""
+    with wave.open(path, 'wb') as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(rate)
+        out.writeframes(b'\0\0' * int(seconds * rate))
+    return path
+
+
+class AudioCacheTests(SimpleTestCase):
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.workdir = workdir.name
+        self.cache = tts_cache.AudioCache(os.path.join(self.workdir, 'cache'), max_bytes=10 ** 6)
+
+    def wav(self, name, seconds=0.1):
+        return write_tone(os.path.join(self.workdir, name), seconds)
+
+    def test_key_ignores_whitespace_but_not_voice_settings(self):
+        key = tts_cache.AudioCache.key('Hello  world.\n', None, 150, 0.9)
+        self.assertEqual(key, tts_cache.AudioCache.key('Hello world.', None, 150, 0.9))
+        self.assertNotEqual(key, tts_cache.AudioCache.key('Hello world.', None, 180, 0.9))
+        self.assertNotEqual(key, tts_cache.AudioCache.key('Hello world.', 'en-gb', 150, 0.9))
+
+    def test_store_and_fetch(self):
+        key = tts_cache.AudioCache.key('Hello.', None, 150, 0.9)
+        dest = os.path.join(self.workdir, 'out.wav')
+        self.assertFalse(self.cache.fetch(key, dest))
+
+        source = self.wav('hello.wav')
+        self.cache.store(key, source)
+        self.assertTrue(self.cache.fetch(key, dest))
+        with open(dest, 'rb') as fetched, open(source, 'rb') as original:
+            self.assertEqual(fetched.read(), original.read())
+
+    def test_least_recently_used_entries_are_evicted_at_the_cap(self):
+        size = os.path.getsize(self.wav('probe.wav'))
+        self.cache.max_bytes = 3 * size
+        keys = [f'{n:064x}' for n in range(3)]
+        for n, key in enumerate(keys):
+            self.cache.store(key, self.wav(f'{n}.wav'))
+            # Distinct mtimes; the first entry is then used again
+            os.utime(self.cache._path(key), (n, n))
+        self.assertTrue(self.cache.fetch(keys[0], os.path.join(self.workdir, 'hit.wav')))
+
+        self.cache.store(f'{3:064x}', self.wav('3.wav'))
+
+        self.assertLessEqual(self.cache._scan()[1], 3 * size * tts_cache.EVICT_TO)
+        self.assertFalse(os.path.exists(self.cache._path(keys[1])))
+        self.assertTrue(os.path.exists(self.cache._path(keys[0])))
+
+    def test_corrupt_entries_are_dropped_as_misses(self):
+        key = tts_cache.AudioCache.key('Hello.', None, 150, 0.9)
+        self.cache.store(key, self.wav('hello.wav'))
+        with open(self.cache._path(key), 'r+b') as entry:
+            entry.truncate(10)
+
+        dest = os.path.join(self.workdir, 'out.wav')
+        self.assertFalse(self.cache.fetch(key, dest))
+        self.assertFalse(os.path.exists(self.cache._path(key)))
+        self.assertFalse(os.path.exists(dest))
+
+
+@override_settings(TTS_WORKERS=0)
+class CachedSynthesisTests(SimpleTestCase):
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        cache_override = override_settings(TTS_CACHE_DIR=os.path.join(workdir.name, 'cache'),
+                                           TTS_CACHE_MAX_BYTES=10 ** 6)
+        cache_override.enable()
+        self.addCleanup(cache_override.disable)
+        self.spoken = []
+
+        def synthesize(text, path, *args):
+            self.spoken.append(text)
+            write_tone(path)
+
+        for patcher in (mock.patch.object(tts, 'synthesize_chunk', side_effect=synthesize),
+                        mock.patch.object(tts.importlib.util, 'find_spec', return_value=object())):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def convert(self, text):
+        self.spoken.clear()
+        with tempfile.TemporaryFile() as out:
+            written, failed = tts.write_wav(tts.split_text(text, max_chars=60), out)
+            out.seek(0)
+            with wave.open(out, 'rb') as audio:
+                frames = audio.getnframes()
+        return written, failed, frames
+
+    def test_editing_one_sentence_only_synthesizes_that_sentence(self):
+        sentences = [f'Sentence number {n} of the paragraph.' for n in range(6)]
+        _, _, frames = self.convert(' '.join(sentences))
+        self.assertEqual(self.spoken, sentences)
+
+        # The longer sentence shifts the packing of every later chunk
+        sentences[1] = 'Sentence number 1 of the paragraph, now quite a bit longer.'
+        _, _, edited_frames = self.convert(' '.join(sentences))
+        self.assertEqual(self.spoken, [sentences[1]])
+        self.assertEqual(edited_frames, frames)
@@ -0,0 +1,641 @@
+"""
+Chunked text-to-speech in persistent worker processes.
+
+pyttsx3 synthesizes one string per call, holds the result in the engine, is
+not safe to share between threads and is slow to start. Long documents are
+therefore split on paragraph and sentence boundaries into chunks of at most
+TTS_CHUNK_CHARS characters. Each chunk is synthesized to its own WAV by one
+of TTS_WORKERS long-lived worker processes, each of which keeps one warm
+engine (TTSWorkerPool; 0 workers synthesizes inline with a fresh engine per
+chunk). The PCM frames are appended in order to one output WAV as the
+chunks finish:
+
+    with tempfile.TemporaryFile() as out:
+        written, failed = write_wav(split_text(text), out)
+
+Chunks are read lazily and only a window of two chunks per worker is in
+flight, so memory stays bounded however long the document is. The output
+header is written first and its sizes are patched when the file is closed
+(the ``wave`` module does this), so ``out`` must be seekable. Segments
+also saves the audio in pieces as it is produced, for playback during the
+conversion.
+
+Workers are started with TTS_START_METHOD ('spawn' by default). As with
+extraction, spawned workers re-import the main module: scripts that
+synthesize must keep their code under ``if __name__ == '__main__':``.
+"""
+import atexit
+import importlib.util
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import re
+import shutil
+import tempfile
+import threading
+import time
+import wave
+from collections import deque
+from concurrent.futures import Future
+from multiprocessing import connection
+
+from django.conf import settings
+
+from apps.core import metrics
+from apps.core.lazy_imports import require_module
+from . import tts_cache
+
+logger = logging.getLogger(__name__)
+
+_PARAGRAPH_RE = re.compile(r'\n\s*\n')
+_SENTENCE_RE = re.compile(r'(?<=[.!?;:])\s+')
+
+
+class TTSUnavailable(Exception):
+    """No TTS engine is installed"""
+
+
+def _chunk_chars():
+    return getattr(settings, 'TTS_CHUNK_CHARS', 1000)
+
+
+def _split_long(sentence, max_chars):
+    """Split a sentence longer than max_chars at word boundaries"""
+    piece = []
+    length = 0
+    for word in sentence.split(' '):
+        if piece and length + 1 + len(word) > max_chars:
+            yield ' '.join(piece)
+            piece, length = [], 0
+        piece.append(word)
+        length += len(word) + (1 if length else 0)
+    if piece:
+        yield ' '.join(piece)
+
+
+def split_paragraph(paragraph, max_chars=None):
+    """Pack the sentences of one paragraph into chunks of at most max_chars"""
+    max_chars = max_chars or _chunk_chars()
+    chunk = ''
+    for sentence in _SENTENCE_RE.split(' '.join(paragraph.split())):
+        for piece in (_split_long(sentence, max_chars) if len(sentence) > max_chars else (sentence,)):
+            if chunk and len(chunk) + 1 + len(piece) > max_chars:
+                yield chunk
+                chunk = ''
+            chunk = f'{chunk} {piece}' if chunk else piece
+    if chunk:
+        yield chunk
+
+
+def split_sentences(chunk):
+    """The sentences of a chunk (long sentences stay in their word-boundary pieces); the TTS cache's unit"""
+    return [sentence for sentence in _SENTENCE_RE.split(' '.join(chunk.split())) if sentence]
+
+
+def split_text(text, max_chars=None):
+    """Yield TTS chunks of a string; paragraphs (blank-line separated) never share a chunk"""
+    for paragraph in _PARAGRAPH_RE.split(text):
+        yield from split_paragraph(paragraph, max_chars)
+
+
+def iter_file_chunks(field_file, max_chars=None):
+    """Yield TTS chunks of a stored UTF-8 text file (a FieldFile), a paragraph at a time"""
+    lines = []
+    with field_file.open('rb') as text_file:
+        for raw in text_file:
+            line = raw.decode('utf-8', errors='replace')
+            if line.strip():
+                lines.append(line)
+            elif lines:
+                yield from split_paragraph(' '.join(lines), max_chars)
+                lines = []
+    if lines:
+        yield from split_paragraph(' '.join(lines), max_chars)
+
+
+# Pool size when TTS_WORKERS is unset
+DEFAULT_WORKERS = 2
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _synthesize(engine, text, path):
+    engine.save_to_file(text, path)
+    engine.runAndWait()
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        raise RuntimeError('TTS engine produced no audio')
+
+
+def _set_voice(engine, rate, volume, voice=None):
+    try:
+        if voice:
+            engine.setProperty('voice', voice)
+        engine.setProperty('rate', rate)
+        engine.setProperty('volume', volume)
+    except Exception as prop_error:
+        logger.warning("Could not set TTS properties: %s", prop_error)
+
+
+def synthesize_chunk(text, path, rate=150, volume=0.9, voice=None):
+    """Synthesize ``text`` to a WAV file at ``path`` with a fresh engine (inline mode)"""
+    engine = require_module('pyttsx3').init()
+    try:
+        _set_voice(engine, rate, volume, voice)
+        _synthesize(engine, text, path)
+    finally:
+        engine.stop()
+    return path
+
+
+def _worker_main(conn):
+    """TTS worker process: owns one warm engine and serves requests from ``conn``.
+
+    Messages in: ('synth', text, path, rate, volume, voice), ('ping',) or None to
+    exit. Messages out: ('ready', pid) or ('init_failed', error) once, then
+    ('done', path), ('error', message) or ('pong', pid) per request.
+    """
+    pyttsx3 = require_module('pyttsx3')
+    try:
+        engine = pyttsx3.init()
+    except Exception as e:
+        conn.send(('init_failed', f'{type(e).__name__}: {e}'))
+        return
+    conn.send(('ready', os.getpid()))
+    voice = None
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            return
+        if message is None:
+            return
+        if message[0] == 'ping':
+            conn.send(('pong', os.getpid()))
+            continue
+        _, text, path, rate, volume, voice_id = message
+        try:
+            if voice != (rate, volume, voice_id):
+                _set_voice(engine, rate, volume, voice_id)
+                voice = (rate, volume, voice_id)
+            _synthesize(engine, text, path)
+        except Exception as e:
+            conn.send(('error', str(e)))
+            # Don't trust the engine after a failure: start a fresh one
+            try:
+                engine.stop()
+                engine = pyttsx3.init()
+            except Exception:
+                return
+            voice = None
+        else:
+            conn.send(('done', path))
+
+
+class TTSWorkerCrashed(Exception):
+    """A TTS worker process died (twice) while synthesizing a chunk"""
+
+
+class _Worker:
+    """Parent-side handle of one TTS worker process"""
+
+    def __init__(self, context, name):
+        self.name = name
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child,), name=name, daemon=True)
+        self.process.start()
+        child.close()
+        self.started_at = self.last_seen = time.monotonic()
+        self.ready = False
+        self.closed = False
+        self.job = None
+        self.job_started = None
+        self.pinged_at = None
+
+    @property
+    def idle(self):
+        return self.ready and self.job is None and self.pinged_at is None
+
+    def stop(self, timeout=2):
+        self.ready = False
+        self.closed = True
+        try:
+            self.conn.send(None)
+        except Exception:
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(timeout)
+        self.conn.close()
+
+
+class TTSWorkerPool:
+    """Long-lived TTS worker processes, each owning one warm pyttsx3 engine.
+
+    submit() queues a chunk and returns a Future. A dispatcher thread hands
+    queued chunks to idle workers, one at a time each. It also:
+
+    - restarts a worker that dies, retrying its chunk once (TTSWorkerCrashed
+      the second time);
+    - restarts a worker whose chunk runs longer than TTS_TIMEOUT (the chunk
+      fails with TimeoutError);
+    - pings idle workers every TTS_HEALTH_INTERVAL seconds and restarts
+      those that do not answer within TTS_HEALTH_TIMEOUT;
+    - when a worker cannot start an engine at all, fails queued chunks with
+      TTSUnavailable and waits TTS_RESTART_BACKOFF seconds before trying to
+      start workers again.
+    """
+
+    def __init__(self, size=None):
+        self.size = size
+        self.restarts = 0
+        self.unavailable = None
+        self._unavailable_since = None
+        self._jobs = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopping = threading.Event()
+        self._wake_recv, self._wake_send = multiprocessing.Pipe(duplex=False)
+        self._workers = []
+
+    def start(self):
+        if _workers() <= 0:
+            return self
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name='tts-pool', daemon=True)
+                self._thread.start()
+        return self
+
+    def submit(self, text, path, rate=150, volume=0.9, voice=None):
+        future = Future()
+        self.start()
+        self._jobs.put([future, text, path, rate, volume, voice, 0])
+        self._wake()
+        return future
+
+    def stop(self, timeout=5):
+        self._stopping.set()
+        self._wake()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def _wake(self):
+        try:
+            self._wake_send.send_bytes(b'.')
+        except OSError:
+            pass
+
+    def _run(self):
+        context = multiprocessing.get_context(_setting('TTS_START_METHOD', 'spawn'))
+        size = self.size or _workers()
+        self._workers = [_Worker(context, f'tts-worker-{n}') for n in range(size)]
+        backlog = deque()
+        try:
+            while not self._stopping.is_set():
+                while True:
+                    try:
+                        backlog.append(self._jobs.get_nowait())
+                    except queue.Empty:
+                        break
+                if self.unavailable and self._unavailable_since is not None:
+                    if time.monotonic() - self._unavailable_since < _setting('TTS_RESTART_BACKOFF', 30):
+                        self._fail_all(backlog, TTSUnavailable(self.unavailable))
+                    else:
+                        # Back off over: try starting the engines again
+                        self.unavailable = self._unavailable_since = None
+                        self._workers = [_Worker(context, w.name) if w.closed or not w.process.is_alive() else w
+                                         for w in self._workers]
+                self._dispatch(backlog)
+                self._check_health(context, backlog)
+                self._publish()
+
+                # Workers stopped while the engine is unavailable wait for the back off
+                live = [w for w in self._workers if not w.closed]
+                waitables = [self._wake_recv] + [w.conn for w in live] + [w.process.sentinel for w in live]
+                for ready in connection.wait(waitables, timeout=1.0):
+                    if ready is self._wake_recv:
+                        while self._wake_recv.poll():
+                            self._wake_recv.recv_bytes()
+                        continue
+                    worker = next((w for w in live if ready in (w.conn, w.process.sentinel)), None)
+                    if worker is None:
+                        continue
+                    if worker.closed:
+                        continue
+                    if ready is worker.conn:
+                        self._receive(context, worker, backlog)
+                    elif worker.process.exitcode is not None and worker in self._workers:
+                        self._replace(context, worker, backlog, 'crashed')
+        except Exception:
+            logger.exception("TTS pool dispatcher failed")
+        finally:
+            for worker in self._workers:
+                if worker.job is not None:
+                    backlog.append(worker.job)
+                if not worker.closed:
+                    worker.stop()
+            self._workers = []
+            self._publish()
+            while True:
+                try:
+                    backlog.append(self._jobs.get_nowait())
+                except queue.Empty:
+                    break
+            self._fail_all(backlog, TTSUnavailable('TTS pool stopped'))
+
+    def _dispatch(self, backlog):
+        for worker in self._workers:
+            if not backlog:
+                return
+            if not worker.idle:
+                continue
+            job = backlog.popleft()
+            # A retried chunk's future is already running
+            if not job[0].running() and not job[0].set_running_or_notify_cancel():
+                continue
+            _, text, path, rate, volume, voice, _ = job
+            try:
+                worker.conn.send(('synth', text, path, rate, volume, voice))
+            except OSError:
+                backlog.appendleft(job)
+                continue
+            worker.job, worker.job_started = job, time.monotonic()
+
+    def _receive(self, context, worker, backlog):
+        try:
+            kind, value = worker.conn.recv()
+        except (EOFError, OSError):
+            if worker in self._workers:
+                self._replace(context, worker, backlog, 'crashed')
+            return
+        worker.last_seen = time.monotonic()
+        if kind == 'ready':
+            worker.ready = True
+        elif kind == 'pong':
+            worker.pinged_at = None
+        elif kind == 'init_failed':
+            logger.error("TTS engine failed to start in %s: %s", worker.name, value)
+            self.unavailable, self._unavailable_since = value, time.monotonic()
+            self._fail_all(backlog, TTSUnavailable(value))
+        elif kind in ('done', 'error'):
+            job, worker.job, worker.job_started = worker.job, None, None
+            if job is not None and not job[0].done():
+                if kind == 'done':
+                    job[0].set_result(value)
+                else:
+                    job[0].set_exception(RuntimeError(value))
+
+    def _check_health(self, context, backlog):
+        now = time.monotonic()
+        timeout = _setting('TTS_TIMEOUT', None)
+        interval = _setting('TTS_HEALTH_INTERVAL', 30)
+        health_timeout = _setting('TTS_HEALTH_TIMEOUT', 10)
+        for worker in list(self._workers):
+            if worker.closed or not worker.process.is_alive():
+                continue
+            if worker.job is not None and timeout and now - worker.job_started > timeout:
+                job, worker.job = worker.job, None
+                job[0].set_exception(TimeoutError(f'TTS chunk took longer than {timeout}s'))
+                self._replace(context, worker, backlog, 'timeout')
+            elif not worker.ready and timeout and now - worker.started_at > timeout:
+                self._replace(context, worker, backlog, 'start_timeout')
+            elif worker.pinged_at is not None and now - worker.pinged_at > health_timeout:
+                self._replace(context, worker, backlog, 'unresponsive')
+            elif worker.idle and now - worker.last_seen > interval:
+                try:
+                    worker.conn.send(('ping',))
+                    worker.pinged_at = now
+                except OSError:
+                    self._replace(context, worker, backlog, 'crashed')
+
+    def _replace(self, context, worker, backlog, reason):
+        """Stop ``worker`` and start a new one in its place; its chunk is retried once"""
+        index = self._workers.index(worker)
+        job, worker.job = worker.job, None
+        worker.stop(timeout=0.5)
+        if self.unavailable:
+            # Engine can't start: the stopped worker stays in place (left out of
+            # the wait) until the backoff in _run starts workers again
+            if job is not None and not job[0].done():
+                job[0].set_exception(TTSUnavailable(self.unavailable))
+            return
+        logger.warning("Restarting TTS worker %s (%s)", worker.name, reason)
+        self.restarts += 1
+        metrics.tts_worker_restarts.inc(reason=reason)
+        self._workers[index] = _Worker(context, worker.name)
+        if job is not None and not job[0].done():
+            job[-1] += 1
+            if job[-1] < 2:
+                backlog.appendleft(job)
+            else:
+                job[0].set_exception(TTSWorkerCrashed(f'TTS worker crashed twice on a {len(job[1])}-character chunk'))
+
+    def _fail_all(self, backlog, error):
+        while backlog:
+            future = backlog.popleft()[0]
+            if future.running() or future.set_running_or_notify_cancel():
+                future.set_exception(error)
+
+    def _publish(self):
+        states = {'starting': 0, 'ready': 0, 'busy': 0}
+        for worker in self._workers:
+            if worker.closed:
+                continue
+            if worker.job is not None:
+                states['busy'] += 1
+            elif worker.ready:
+                states['ready'] += 1
+            else:
+                states['starting'] += 1
+        for state, count in states.items():
+            metrics.tts_workers.set(count, state=state)
+
+
+def _workers():
+    # Not one per CPU: every web process runs its own pool and each worker keeps an engine
+    workers = _setting('TTS_WORKERS', None)
+    if workers is None:
+        return DEFAULT_WORKERS
+    return workers
+
+
+pool = TTSWorkerPool()
+
+
+def shutdown():
+    pool.stop()
+
+
+atexit.register(shutdown)
+
+
+def _append(writer, out, path):
+    """Append the frames of the chunk WAV at ``path`` to the output writer (opened on first use)"""
+    with wave.open(path, 'rb') as chunk:
+        if writer is None:
+            writer = wave.open(out, 'wb')
+            writer.setnchannels(chunk.getnchannels())
+            writer.setsampwidth(chunk.getsampwidth())
+            writer.setframerate(chunk.getframerate())
+        elif (chunk.getnchannels(), chunk.getsampwidth(), chunk.getframerate()) != (
+                writer.getnchannels(), writer.getsampwidth(), writer.getframerate()):
+            raise ValueError('chunk audio format differs from the first chunk')
+        while True:
+            frames = chunk.readframes(65536)
+            if not frames:
+                break
+            writer.writeframes(frames)
+    return writer
+
+
+class Segments:
+    """Groups synthesized chunks, in order, into playable WAV segments.
+
+    Each segment collects chunks until it holds TTS_SEGMENT_SECONDS of audio
+    and is then handed to ``on_segment(index, wav_file, start, duration,
+    text_chars)``; the file is closed afterwards. The first segment is handed
+    over after its first chunk so playback can start as early as possible.
+    Pass ``add`` as write_wav's ``on_chunk`` and call ``close()`` at the end.
+    """
+
+    def __init__(self, on_segment, seconds=None):
+        self.on_segment = on_segment
+        self.seconds = seconds or _setting('TTS_SEGMENT_SECONDS', 60)
+        self.count = 0
+        self.elapsed = 0.0
+        self._out = self._writer = None
+        self._chars = 0
+
+    def add(self, path, text):
+        if self._out is None:
+            self._out = tempfile.TemporaryFile()
+        self._writer = _append(self._writer, self._out, path)
+        self._chars += len(text)
+        if self.count == 0 or self._writer.getnframes() >= self.seconds * self._writer.getframerate():
+            self.flush()
+
+    def flush(self):
+        if self._writer is None:
+            return
+        duration = self._writer.getnframes() / self._writer.getframerate()
+        self._writer.close()
+        out, chars = self._out, self._chars
+        self._out = self._writer = None
+        self._chars = 0
+        try:
+            out.seek(0)
+            self.on_segment(self.count, out, self.elapsed, duration, chars)
+        finally:
+            out.close()
+        self.count += 1
+        self.elapsed += duration
+
+    def close(self):
+        self.flush()
+
+
+def write_wav(chunks, out, on_chunk=None):
+    """Synthesize the text ``chunks`` in order into one WAV written to ``out``.
+
+    Returns ``(written, failed)`` chunk counts. Chunks that fail are logged
+    and left out (the pool has already retried chunks whose worker crashed).
+    ``on_chunk(path, text)`` is called with each piece of audio, in order,
+    once it has been appended (see Segments): the chunk's WAV, or with the
+    TTS cache on, the WAV of each of its sentences. Raises TTSUnavailable
+    when pyttsx3 is not installed, no engine can start or the first window
+    of chunks all fail.
+
+    With the cache (see tts_cache) chunks are synthesized sentence by
+    sentence: each sentence found in the cache is reused and only the others
+    are synthesized, so a chunk with one edited sentence costs one sentence.
+    """
+    if importlib.util.find_spec('pyttsx3') is None:
+        raise TTSUnavailable('pyttsx3 is not installed')
+
+    rate = getattr(settings, 'TTS_RATE', 150)
+    volume = getattr(settings, 'TTS_VOLUME', 0.9)
+    voice = getattr(settings, 'TTS_VOICE', None)
+    cache = tts_cache.get_cache()
+    window = max(2 * _workers(), 2)
+    workdir = tempfile.mkdtemp(prefix='tts_')
+    paths = (os.path.join(workdir, f'{n}.wav') for n in itertools.count())
+    chunks = enumerate(chunks)
+    pending = deque()
+    writer = None
+    written = failed = 0
+
+    def submit_part(text, key=None):
+        """(path, text, future, key) of one piece of a chunk; no future means synthesize inline"""
+        path = next(paths)
+        if key is not None and cache.fetch(key, path):
+            cached = Future()
+            cached.set_result(path)
+            return path, text, cached, None
+        if _workers() <= 0:
+            return path, text, None, key
+        return path, text, pool.submit(text, path, rate, volume, voice), key
+
+    def submit(index, text):
+        if cache is None:
+            return index, text, [submit_part(text)]
+        return index, text, [submit_part(sentence, tts_cache.AudioCache.key(sentence, voice, rate, volume))
+                             for sentence in split_sentences(text)]
+
+    def fill():
+        while len(pending) < window:
+            item = next(chunks, None)
+            if item is None:
+                return
+            pending.append(submit(*item))
+
+    try:
+        fill()
+        while pending:
+            index, text, parts = pending.popleft()
+            try:
+                # A chunk is appended whole or not at all
+                for path, part_text, future, key in parts:
+                    if future is None:
+                        synthesize_chunk(part_text, path, rate, volume, voice)
+                    else:
+                        # The pool enforces TTS_TIMEOUT and always settles the future
+                        future.result()
+                    if key is not None:
+                        try:
+                            cache.store(key, path)
+                        except OSError as e:
+                            logger.warning("Could not cache TTS audio of chunk %d: %s", index, e)
+                for path, part_text, _, _ in parts:
+                    writer = _append(writer, out, path)
+                    if on_chunk is not None:
+                        on_chunk(path, part_text)
+                written += 1
+            except TTSUnavailable:
+                raise
+            except Exception as e:
+                logger.warning("TTS failed for chunk %d (%d characters): %s", index, len(text), e)
+                failed += 1
+                if not written and failed >= window:
+                    # Nothing has worked yet: the engine itself is broken (e.g. no eSpeak)
+                    raise TTSUnavailable(f"first {failed} chunks failed: {e}") from e
+            finally:
+                for path, *_ in parts:
+                    if os.path.exists(path):
+                        os.unlink(path)
+            fill()
+    finally:
+        for _, _, parts in pending:
+            for _, _, future, _ in parts:
+                if future is not None:
+                    future.cancel()
+        if writer is not None:
+            writer.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return written, failed
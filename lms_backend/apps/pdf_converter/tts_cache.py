@@ -0,0 +1,172 @@
+"""
+Disk cache of synthesized TTS sentences.
+
+Course material repeats itself (headers, disclaimers, definitions) and an
+edited re-upload shares most of its sentences with the original. The WAV
+of every synthesized sentence is therefore kept under TTS_CACHE_DIR, keyed
+by the SHA-256 of its normalized text and the voice, rate and volume it was
+spoken with, and write_wav() looks each sentence up before synthesizing it:
+
+    key = AudioCache.key(sentence, voice, rate, volume)
+    if not cache.fetch(key, path):
+        ...synthesize to path...
+        cache.store(key, path)
+
+The unit is the sentence (tts.split_sentences), not the packed TTS chunk:
+chunks are filled greedily, so editing one sentence of a long paragraph
+moves every later sentence into a different chunk. Keyed by sentence, only
+the edited one misses; a chunk's audio is its sentences' audio in order.
+
+The cache holds at most TTS_CACHE_MAX_BYTES, evicting least recently used
+entries: a hit touches the file's mtime, and once the cache grows past the
+limit the oldest files are deleted until it is down to 90% of it. Several
+processes may share the directory: entries are written under a temporary
+name and renamed into place, and each process's running size total is
+corrected by a directory scan whenever it evicts.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import wave
+
+from django.conf import settings
+
+from apps.core import metrics
+
+logger = logging.getLogger(__name__)
+
+# Eviction stops once the cache is down to this share of its limit
+EVICT_TO = 0.9
+
+
+def _link_or_copy(src, dest):
+    try:
+        os.link(src, dest)
+    except OSError:
+        # Other filesystem (or no hard links): copy instead
+        shutil.copyfile(src, dest)
+
+
+class AudioCache:
+    """Size-bounded LRU cache of WAV files in ``directory``"""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._size = None
+        self._lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+
+    @staticmethod
+    def key(text, voice, rate, volume):
+        normalized = ' '.join(text.split())
+        return hashlib.sha256(f'{voice or ""}\0{rate}\0{volume}\0{normalized}'.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f'{key}.wav')
+
+    def fetch(self, key, dest):
+        """Put the cached audio for ``key`` at ``dest``; returns False on a miss.
+
+        An entry that is not a readable WAV (e.g. truncated on disk) is
+        deleted and counts as a miss.
+        """
+        path = self._path(key)
+        try:
+            _link_or_copy(path, dest)
+        except FileNotFoundError:
+            metrics.record_cache('tts', False)
+            return False
+        try:
+            with wave.open(dest, 'rb') as audio:
+                audio.getnframes()
+        except (wave.Error, EOFError) as e:
+            logger.warning("Dropping corrupt TTS cache entry %s: %s", key[:12], e)
+            for broken in (dest, path):
+                try:
+                    os.unlink(broken)
+                except FileNotFoundError:
+                    pass
+            metrics.record_cache('tts', False)
+            return False
+        try:
+            os.utime(path)
+        except OSError:
+            pass  # evicted meanwhile; dest is still a complete copy
+        metrics.record_cache('tts', True)
+        return True
+
+    def store(self, key, src):
+        """Add the WAV at ``src`` under ``key``, evicting old entries if the cache is full"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        _link_or_copy(src, tmp)
+        os.replace(tmp, path)
+        size = os.path.getsize(path)
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan()[1]
+            else:
+                self._size += size
+            full = self._size > self.max_bytes
+        if full:
+            self.evict()
+
+    def _scan(self):
+        """``([(mtime, size, path), ...], total_bytes)`` of the cached files"""
+        entries, total = [], 0
+        try:
+            shards = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return entries, total
+        for shard in shards:
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if not entry.name.endswith('.wav'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        return entries, total
+
+    def evict(self):
+        """Delete least recently used entries until the cache is within EVICT_TO of its limit"""
+        with self._evict_lock:
+            entries, total = self._scan()
+            removed = 0
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes * EVICT_TO:
+                    break
+                try:
+                    os.unlink(path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass  # evicted by another process
+                total -= size
+            with self._lock:
+                self._size = total
+        if removed:
+            logger.info("Evicted %d TTS cache entries (%d bytes left)", removed, total)
+        return removed
+
+
+_cache = None
+
+
+def get_cache():
+    """The configured AudioCache, or None when TTS_CACHE_MAX_BYTES is 0"""
+    global _cache
+    directory = getattr(settings, 'TTS_CACHE_DIR', None)
+    max_bytes = getattr(settings, 'TTS_CACHE_MAX_BYTES', 0)
+    if not directory or max_bytes <= 0:
+        return None
+    if _cache is None or (_cache.directory, _cache.max_bytes) != (directory, max_bytes):
+        _cache = AudioCache(directory, max_bytes)
+    return _cache
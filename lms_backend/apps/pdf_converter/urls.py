@@ -5,6 +5,9 @@ urlpatterns = [
     path('upload/', views.upload_pdf, name='upload_pdf'),
     path('documents/', views.list_documents, name='list_documents'),
     path('documents/<int:document_id>/', views.get_document, name='get_document'),
+    path('documents/<int:document_id>/text/', views.document_text, name='document_text'),
     path('documents/<int:document_id>/delete/', views.delete_document, name='delete_document'),
+    path('documents/<int:document_id>/audio/', views.audio_playlist, name='audio_playlist'),
     path('documents/<int:document_id>/retry/', views.retry_conversion, name='retry_conversion'),
+    path('queue/', views.conversion_queue, name='conversion_queue'),
 ]
\ No newline at end of file
@@ -1,162 +1,110 @@
-import PyPDF2
-import pyttsx3
+import logging
 import os
 from django.conf import settings
-from django.core.files.base import ContentFile
+from django.core.files.base import ContentFile, File
 import tempfile
-
-def extract_text_from_pdf(pdf_file):
-    """Extract text content from PDF file"""
+import time
+from apps.core import metrics
+from apps.core.db_writer import db_writer
+from apps.core.lazy_imports import require_module
+from apps.document_store.extraction import PageStream, local_path
+from apps.document_store.store import extract, store_referenced
+from . import tts
+
+logger = logging.getLogger(__name__)
+
+def iter_pdf_text(pdf_file):
+    """Yield the text of a PDF (a path, FieldFile or uploaded file) page by page.
+
+    Chunks are page texts with their blank-line separators, produced as the
+    extraction pool finishes each page range, so the whole text is never held
+    in memory. Unreadable PDFs yield an explanatory message instead.
+
+    For files outside the document store; uploads are extracted once by
+    apps.document_store.store.extract().
+    """
+    PyPDF2 = require_module('PyPDF2')
+    pages_with_text = chars = 0
     try:
-        # Ensure file pointer is at the beginning
-        try:
-            pdf_file.seek(0)
-            print(f"File pointer reset to beginning. File size: {pdf_file.size if hasattr(pdf_file, 'size') else 'unknown'}")
-        except Exception as e:
-            print(f"Could not seek file: {e}")
-        
-        # Try to read the PDF
-        print("Creating PDF reader...")
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        print(f"PDF has {len(pdf_reader.pages)} pages")
-        
-        text = ""
-        pages_with_text = 0
-
-        # Extract text from all pages with multiple strategies
-        for page_num, page in enumerate(pdf_reader.pages):
-            try:
-                page_text = ""
-                
-                # Strategy 1: Standard extraction
-                try:
-                    page_text = page.extract_text()
-                except Exception as e1:
-                    print(f"Page {page_num + 1}: Standard extraction failed: {e1}")
-                
-                # Strategy 2: Try with space width parameter
-                if not page_text or len(page_text.strip()) == 0:
-                    try:
-                        # Some PDFs need custom space width
-                        page_text = page.extract_text(extraction_mode="layout", layout_mode_space_vertically=False)
-                    except Exception as e2:
-                        print(f"Page {page_num + 1}: Layout extraction failed: {e2}")
-                
-                # Strategy 3: Try getting text from content stream directly
-                if not page_text or len(page_text.strip()) == 0:
-                    try:
-                        if '/Contents' in page:
-                            content = page['/Contents']
-                            if content:
-                                # This is a fallback - just try to get any text
-                                page_text = page.extract_text()
-                    except Exception as e3:
-                        print(f"Page {page_num + 1}: Content stream extraction failed: {e3}")
-                
-                # Clean up the extracted text
-                if page_text:
-                    # Remove excessive whitespace but keep structure
-                    page_text = '\n'.join(line.strip() for line in page_text.split('\n') if line.strip())
-                
-                if page_text and len(page_text.strip()) > 0:
-                    text += page_text + "\n\n"
-                    pages_with_text += 1
-                    print(f"Page {page_num + 1}: Extracted {len(page_text)} characters")
-                else:
-                    print(f"Page {page_num + 1}: No text found after all strategies")
-                    
-            except Exception as page_error:
-                print(f"Warning: Could not extract text from page {page_num + 1}: {page_error}")
-                continue
-
-        print(f"Total pages with text: {pages_with_text}/{len(pdf_reader.pages)}")
-        print(f"Total text length: {len(text)} characters")
+        # Parsing runs in the extraction process pool, which reads the file by path
+        with local_path(pdf_file) as path:
+            stream = PageStream(path)
+            failed = []
+            for record in stream:
+                if record['status'] == 'error':
+                    failed.append(record['page'])
+                if record['status'] != 'ok':
+                    continue
+                yield record['text'] if pages_with_text == 0 else "\n\n" + record['text']
+                pages_with_text += 1
+                chars += len(record['text'])
+
+        if failed:
+            logger.warning("Could not extract text from pages %s", failed)
+        logger.info("Extracted text from %d/%d pages (%d characters)", pages_with_text, stream.page_count, chars)
 
         # If no text was extracted, provide a default message
-        if not text or len(text.strip()) == 0:
-            print("ERROR: No text could be extracted from any page!")
-            return "No text content could be extracted from this PDF. This may be a scanned document, contain only images, or have text in an unsupported format."
-
-        return text.strip()
+        if pages_with_text == 0:
+            logger.warning("No text could be extracted from any page")
+            yield "No text content could be extracted from this PDF. This may be a scanned document, contain only images, or have text in an unsupported format."
 
     except PyPDF2.errors.PdfReadError as pdf_error:
-        print(f"PDF read error: {pdf_error}")
-        return f"This PDF file appears to be corrupted or in an unsupported format. Error: {str(pdf_error)}"
+        logger.warning("PDF read error: %s", pdf_error)
+        yield f"This PDF file appears to be corrupted or in an unsupported format. Error: {str(pdf_error)}"
 
     except Exception as e:
-        print(f"General error extracting text: {e}")
-        import traceback
-        traceback.print_exc()
-        return f"Could not extract text from this PDF file. Error: {str(e)}"
+        logger.exception("General error extracting text: %s", e)
+        yield ("\n\n" if pages_with_text else "") + f"Could not extract text from this PDF file. Error: {str(e)}"
 
-def convert_text_to_audio(text, title):
-    """Convert text to audio using pyttsx3"""
+def extract_text_from_pdf(pdf_file):
+    """Extract text content from PDF file as one string (use iter_pdf_text for large documents)"""
+    return "".join(iter_pdf_text(pdf_file)).strip()
+
+def convert_text_to_audio(text, title, segments=None):
+    """Convert text to a WAV file with pyttsx3.
+
+    ``text`` is a string or an iterable of TTS chunks (see tts.iter_file_chunks);
+    either way it is synthesized in full, chunk by chunk, in the TTS worker
+    pool. With ``segments`` (a tts.Segments) the audio is also saved in
+    pieces as it is produced. Returns a File backed by a temporary file:
+    close it after saving. When no audio could be synthesized it returns the
+    silent placeholder of create_dummy_audio, marked ``is_fallback``.
+    """
     try:
-        # Limit text length to avoid memory issues
-        if len(text) > 5000:
-            text = text[:5000] + "... (content truncated for audio conversion)"
-
-        print(f"Converting text to audio for: {title}")
-        print(f"Text length: {len(text)} characters")
-
-        # Initialize TTS engine with error handling
-        try:
-            engine = pyttsx3.init()
-        except Exception as init_error:
-            print(f"Failed to initialize TTS engine: {init_error}")
-            raise Exception(f"TTS engine initialization failed: {str(init_error)}")
-
-        # Set properties (optional)
-        try:
-            engine.setProperty('rate', 150)  # Speed of speech
-            engine.setProperty('volume', 0.9)  # Volume level (0.0 to 1.0)
-        except Exception as prop_error:
-            print(f"Warning: Could not set TTS properties: {prop_error}")
-
-        # Create temporary file for audio
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_file:
-            temp_path = temp_file.name
+        chunks = tts.split_text(text) if isinstance(text, str) else text
+        logger.info("Converting text to audio for: %s", title)
 
-        print(f"Saving audio to: {temp_path}")
-
-        # Save audio to temporary file
+        wav_out = tempfile.TemporaryFile()
         try:
-            engine.save_to_file(text, temp_path)
-            engine.runAndWait()
-        except Exception as convert_error:
-            print(f"TTS conversion failed: {convert_error}")
-            # Clean up and try alternative method
-            if os.path.exists(temp_path):
-                os.unlink(temp_path)
-            return create_dummy_audio(title)
-
-        # Check if file was created
-        if not os.path.exists(temp_path) or os.path.getsize(temp_path) == 0:
-            print("Audio file was not created or is empty, creating dummy audio")
-            if os.path.exists(temp_path):
-                os.unlink(temp_path)
+            written, failed = tts.write_wav(chunks, wav_out, on_chunk=segments.add if segments else None)
+            if segments is not None:
+                segments.close()
+        except Exception:
+            wav_out.close()
+            raise
+        if failed:
+            logger.warning("TTS failed for %d of %d chunks of: %s", failed, written + failed, title)
+        if not written:
+            wav_out.close()
+            logger.warning("No audio was produced, creating dummy audio")
             return create_dummy_audio(title)
 
-        # Read the audio file content
-        with open(temp_path, 'rb') as audio_file:
-            audio_content = audio_file.read()
-
-        # Clean up temporary file
-        os.unlink(temp_path)
-
-        # Create Django file object
-        audio_filename = f"{title.replace(' ', '_')}.wav"
-
-        print(f"Audio conversion successful! File size: {len(audio_content)} bytes")
-        return ContentFile(audio_content, name=audio_filename)
+        wav_out.seek(0, os.SEEK_END)
+        logger.info("Audio conversion successful: %d chunks, file size: %d bytes", written, wav_out.tell())
+        wav_out.seek(0)
+        return File(wav_out, name=f"{title.replace(' ', '_')}.wav")
 
+    except tts.TTSUnavailable as e:
+        logger.warning("TTS engine not available: %s", e)
+        return create_dummy_audio(title)
     except Exception as e:
-        print(f"Error in convert_text_to_audio: {str(e)}")
+        logger.warning("Error in convert_text_to_audio: %s", e)
         # Return dummy audio file as fallback
         return create_dummy_audio(title)
 
 def create_dummy_audio(title):
     """Create a dummy audio file as fallback"""
+    metrics.fallbacks.inc(kind='dummy_audio')
     try:
         # Create a minimal WAV file header (44 bytes) with no audio data
         # This creates a valid but silent WAV file
@@ -177,55 +125,173 @@ def create_dummy_audio(title):
         ])
 
         audio_filename = f"{title.replace(' ', '_')}_dummy.wav"
-        print(f"Created dummy audio file: {audio_filename}")
-        return ContentFile(bytes(dummy_wav), name=audio_filename)
+        logger.info("Created dummy audio file: %s", audio_filename)
+        dummy = ContentFile(bytes(dummy_wav), name=audio_filename)
 
     except Exception as e:
-        print(f"Failed to create dummy audio: {e}")
+        logger.error("Failed to create dummy audio: %s", e)
         # Return minimal content as last resort
-        return ContentFile(b"Audio conversion not available", name=f"{title}.txt")
+        dummy = ContentFile(b"Audio conversion not available", name=f"{title}.txt")
+    dummy.is_fallback = True
+    return dummy
+
+def find_conversion(stored_id, exclude=None):
+    """A completed conversion of the stored content with the given id, or None.
+
+    Conversions that only got the silent fallback audio are not reused, so
+    the next upload of the content tries TTS again.
+    """
+    from .models import PDFDocument
+    if stored_id is None:
+        return None
+    return (PDFDocument.objects.filter(stored_id=stored_id, conversion_status='completed', audio_is_fallback=False)
+            .exclude(pk=exclude).exclude(audio_file='').exclude(audio_file__isnull=True)
+            .order_by('created_at').first())
+
+def copy_conversion(pdf_document, source):
+    """Point pdf_document at source's text, audio and audio segments (nothing is copied on disk).
+
+    Saves the segment rows; the caller saves pdf_document.
+    """
+    from .models import AudioSegment
+    pdf_document.text_content = source.text_content
+    pdf_document.text_file = source.text_file.name or None
+    pdf_document.audio_file = source.audio_file.name
+    pdf_document.audio_is_fallback = False
+    pdf_document.conversion_status = 'completed'
+    delete_segments(pdf_document)
+    segments = [
+        AudioSegment(document=pdf_document, index=s.index, audio_file=s.audio_file.name,
+                     start=s.start, duration=s.duration, text_chars=s.text_chars)
+        for s in source.audio_segments.all()
+    ]
+    if segments:
+        db_writer.run(AudioSegment.objects.bulk_create, segments)
+
+def delete_audio_file(pdf_document):
+    """Delete the document's audio file unless another upload of the same content shares it"""
+    from .models import PDFDocument
+    if pdf_document.audio_file and not PDFDocument.objects.filter(
+            audio_file=pdf_document.audio_file.name).exclude(pk=pdf_document.pk).exists():
+        pdf_document.audio_file.delete(save=False)
+
+def stored_document(pdf_document):
+    """The document's StoredDocument; documents uploaded before the store are moved into it"""
+    if pdf_document.stored_id is None:
+        old_file = pdf_document.pdf_file
+
+        def attach(stored):
+            pdf_document.pdf_file = stored.file.name
+            pdf_document.stored = stored
+            pdf_document.save(update_fields=['pdf_file', 'stored', 'updated_at'])
+
+        _, stored, _ = store_referenced(old_file, attach)
+        old_file.close()
+        if old_file.name != stored.file.name:
+            old_file.storage.delete(old_file.name)
+    return pdf_document.stored
+
+def delete_segments(pdf_document):
+    """Delete the document's audio segments and the files no other document's segments share"""
+    from .models import AudioSegment
+    segments = list(AudioSegment.objects.filter(document=pdf_document))
+    if not segments:
+        return
+    db_writer.run(AudioSegment.objects.filter(pk__in=[s.pk for s in segments]).delete)
+    shared = set(AudioSegment.objects.filter(audio_file__in=[s.audio_file.name for s in segments])
+                 .values_list('audio_file', flat=True))
+    for segment in segments:
+        if segment.audio_file.name not in shared:
+            segment.audio_file.delete(save=False)
+
+def segment_saver(pdf_document):
+    """on_segment callback for tts.Segments: saves each segment as an AudioSegment"""
+    from .models import AudioSegment
+    name = pdf_document.title.replace(' ', '_')
+
+    def save(index, wav_file, start, duration, text_chars):
+        segment = AudioSegment(
+            document=pdf_document, index=index, start=start, duration=duration, text_chars=text_chars
+        )
+        try:
+            segment.audio_file.save(f"{name}_{index:04d}.wav", File(wav_file), save=False)
+            db_writer.run(segment.save)
+        except Exception as e:
+            # Segments only speed up playback; the full audio is still produced
+            logger.warning("Could not save audio segment %d of %s: %s", index, pdf_document.title, e)
+            if segment.audio_file:
+                segment.audio_file.delete(save=False)
+    return save
 
 def process_pdf_to_audio(pdf_document):
     """Complete process: extract text and convert to audio"""
+    started = time.perf_counter()
     try:
-        print(f"Starting PDF processing for: {pdf_document.title}")
+        logger.info("Starting PDF processing for: %s", pdf_document.title)
 
         # Update status to processing
         pdf_document.conversion_status = 'processing'
-        pdf_document.save()
-
-        # Extract text from PDF
-        print("Extracting text from PDF...")
-        
-        # Open the file properly to ensure it's readable
-        with pdf_document.pdf_file.open('rb') as pdf_file:
-            text = extract_text_from_pdf(pdf_file)
+        db_writer.save(pdf_document, ['conversion_status', 'updated_at'])
+
+        # Same content already converted (by any user): reuse its text and audio
+        source = find_conversion(pdf_document.stored_id, exclude=pdf_document.pk)
+        if source is not None:
+            copy_conversion(pdf_document, source)
+            db_writer.save(pdf_document, ['text_content', 'text_file', 'audio_file', 'audio_is_fallback',
+                                          'conversion_status', 'updated_at'])
+            logger.info("Reused conversion of document %s for: %s", source.pk, pdf_document.title)
+            metrics.job_duration.observe(time.perf_counter() - started, queue='pdf_conversion', outcome='completed')
+            return True
+
+        # Extract text once per content through the document store (shared
+        # with the analyzer); the full text is in the stored text file
+        logger.debug("Extracting text from PDF")
+        stored = extract(stored_document(pdf_document))
+        if stored.extraction_status == 'failed':
+            text = f"This PDF file appears to be corrupted or in an unsupported format. Error: {stored.extraction_error}"
+        else:
+            text = stored.text_preview
+            pdf_document.text_file = stored.text_file.name
+        # The whole text is read aloud, streamed from the text file chunk by chunk
+        speech = tts.iter_file_chunks(stored.text_file) if stored.text_chars else None
 
         if not text or len(text.strip()) == 0:
             text = f"No text content found in the PDF: {pdf_document.title}. This may be a scanned document or contain only images."
-            print("Warning: No text extracted from PDF")
-
-        pdf_document.text_content = text
-        print(f"Text extracted successfully. Length: {len(text)} characters")
-
-        # Convert text to audio
-        print("Converting text to audio...")
-        audio_file = convert_text_to_audio(text, pdf_document.title)
-        pdf_document.audio_file = audio_file
+            logger.warning("No text extracted from PDF: %s", pdf_document.title)
+
+        # Only a preview is kept on the row; the full text lives in text_file
+        pdf_document.text_content = text.strip()
+        logger.debug("Text extracted successfully. Length: %d characters", stored.text_chars)
+
+        # Convert text to audio, publishing segments for playback as they are
+        # synthesized (leftovers of an interrupted attempt are dropped first)
+        logger.debug("Converting text to audio")
+        delete_segments(pdf_document)
+        segments = tts.Segments(segment_saver(pdf_document))
+        audio_file = convert_text_to_audio(speech or text, pdf_document.title, segments)
+        # Write the file to storage here so the serialized DB write stays small
+        try:
+            pdf_document.audio_file.save(audio_file.name, audio_file, save=False)
+        finally:
+            audio_file.close()
+        pdf_document.audio_is_fallback = getattr(audio_file, 'is_fallback', False)
 
         # Update status to completed
         pdf_document.conversion_status = 'completed'
-        pdf_document.save()
+        db_writer.save(pdf_document, ['text_content', 'text_file', 'audio_file', 'audio_is_fallback',
+                                      'conversion_status', 'updated_at'])
 
-        print(f"PDF processing completed successfully for: {pdf_document.title}")
+        logger.info("PDF processing completed successfully for: %s", pdf_document.title)
+        metrics.job_duration.observe(time.perf_counter() - started, queue='pdf_conversion', outcome='completed')
         return True
 
     except Exception as e:
-        print(f"PDF processing failed for {pdf_document.title}: {str(e)}")
+        logger.exception("PDF processing failed for %s: %s", pdf_document.title, e)
         # Update status to failed
         pdf_document.conversion_status = 'failed'
-        pdf_document.save()
+        db_writer.save(pdf_document, ['conversion_status', 'updated_at'])
+        metrics.errors.inc(component='pdf_conversion')
+        metrics.job_duration.observe(time.perf_counter() - started, queue='pdf_conversion', outcome='failed')
 
         # Don't re-raise the exception, just log it
-        print(f"Error details: {str(e)}")
         return False
\ No newline at end of file
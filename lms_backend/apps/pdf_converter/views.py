@@ -1,13 +1,22 @@
+import logging
+
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
 from django.shortcuts import get_object_or_404
 from .models import PDFDocument
-from .serializers import PDFDocumentSerializer, PDFUploadSerializer
-from .utils import process_pdf_to_audio
-import threading
+from .serializers import AudioSegmentSerializer, PDFDocumentSerializer, PDFUploadSerializer
+from .jobs import enqueue_conversion, queue_depth
+from .utils import copy_conversion, delete_audio_file, delete_segments, find_conversion
+from .signals import documents_namespace
+from apps.core.cache import get_or_set
+from apps.document_store.store import store_referenced
+
+logger = logging.getLogger(__name__)
 
 # For analyzer session creation so the converter document detail can return
 # an analyzer session when requested by the frontend (makes documents
@@ -20,6 +29,9 @@ except Exception:
     ChatSession = None
     ChatMessage = None
 
+# Listings that include these are not cached (see list_documents)
+IN_FLIGHT_STATUSES = ('pending', 'processing')
+
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 10
     page_size_query_param = 'page_size'
@@ -31,17 +43,20 @@ def upload_pdf(request):
     """Upload a PDF file for conversion"""
     serializer = PDFUploadSerializer(data=request.data)
     if serializer.is_valid():
-        pdf_document = serializer.save(uploaded_by=request.user)
-
-        # Start conversion in background thread
-        def convert_in_background():
-            try:
-                process_pdf_to_audio(pdf_document)
-            except Exception as e:
-                print(f"Conversion failed for document {pdf_document.id}: {str(e)}")
+        # Stored by content hash: a file uploaded before is not written again
+        pdf_document, stored, created = store_referenced(
+            serializer.validated_data['pdf_file'],
+            lambda stored: serializer.save(uploaded_by=request.user, pdf_file=stored.file.name, stored=stored),
+        )
 
-        thread = threading.Thread(target=convert_in_background)
-        thread.start()
+        source = None if created else find_conversion(stored.id, exclude=pdf_document.pk)
+        if source is not None:
+            # Already converted for someone else: done without a job
+            copy_conversion(pdf_document, source)
+            pdf_document.save()
+        else:
+            # Queue the conversion; the worker pool picks it up
+            enqueue_conversion(pdf_document)
 
         return Response(
             PDFDocumentSerializer(pdf_document).data,
@@ -54,18 +69,30 @@ def upload_pdf(request):
 def list_documents(request):
     """List all PDF documents for the authenticated user"""
     if request.user.user_type == 'admin':
+        owner = None
         documents = PDFDocument.objects.all()
     else:
+        owner = request.user.id
         documents = PDFDocument.objects.filter(uploaded_by=request.user)
 
-    paginator = StandardResultsSetPagination()
-    page = paginator.paginate_queryset(documents, request)
-    if page is not None:
-        serializer = PDFDocumentSerializer(page, many=True)
-        return paginator.get_paginated_response(serializer.data)
+    def build_page():
+        paginator = StandardResultsSetPagination()
+        page = paginator.paginate_queryset(documents, request)
+        if page is not None:
+            serializer = PDFDocumentSerializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data).data
+        return PDFDocumentSerializer(documents, many=True).data
 
-    serializer = PDFDocumentSerializer(documents, many=True)
-    return Response(serializer.data)
+    # While a conversion is in flight the status changes in whichever process
+    # runs the job. The default file cache shares its invalidation with this
+    # process only on the same host, and locmem not at all, so a conversion_worker
+    # elsewhere would leave the progress stale: serve those listings uncached
+    if documents.filter(conversion_status__in=IN_FLIGHT_STATUSES).exists():
+        return Response(build_page())
+
+    # Cached per owner and page; saving or deleting a document drops the owner's entries
+    key = f'{request.get_host()}{request.get_full_path()}'
+    return Response(get_or_set(documents_namespace(owner), key, build_page))
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -120,6 +147,26 @@ def get_document(request, document_id):
 
     return Response(resp_data)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def document_text(request, document_id):
+    """Full extracted text of a document, as plain text.
+
+    Document details only carry a preview (``text_preview``); this streams
+    the whole text from text_file.
+    """
+    if request.user.user_type == 'admin':
+        document = get_object_or_404(PDFDocument, id=document_id)
+    else:
+        document = get_object_or_404(PDFDocument, id=document_id, uploaded_by=request.user)
+
+    if document.text_file:
+        return FileResponse(document.text_file.open('rb'), content_type='text/plain; charset=utf-8')
+    if document.conversion_status != 'completed':
+        return Response({'error': 'Text is not extracted yet'}, status=status.HTTP_404_NOT_FOUND)
+    # Converted before the text was kept in a file: text_content is the full text
+    return HttpResponse(document.text_content, content_type='text/plain; charset=utf-8')
+
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
 def delete_document(request, document_id):
@@ -129,44 +176,81 @@ def delete_document(request, document_id):
     else:
         document = get_object_or_404(PDFDocument, id=document_id, uploaded_by=request.user)
 
-    # Delete associated files
-    if document.pdf_file:
-        document.pdf_file.delete()
-    if document.audio_file:
-        document.audio_file.delete()
+    # Delete associated files. The PDF and text of stored documents are shared
+    # and released with the last reference (see signals); audio may be shared
+    # with other uploads of the same content.
+    if document.stored_id is None:
+        if document.pdf_file:
+            document.pdf_file.delete()
+        if document.text_file:
+            document.text_file.delete()
+    delete_audio_file(document)
+    delete_segments(document)
 
     document.delete()
     return Response({'message': 'Document deleted successfully'}, status=status.HTTP_200_OK)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def audio_playlist(request, document_id):
+    """Audio segments synthesized so far, in playback order.
+
+    Clients can start playing while the conversion runs and poll again
+    (after ``poll_after`` seconds) until ``complete``; once completed the
+    full audio is in ``audio_file`` too.
+    """
+    if request.user.user_type == 'admin':
+        document = get_object_or_404(PDFDocument, id=document_id)
+    else:
+        document = get_object_or_404(PDFDocument, id=document_id, uploaded_by=request.user)
+
+    segments = AudioSegmentSerializer(document.audio_segments.all(), many=True).data
+    complete = document.conversion_status in ('completed', 'failed')
+    return Response({
+        'document': document.id,
+        'conversion_status': document.conversion_status,
+        'complete': complete,
+        'audio_file': document.audio_file.url if complete and document.audio_file else None,
+        'segments': segments,
+        'duration': sum(segment['duration'] for segment in segments),
+        'poll_after': None if complete else settings.AUDIO_PLAYLIST_POLL_SECONDS,
+    })
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def retry_conversion(request, document_id):
-    """Retry conversion for a failed document"""
+    """Retry conversion for a failed document, or one that only got the silent fallback audio"""
     if request.user.user_type == 'admin':
         document = get_object_or_404(PDFDocument, id=document_id)
     else:
         document = get_object_or_404(PDFDocument, id=document_id, uploaded_by=request.user)
 
-    if document.conversion_status != 'failed':
+    if document.conversion_status != 'failed' and not (
+            document.conversion_status == 'completed' and document.audio_is_fallback):
         return Response(
-            {'error': 'Can only retry failed conversions'},
+            {'error': 'Can only retry failed conversions or conversions without audio'},
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    # Reset status and retry conversion
+    # Reset status and queue the conversion again
+    if document.audio_is_fallback:
+        delete_audio_file(document)
+        document.audio_file = None
+        document.audio_is_fallback = False
     document.conversion_status = 'pending'
     document.save()
-
-    def convert_in_background():
-        try:
-            process_pdf_to_audio(document)
-        except Exception as e:
-            print(f"Retry conversion failed for document {document.id}: {str(e)}")
-
-    thread = threading.Thread(target=convert_in_background)
-    thread.start()
+    enqueue_conversion(document)
 
     return Response(
         PDFDocumentSerializer(document).data,
         status=status.HTTP_200_OK
-    )
\ No newline at end of file
+    )
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def conversion_queue(request):
+    """Conversion queue depth, overall and for the current user"""
+    return Response({
+        'queue': queue_depth(),
+        'mine': queue_depth(owner=request.user),
+    })
\ No newline at end of file
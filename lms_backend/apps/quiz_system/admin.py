@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Quiz, Question, Choice, QuizSession, Answer
+from .models import Quiz, Question, Choice, QuizSession, Answer, BankQuestion
 
 class ChoiceInline(admin.TabularInline):
     model = Choice
@@ -41,12 +41,23 @@ class QuestionAdmin(admin.ModelAdmin):
         return obj.question_text[:50] + "..." if len(obj.question_text) > 50 else obj.question_text
     question_text_short.short_description = 'Question Text'
 
+@admin.register(BankQuestion)
+class BankQuestionAdmin(admin.ModelAdmin):
+    list_display = ['question_text_short', 'topic', 'difficulty', 'created_by', 'source', 'times_used', 'created_at']
+    list_filter = ['difficulty', 'source', 'created_at']
+    search_fields = ['question_text', 'topic', 'created_by__username']
+    readonly_fields = ['text_hash', 'times_used', 'created_at']
+
+    def question_text_short(self, obj):
+        return obj.question_text[:50] + "..." if len(obj.question_text) > 50 else obj.question_text
+    question_text_short.short_description = 'Question Text'
+
 @admin.register(QuizSession)
 class QuizSessionAdmin(admin.ModelAdmin):
-    list_display = ['student', 'quiz', 'status', 'score', 'started_at', 'completed_at']
+    list_display = ['student', 'quiz', 'status', 'score', 'started_at', 'completed_at', 'expires_at']
     list_filter = ['status', 'quiz__difficulty', 'started_at']
     search_fields = ['student__username', 'quiz__title']
-    readonly_fields = ['started_at', 'completed_at']
+    readonly_fields = ['started_at', 'completed_at', 'expires_at']
 
 @admin.register(Answer)
 class AnswerAdmin(admin.ModelAdmin):
@@ -2,4 +2,21 @@ from django.apps import AppConfig
 
 class QuizSystemConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'apps.quiz_system'
\ No newline at end of file
+    name = 'apps.quiz_system'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+        from django.conf import settings
+        if getattr(settings, 'QUIZ_SWEEP_IN_PROCESS', True):
+            # Like the conversion pool: only processes that serve HTTP sweep
+            from django.core.signals import request_started
+            request_started.connect(_start_expiry_sweeper, dispatch_uid='quiz_expiry_sweeper')
+
+
+def _start_expiry_sweeper(**kwargs):
+    from django.core.signals import request_started
+    from .sweeper import sweeper
+
+    request_started.disconnect(dispatch_uid='quiz_expiry_sweeper')
+    sweeper.start()
@@ -0,0 +1,91 @@
+"""
+Async versions of the AI-bound quiz views, used when ASYNC_AI_VIEWS is set
+and the project is served by an ASGI server. The Gemini call is awaited on
+the event loop; database work runs through sync_to_async.
+"""
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+from rest_framework import status
+
+from apps.core.async_api import api_response, async_api_view
+from .models import LiveQuizSession
+from .serializers import QuizCreateSerializer, QuizSerializer, LiveSessionCreateSerializer
+from .utils import agenerate_questions_with_ai, create_quiz_from_questions
+
+
+@async_api_view(['POST'])
+async def create_quiz(request):
+    """Create a new quiz using AI generation"""
+    if request.user.user_type not in ['teacher', 'admin']:
+        return api_response({'error': 'Only teachers and admins can create quizzes'},
+                            status=status.HTTP_403_FORBIDDEN)
+
+    serializer = QuizCreateSerializer(data=request.data)
+    if not await sync_to_async(serializer.is_valid)():
+        return api_response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    data = serializer.validated_data
+    try:
+        questions_data = await agenerate_questions_with_ai(
+            data['topic'], data['difficulty'], data['number_of_questions'])
+
+        def save():
+            quiz = create_quiz_from_questions(
+                questions_data,
+                title=data['title'],
+                topic=data['topic'],
+                difficulty=data['difficulty'],
+                created_by=request.user,
+                time_limit=data.get('time_limit', 30),
+            )
+            response_data = QuizSerializer(quiz).data
+            response_data['quiz_code'] = quiz.quiz_code
+            response_data['room_code'] = quiz.quiz_code
+            return response_data
+
+        return api_response(await sync_to_async(save)(), status=status.HTTP_201_CREATED)
+    except Exception as e:
+        return api_response({'error': f'Failed to create quiz: {str(e)}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+
+@async_api_view(['POST'])
+async def live_create(request):
+    if request.user.user_type not in ['teacher', 'admin']:
+        return api_response({'error': 'Only teachers and admins can create live sessions'},
+                            status=status.HTTP_403_FORBIDDEN)
+
+    serializer = LiveSessionCreateSerializer(data=request.data)
+    if not serializer.is_valid():
+        return api_response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    data = serializer.validated_data
+    questions_data = await agenerate_questions_with_ai(
+        data['topic'], data['difficulty'], data['number_of_questions'])
+
+    def save():
+        quiz = create_quiz_from_questions(
+            questions_data,
+            title=f"Live: {data['topic']} ({data['difficulty']})",
+            topic=data['topic'],
+            difficulty=data['difficulty'],
+            created_by=request.user,
+            time_limit=30,
+        )
+        try:
+            live = LiveQuizSession.objects.create(
+                quiz=quiz,
+                room_code=quiz.quiz_code,
+                host=request.user,
+                topic=quiz.topic,
+                difficulty=quiz.difficulty,
+                num_questions=quiz.number_of_questions,
+                is_active=True,
+                started_at=timezone.now(),
+            )
+        except Exception:
+            # Room code collision: fall back to returning the quiz code, like the sync view
+            return {'room_code': quiz.quiz_code, 'quiz_id': str(quiz.id)}
+        return {'room_code': live.room_code, 'live_session_id': str(live.id), 'quiz_id': str(quiz.id)}
+
+    return api_response(await sync_to_async(save)(), status=status.HTTP_201_CREATED)
@@ -0,0 +1,55 @@
+"""
+Autosave for quiz sessions.
+
+Each autosave request is written before it returns, as a single upsert keyed
+on (session, question), so every worker process (and submit_quiz, wherever it
+runs) sees it. Nothing is buffered between requests: saving a question again
+overwrites its row instead of adding one, and if a request lists a question
+twice only its last answer is written.
+
+The upsert runs directly in the request's own short IMMEDIATE transaction,
+not through the background writer (apps.core.db_writer), so a student's save
+never waits behind conversion jobs or shares a commit with their writes. The
+session status is checked in the same transaction, so an autosave that races
+a submit never alters a graded session.
+"""
+from django.db import transaction
+
+from .models import Answer, QuizSession
+from .utils import load_answer_key
+
+
+def _upsert_in_transaction(session_id, rows):
+    with transaction.atomic():
+        if not QuizSession.objects.filter(id=session_id, status='started').exists():
+            return None
+        Answer.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['session', 'question'],
+            update_fields=['selected_choice', 'text_answer', 'is_correct'],
+        )
+    return len(rows)
+
+
+def save_answers(session, answers):
+    """Upsert validated answers for a started session in one IMMEDIATE transaction.
+
+    Returns how many were written, or None if the session is no longer
+    started (e.g. it was submitted meanwhile).
+    """
+    key = load_answer_key(session.quiz_id)
+    rows = {}
+    for answer in answers:
+        question_id = answer['question']
+        choice_id = answer.get('selected_choice')
+        rows[question_id] = Answer(
+            session_id=session.id,
+            question_id=question_id,
+            selected_choice_id=choice_id,
+            text_answer=answer.get('text_answer', ''),
+            is_correct=key.is_correct(question_id, choice_id),
+        )
+    if not rows:
+        return 0
+    return _upsert_in_transaction(session.id, list(rows.values()))
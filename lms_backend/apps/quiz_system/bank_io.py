@@ -0,0 +1,138 @@
+"""
+Streaming JSON Lines import/export for the question bank.
+
+One question per line, using the same keys the AI generator produces:
+{"topic": ..., "difficulty": ..., "question": ..., "options": [...],
+ "correct_answer": 0, "explanation": ...}
+
+Exports are produced row by row from a server-side cursor and can be gzip
+compressed on the fly; imports read the upload line by line (plain or gzip,
+detected from the magic bytes) and write in batches, so neither direction
+holds the whole bank in memory.
+"""
+import gzip
+import io
+import json
+import zlib
+
+from .models import Quiz, BankQuestion
+from .utils import add_questions_to_bank, normalize_topic
+
+GZIP_MAGIC = b'\x1f\x8b'
+EXPORT_CHUNK_SIZE = 500
+IMPORT_BATCH_SIZE = 500
+
+_DIFFICULTIES = {value for value, _ in Quiz.DIFFICULTY_CHOICES}
+
+
+def iter_bank_jsonl(queryset):
+    """Yield one compact JSON line (bytes) per bank question"""
+    rows = queryset.values_list('topic', 'difficulty', 'question_text', 'options', 'correct_answer', 'explanation')
+    for topic, difficulty, question_text, options, correct_answer, explanation in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        record = {
+            'topic': topic,
+            'difficulty': difficulty,
+            'question': question_text,
+            'options': options,
+            'correct_answer': correct_answer,
+            'explanation': explanation,
+        }
+        yield (json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+def gzip_stream(chunks, level=6):
+    """Gzip-compress an iterable of byte chunks incrementally"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+# Damaged uploads: unreadable or truncated gzip (BadGzipFile is an OSError) and bad UTF-8
+READ_ERRORS = (OSError, EOFError, UnicodeDecodeError)
+
+
+def open_jsonl_upload(uploaded_file):
+    """Text stream over an uploaded JSON Lines file, transparently gunzipping"""
+    uploaded_file.seek(0)
+    head = uploaded_file.read(2)
+    uploaded_file.seek(0)
+    raw = gzip.GzipFile(fileobj=uploaded_file) if head == GZIP_MAGIC else uploaded_file
+    return io.TextIOWrapper(raw, encoding='utf-8')
+
+
+def _parse_record(line):
+    """Validate one JSONL record, returning a question dict or None"""
+    try:
+        record = json.loads(line)
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(record, dict):
+        return None
+    question = record.get('question')
+    options = record.get('options')
+    topic = record.get('topic')
+    if not isinstance(question, str) or not question.strip() or not isinstance(topic, str) or not topic.strip():
+        return None
+    if not isinstance(options, list) or len(options) < 2:
+        return None
+    difficulty = record.get('difficulty')
+    return {
+        'topic': topic.strip(),
+        'difficulty': difficulty if difficulty in _DIFFICULTIES else 'mixed',
+        'question': question,
+        'options': options,
+        'correct_answer': record.get('correct_answer', 0),
+        'explanation': record.get('explanation') or '',
+    }
+
+
+def _flush(batch, created_by):
+    groups = {}
+    for record in batch:
+        key = (normalize_topic(record['topic']), record['difficulty'])
+        groups.setdefault(key, []).append(record)
+    for records in groups.values():
+        add_questions_to_bank(records, records[0]['topic'], records[0]['difficulty'], created_by, source='import')
+
+
+def import_bank_jsonl(stream, created_by):
+    """Import questions from a JSONL text stream into a teacher's bank.
+
+    Returns a report with the number of lines read, rejected lines and
+    questions added to the bank (existing and near-duplicate questions are
+    reused rather than added). Batches are committed as they fill, so when
+    the file turns out to be damaged part way (e.g. a truncated gzip) the
+    lines read so far stay imported and the report carries ``error`` (and
+    ``partial`` when anything was read).
+    """
+    before = BankQuestion.objects.filter(created_by=created_by).count()
+    lines = 0
+    rejected = 0
+    batch = []
+    error = None
+    try:
+        for line in stream:
+            if not line.strip():
+                continue
+            lines += 1
+            record = _parse_record(line)
+            if record is None:
+                rejected += 1
+                continue
+            batch.append(record)
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                _flush(batch, created_by)
+                batch = []
+    except READ_ERRORS as e:
+        error = f'Could not read import file after line {lines}: {e or type(e).__name__}'
+    if batch:
+        _flush(batch, created_by)
+
+    added = BankQuestion.objects.filter(created_by=created_by).count() - before
+    report = {'lines': lines, 'rejected': rejected, 'added': added, 'reused': lines - rejected - added}
+    if error:
+        report.update(partial=lines > 0, error=error)
+    return report
@@ -0,0 +1,200 @@
+"""
+Near-duplicate question detection using shingled MinHash signatures and an LSH index.
+
+Question texts are stripped of the boilerplate phrases used to create question
+variants (e.g. a leading "Consider this:" or a trailing "Select the best answer:")
+and of grammatical filler words, shingled into word bigrams and summarized by a
+MinHash signature. Signatures are banded into an LSH index so a lookup only
+compares against the few questions sharing a band, which keeps lookups
+sub-linear in the size of a quiz or question bank. Bank questions persist their
+band keys (band_hashes) so lookups query only matching buckets. Changing the
+normalization changes every signature: ship a migration that recomputes the
+stored ones (see 0010_resign_bank_questions).
+
+Texts with no content words (only filler) have an empty signature: they are
+never indexed or matched as near-duplicates, only by exact text.
+"""
+import hashlib
+import itertools
+import random
+import re
+
+NUM_PERM = 64
+NUM_BANDS = 16
+DEFAULT_THRESHOLD = 0.7
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_pending_keys = itertools.count()
+
+# Phrases prepended/appended to a question to make variants of it; removed as
+# whole phrases (repeatedly, as they can stack), never word by word
+_BOILERPLATE_PREFIX_RE = re.compile(
+    r"^\s*(?:consider this|analy[sz]e the following|from the given options|final review"
+    r"|review question\s*#?\s*\d*|extra)\s*[:,]\s*",
+    re.IGNORECASE,
+)
+_BOILERPLATE_SUFFIX_RE = re.compile(r"\s*(?:select the best answer\s*:?|\(\d+\))\s*$", re.IGNORECASE)
+
+# Grammatical words only: articles, forms of be/do and question words (so
+# "What is X?" and "Which is X?" match). Content words such as "best" or "given"
+# are kept, as they can be what tells two questions apart.
+_FILLER_WORDS = frozenset("""
+    a an the is are was were be been do does did
+    what which who whom whose when where why how
+""".split())
+
+
+def strip_boilerplate(text):
+    """Question text without the variant phrases around it"""
+    text = text or ''
+    while True:
+        stripped = _BOILERPLATE_SUFFIX_RE.sub('', _BOILERPLATE_PREFIX_RE.sub('', text, count=1), count=1)
+        if stripped == text:
+            return text
+        text = stripped
+
+
+def _shingles(text):
+    """Content-word bigrams of a question text (unigrams for one-word texts)"""
+    tokens = [t for t in _TOKEN_RE.findall(strip_boilerplate(text).lower()) if t not in _FILLER_WORDS]
+    if len(tokens) < 2:
+        return set(tokens)
+    return {f"{a} {b}" for a, b in zip(tokens, tokens[1:])}
+
+
+def _hash_shingle(shingle):
+    return int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class MinHasher:
+    """Computes fixed-size MinHash signatures with deterministic permutations.
+
+    The permutations are seeded so signatures can be persisted and compared
+    across processes.
+    """
+
+    def __init__(self, num_perm=NUM_PERM, seed=1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._perms = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, text):
+        """MinHash signature of ``text``; empty when it has no content words"""
+        hashes = [_hash_shingle(s) for s in _shingles(text)]
+        if not hashes:
+            return []
+        return [
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self._perms
+        ]
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of two signatures"""
+    if not sig_a or len(sig_a) != len(sig_b):
+        return 0.0
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a)
+
+
+def band_hashes(signature, num_bands=NUM_BANDS):
+    """Stable string keys of a signature's LSH bands (empty for an empty signature)"""
+    if not signature:
+        return []
+    rows = len(signature) // num_bands
+    return [
+        hashlib.blake2b(f"{band}:{signature[band * rows:(band + 1) * rows]}".encode('ascii'),
+                        digest_size=8).hexdigest()
+        for band in range(num_bands)
+    ]
+
+
+class LSHIndex:
+    """Banded LSH index over MinHash signatures"""
+
+    def __init__(self, num_perm=NUM_PERM, num_bands=NUM_BANDS, threshold=DEFAULT_THRESHOLD):
+        if num_perm % num_bands:
+            raise ValueError("num_perm must be divisible by num_bands")
+        self.rows = num_perm // num_bands
+        self.num_bands = num_bands
+        self.threshold = threshold
+        self._buckets = [{} for _ in range(num_bands)]
+        self._signatures = {}
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def _band_keys(self, signature):
+        for band in range(self.num_bands):
+            start = band * self.rows
+            yield band, tuple(signature[start:start + self.rows])
+
+    def add(self, key, signature):
+        if not signature:
+            return
+        self._signatures[key] = signature
+        for band, band_key in self._band_keys(signature):
+            self._buckets[band].setdefault(band_key, []).append(key)
+
+    def candidates(self, signature):
+        found = set()
+        for band, band_key in self._band_keys(signature):
+            found.update(self._buckets[band].get(band_key, ()))
+        return found
+
+    def find_duplicate(self, signature):
+        """Key of the most similar indexed item at or above the threshold, else None"""
+        if not signature:
+            return None
+        best_key, best_score = None, self.threshold
+        for key in self.candidates(signature):
+            score = similarity(signature, self._signatures[key])
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
+
+
+_default_hasher = None
+
+
+def get_hasher():
+    global _default_hasher
+    if _default_hasher is None:
+        _default_hasher = MinHasher()
+    return _default_hasher
+
+
+def question_signature(question_text):
+    return get_hasher().signature(question_text)
+
+
+def partition_near_duplicates(questions, index=None, key='question'):
+    """Split question dicts into (distinct, near_duplicates), preserving order.
+
+    ``index`` may be a pre-populated LSHIndex (e.g. a teacher's bank); distinct
+    questions are added to it as they are accepted.
+    """
+    index = index if index is not None else LSHIndex()
+    distinct, duplicates = [], []
+    exact = set()  # filler-only texts, which have no signature
+    for q in questions:
+        text = q.get(key)
+        if not text:
+            continue
+        signature = question_signature(text)
+        if not signature:
+            normalized = ' '.join(text.lower().split())
+            if normalized in exact:
+                duplicates.append(q)
+                continue
+            exact.add(normalized)
+        elif index.find_duplicate(signature) is not None:
+            duplicates.append(q)
+            continue
+        index.add(('pending', next(_pending_keys)), signature)
+        distinct.append(q)
+    return distinct, duplicates
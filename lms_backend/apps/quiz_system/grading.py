@@ -0,0 +1,228 @@
+"""
+Set-based grading of many sessions at once.
+
+submit_batch serves offline classroom sync: a teacher's device uploads many
+students' answer sets for one quiz, graded in one pass against a single loaded
+answer key and written with a few bulk statements.
+
+sweep_expired_sessions closes sessions past their deadline: a range query on
+the (status, expires_at) index picks a batch, and UPDATE statements grade and
+complete (or abandon) the whole batch at once. apps.quiz_system.sweeper runs
+it every QUIZ_SWEEP_INTERVAL seconds.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Exists, FloatField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf, Round
+from django.utils import timezone
+
+from .models import Answer, QuizSession
+from .utils import load_answer_key, grade_stored_answers
+
+User = get_user_model()
+
+
+def _resolve_sessions(quiz, submissions):
+    """Map each submission to its QuizSession, preparing sessions for offline joins.
+
+    A student with several sessions for the quiz maps to the latest one that
+    is still started (or else the latest). Students without a session get an
+    unsaved QuizSession; submit_batch only creates those whose submission is
+    accepted. Returns (sessions_by_index, errors_by_index).
+    """
+    errors = {}
+    session_ids = {s['session_id'] for s in submissions if s.get('session_id')}
+    student_ids = {s['student'] for s in submissions if not s.get('session_id') and s.get('student')}
+
+    by_id = {s.id: s for s in QuizSession.objects.filter(quiz=quiz, id__in=session_ids)}
+    by_student = {}
+    if student_ids:
+        for session in QuizSession.objects.filter(quiz=quiz, student_id__in=student_ids).order_by('started_at'):
+            current = by_student.get(session.student_id)
+            if current is None or session.status == 'started' or current.status != 'started':
+                by_student[session.student_id] = session
+        students = User.objects.filter(id__in=student_ids - by_student.keys(), user_type='student') \
+            .values_list('id', flat=True)
+        expires_at = QuizSession.compute_expires_at(quiz)
+        by_student.update({
+            student_id: QuizSession(quiz=quiz, student_id=student_id, status='started', expires_at=expires_at)
+            for student_id in students
+        })
+
+    sessions = {}
+    for i, submission in enumerate(submissions):
+        if submission.get('session_id'):
+            session = by_id.get(submission['session_id'])
+        elif submission.get('student'):
+            session = by_student.get(submission['student'])
+        else:
+            errors[i] = 'session_id or student is required'
+            continue
+        if session is None:
+            errors[i] = 'Session or student not found for this quiz'
+        elif session.status != 'started':
+            errors[i] = 'Quiz session is not active'
+        else:
+            sessions[i] = session
+    return sessions, errors
+
+
+def submit_batch(quiz, submissions):
+    """Grade and store many sessions' answers for one quiz.
+
+    ``submissions`` is a list of dicts with ``session_id`` or ``student``,
+    ``answers`` (question/selected_choice/text_answer) and an optional
+    ``completed_at``. Submissions completed (or, without ``completed_at``,
+    arriving) after the session's deadline plus grace period are rejected,
+    like late submit_quiz calls; ``completed_at`` is clamped to the session's
+    start and the current time. Returns one result dict per submission, in order.
+    """
+    key = load_answer_key(quiz.id, use_cache=False)
+    grace = timedelta(seconds=getattr(settings, 'QUIZ_SESSION_GRACE_SECONDS', 30))
+    now = timezone.now()
+
+    with transaction.atomic():
+        sessions, errors = _resolve_sessions(quiz, submissions)
+
+        accepted = {}
+        completed_at = {}
+        seen = set()
+        for i, session in sessions.items():
+            answers = submissions[i].get('answers', [])
+            invalid = next((a['question'] for a in answers
+                            if not key.validate(a['question'], a.get('selected_choice'))), None)
+            # The device's completion time is only trusted within the session's
+            # lifetime: never later than now or the deadline plus grace period
+            stated = min(submissions[i].get('completed_at') or now, now)
+            deadline = session.expires_at + grace if session.expires_at else None
+            if invalid is not None:
+                errors[i] = f'Invalid question or choice for question {invalid}'
+            elif deadline is not None and stated > deadline:
+                errors[i] = 'Time limit exceeded'
+            elif session.id in seen:
+                errors[i] = 'Duplicate submission for this session'
+            else:
+                seen.add(session.id)
+                accepted[i] = session
+                completed_at[i] = stated
+
+        # Sessions for offline joins are only created for accepted submissions
+        QuizSession.objects.bulk_create([s for s in accepted.values() if s._state.adding])
+        session_ids = [s.id for s in accepted.values()]
+
+        # Answers already stored (e.g. autosaved before going offline) are
+        # graded too; submitted answers replace them question by question
+        answer_sets = {sid: {} for sid in session_ids}
+        for sid, question_id, choice_id, text_answer in Answer.objects.filter(session_id__in=session_ids) \
+                .values_list('session_id', 'question_id', 'selected_choice_id', 'text_answer'):
+            answer_sets[sid][question_id] = (choice_id, text_answer)
+        for i, session in accepted.items():
+            for a in submissions[i].get('answers', []):
+                answer_sets[session.id][a['question']] = (a.get('selected_choice'), a.get('text_answer', ''))
+
+        rows = []
+        for sid, answers in answer_sets.items():
+            for question_id, (choice_id, text_answer) in answers.items():
+                is_correct = key.is_correct(question_id, choice_id)
+                rows.append(Answer(
+                    session_id=sid,
+                    question_id=question_id,
+                    selected_choice_id=choice_id,
+                    text_answer=text_answer,
+                    is_correct=is_correct,
+                    points_earned=key.questions[question_id][0] if is_correct else 0,
+                ))
+        Answer.objects.bulk_create(
+            rows,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['session', 'question'],
+            update_fields=['selected_choice', 'text_answer', 'is_correct', 'points_earned'],
+        )
+
+        for i, session in accepted.items():
+            answers = answer_sets[session.id]
+            total_points = sum(key.questions[q][0] for q in answers)
+            earned_points = sum(key.questions[q][0] for q, (c, _) in answers.items() if key.is_correct(q, c))
+            session.status = 'completed'
+            # started_at of sessions created above is set by now
+            session.completed_at = max(completed_at[i], session.started_at)
+            session.total_points = total_points
+            session.score = round(earned_points / total_points * 100, 2) if total_points > 0 else 0
+        QuizSession.objects.bulk_update(
+            list(accepted.values()), ['status', 'completed_at', 'score', 'total_points'], batch_size=500
+        )
+
+    results = []
+    for i, submission in enumerate(submissions):
+        if i in accepted:
+            session = accepted[i]
+            results.append({
+                'index': i,
+                'session_id': str(session.id),
+                'student': session.student_id,
+                'status': 'completed',
+                'score': session.score,
+                'total_points': session.total_points,
+            })
+        else:
+            results.append({
+                'index': i,
+                'session_id': str(submission['session_id']) if submission.get('session_id') else None,
+                'student': submission.get('student'),
+                'status': 'error',
+                'error': errors.get(i, 'Not processed'),
+            })
+    return results
+
+
+def _session_points(field):
+    """Per-session SUM over stored answers, as a correlated subquery"""
+    return Subquery(
+        Answer.objects.filter(session_id=OuterRef('pk'))
+        .values('session_id')
+        .annotate(total=Sum(field))
+        .values('total')
+    )
+
+
+def sweep_expired_sessions(now=None, batch_size=500, policy=None):
+    """Close 'started' sessions whose deadline (plus grace period) has passed.
+
+    With the 'submit' policy, expired sessions that have stored answers are
+    graded and completed at their deadline, and empty ones are abandoned; the
+    'abandon' policy abandons all of them. Returns a dict of counts.
+    """
+    now = now or timezone.now()
+    policy = policy or getattr(settings, 'QUIZ_EXPIRED_SESSION_POLICY', 'submit')
+    cutoff = now - timedelta(seconds=getattr(settings, 'QUIZ_SESSION_GRACE_SECONDS', 30))
+    counts = {'completed': 0, 'abandoned': 0}
+
+    while True:
+        # Range scan on the (status, expires_at) index; no full table scan
+        ids = list(
+            QuizSession.objects.filter(status='started', expires_at__lt=cutoff)
+            .order_by('expires_at')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return counts
+
+        with transaction.atomic():
+            batch = QuizSession.objects.filter(id__in=ids, status='started')
+            if policy == 'submit':
+                has_answers = Exists(Answer.objects.filter(session_id=OuterRef('pk')))
+                to_complete = batch.filter(has_answers)
+                grade_stored_answers(Answer.objects.filter(session__in=to_complete).values('session_id'))
+                total = _session_points('question__points')
+                earned = Cast(Coalesce(_session_points('points_earned'), 0), FloatField())
+                counts['completed'] += to_complete.update(
+                    status='completed',
+                    completed_at=Coalesce('expires_at', Value(now)),
+                    total_points=Coalesce(total, 0),
+                    score=Coalesce(Round(earned * 100.0 / NullIf(total, 0), 2), 0.0),
+                )
+            counts['abandoned'] += batch.filter(status='started').update(status='abandoned')
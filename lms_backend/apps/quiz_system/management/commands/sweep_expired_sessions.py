@@ -0,0 +1,50 @@
+"""
+Management command to close quiz sessions that ran past their time limit
+Web processes already sweep every QUIZ_SWEEP_INTERVAL seconds (apps.quiz_system.sweeper);
+with QUIZ_SWEEP_IN_PROCESS=0, run this one via cron or with --interval instead
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.quiz_system.grading import sweep_expired_sessions
+
+
+class Command(BaseCommand):
+    help = 'Auto-submit or abandon quiz sessions whose deadline has passed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--policy',
+            choices=['submit', 'abandon'],
+            help='submit: grade sessions with answers and abandon empty ones; abandon: abandon all '
+                 '(default: QUIZ_EXPIRED_SESSION_POLICY setting)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of sessions closed per statement batch',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Keep running and sweep every N seconds (default: sweep once and exit)',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            counts = sweep_expired_sessions(batch_size=options['batch_size'], policy=options['policy'])
+            if counts['completed'] or counts['abandoned']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Auto-submitted {counts['completed']} and abandoned {counts['abandoned']} expired session(s)."
+                ))
+            elif not options['interval']:
+                self.stdout.write(self.style.SUCCESS('No expired sessions found.'))
+
+            if not options['interval']:
+                return
+            close_old_connections()
+            time.sleep(options['interval'])
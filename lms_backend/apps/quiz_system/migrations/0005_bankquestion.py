@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_system', '0004_alter_quiz_quiz_code'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BankQuestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('topic', models.CharField(max_length=255)),
+                ('topic_key', models.CharField(help_text='Normalized topic used for lookups', max_length=255)),
+                ('difficulty', models.CharField(choices=[('easy', 'Easy'), ('medium', 'Medium'), ('hard', 'Hard'), ('mixed', 'Mixed')], max_length=10)),
+                ('question_text', models.TextField()),
+                ('question_type', models.CharField(default='multiple_choice', max_length=20)),
+                ('options', models.JSONField(default=list)),
+                ('correct_answer', models.IntegerField(default=0)),
+                ('explanation', models.TextField(blank=True)),
+                ('text_hash', models.CharField(help_text='SHA-256 of the normalized question text', max_length=64)),
+                ('source', models.CharField(choices=[('ai', 'AI Generated'), ('sample', 'Sample Fallback'), ('import', 'Imported')], default='ai', max_length=10)),
+                ('times_used', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bank_questions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='bank_question',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='quiz_questions', to='quiz_system.bankquestion'),
+        ),
+        migrations.AddIndex(
+            model_name='bankquestion',
+            index=models.Index(fields=['created_by', 'topic_key', 'difficulty'], name='bank_teacher_topic_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='bankquestion',
+            unique_together={('created_by', 'text_hash')},
+        ),
+    ]
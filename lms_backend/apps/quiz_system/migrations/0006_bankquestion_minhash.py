@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_system', '0005_bankquestion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bankquestion',
+            name='minhash',
+            field=models.JSONField(blank=True, default=list, help_text='MinHash signature for near-duplicate lookups'),
+        ),
+    ]
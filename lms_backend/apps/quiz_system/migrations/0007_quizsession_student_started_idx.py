@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_system', '0006_bankquestion_minhash'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='quizsession',
+            index=models.Index(fields=['student', '-started_at'], name='session_student_started_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:35
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def backfill_expires_at(apps, schema_editor):
+    """Give sessions left in 'started' a deadline so the expiry sweeper can close them"""
+    QuizSession = apps.get_model('quiz_system', 'QuizSession')
+    pending = []
+    for session in QuizSession.objects.filter(status='started', expires_at__isnull=True).select_related('quiz').iterator():
+        session.expires_at = session.started_at + timedelta(minutes=session.quiz.time_limit)
+        pending.append(session)
+        if len(pending) >= 500:
+            QuizSession.objects.bulk_update(pending, ['expires_at'])
+            pending = []
+    if pending:
+        QuizSession.objects.bulk_update(pending, ['expires_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_system', '0007_quizsession_student_started_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quizsession',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, help_text='Deadline derived from the quiz time limit', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='quizsession',
+            index=models.Index(fields=['status', 'expires_at'], name='session_status_expires_idx'),
+        ),
+        migrations.RunPython(backfill_expires_at, migrations.RunPython.noop),
+    ]
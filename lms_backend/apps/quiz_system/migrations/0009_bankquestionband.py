@@ -0,0 +1,94 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:38
+
+import hashlib
+import random
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Frozen copy of apps.quiz_system.dedup as of this migration, so later changes
+# to the live signature code cannot change what this migration computes
+NUM_PERM = 64
+NUM_BANDS = 16
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_FILLER_WORDS = frozenset("""
+    a an the is are was were be been of for to in on at by with and or as it its this that these those
+    what which who whom whose when where why how do does did
+    consider analyze analyse following given from options option select choose pick best answer
+    correct question final review extra sample another
+""".split())
+
+
+def _shingles(text):
+    tokens = [t for t in _TOKEN_RE.findall((text or '').lower()) if t not in _FILLER_WORDS]
+    if len(tokens) < 2:
+        return set(tokens)
+    return {f"{a} {b}" for a, b in zip(tokens, tokens[1:])}
+
+
+def _permutations(seed=1):
+    rng = random.Random(seed)
+    return [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_PERM)]
+
+
+def question_signature(text, perms):
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'big')
+              for s in _shingles(text)]
+    if not hashes:
+        return []
+    return [min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes) for a, b in perms]
+
+
+def band_hashes(signature):
+    if not signature:
+        return []
+    rows = len(signature) // NUM_BANDS
+    return [
+        hashlib.blake2b(f"{band}:{signature[band * rows:(band + 1) * rows]}".encode('ascii'),
+                        digest_size=8).hexdigest()
+        for band in range(NUM_BANDS)
+    ]
+
+
+def backfill_bands(apps, schema_editor):
+    """Recompute every bank signature (filler-only texts now have none) and store its band keys"""
+    BankQuestion = apps.get_model('quiz_system', 'BankQuestion')
+    BankQuestionBand = apps.get_model('quiz_system', 'BankQuestionBand')
+    perms = _permutations()
+    questions, bands = [], []
+    for question in BankQuestion.objects.only('id', 'question_text', 'minhash').iterator():
+        question.minhash = question_signature(question.question_text, perms)
+        questions.append(question)
+        bands.extend(BankQuestionBand(question_id=question.id, key=key) for key in band_hashes(question.minhash))
+        if len(questions) >= 500:
+            BankQuestion.objects.bulk_update(questions, ['minhash'])
+            BankQuestionBand.objects.bulk_create(bands, ignore_conflicts=True)
+            questions, bands = [], []
+    if questions:
+        BankQuestion.objects.bulk_update(questions, ['minhash'])
+        BankQuestionBand.objects.bulk_create(bands, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_system', '0008_quizsession_expires_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BankQuestionBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(db_index=True, max_length=16)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bands', to='quiz_system.bankquestion')),
+            ],
+            options={
+                'unique_together': {('question', 'key')},
+            },
+        ),
+        migrations.RunPython(backfill_bands, migrations.RunPython.noop),
+    ]
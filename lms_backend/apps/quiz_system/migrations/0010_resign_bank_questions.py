@@ -0,0 +1,96 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:10
+
+import hashlib
+import random
+import re
+
+from django.db import migrations
+
+# Frozen copy of apps.quiz_system.dedup as of this migration: variant phrases are
+# removed as phrases, and only grammatical words are dropped
+NUM_PERM = 64
+NUM_BANDS = 16
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_BOILERPLATE_PREFIX_RE = re.compile(
+    r"^\s*(?:consider this|analy[sz]e the following|from the given options|final review"
+    r"|review question\s*#?\s*\d*|extra)\s*[:,]\s*",
+    re.IGNORECASE,
+)
+_BOILERPLATE_SUFFIX_RE = re.compile(r"\s*(?:select the best answer\s*:?|\(\d+\))\s*$", re.IGNORECASE)
+_FILLER_WORDS = frozenset("""
+    a an the is are was were be been do does did
+    what which who whom whose when where why how
+""".split())
+
+
+def _strip_boilerplate(text):
+    text = text or ''
+    while True:
+        stripped = _BOILERPLATE_SUFFIX_RE.sub('', _BOILERPLATE_PREFIX_RE.sub('', text, count=1), count=1)
+        if stripped == text:
+            return text
+        text = stripped
+
+
+def _shingles(text):
+    tokens = [t for t in _TOKEN_RE.findall(_strip_boilerplate(text).lower()) if t not in _FILLER_WORDS]
+    if len(tokens) < 2:
+        return set(tokens)
+    return {f"{a} {b}" for a, b in zip(tokens, tokens[1:])}
+
+
+def _permutations(seed=1):
+    rng = random.Random(seed)
+    return [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_PERM)]
+
+
+def question_signature(text, perms):
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'big')
+              for s in _shingles(text)]
+    if not hashes:
+        return []
+    return [min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes) for a, b in perms]
+
+
+def band_hashes(signature):
+    if not signature:
+        return []
+    rows = len(signature) // NUM_BANDS
+    return [
+        hashlib.blake2b(f"{band}:{signature[band * rows:(band + 1) * rows]}".encode('ascii'),
+                        digest_size=8).hexdigest()
+        for band in range(NUM_BANDS)
+    ]
+
+
+def resign_bank_questions(apps, schema_editor):
+    """Recompute every bank signature with the phrase-based normalization and replace its band keys"""
+    BankQuestion = apps.get_model('quiz_system', 'BankQuestion')
+    BankQuestionBand = apps.get_model('quiz_system', 'BankQuestionBand')
+    BankQuestionBand.objects.all().delete()
+    perms = _permutations()
+    questions, bands = [], []
+    for question in BankQuestion.objects.only('id', 'question_text', 'minhash').iterator():
+        question.minhash = question_signature(question.question_text, perms)
+        questions.append(question)
+        bands.extend(BankQuestionBand(question_id=question.id, key=key) for key in band_hashes(question.minhash))
+        if len(questions) >= 500:
+            BankQuestion.objects.bulk_update(questions, ['minhash'])
+            BankQuestionBand.objects.bulk_create(bands, ignore_conflicts=True)
+            questions, bands = [], []
+    if questions:
+        BankQuestion.objects.bulk_update(questions, ['minhash'])
+        BankQuestionBand.objects.bulk_create(bands, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_system', '0009_bankquestionband'),
+    ]
+
+    operations = [
+        migrations.RunPython(resign_bank_questions, migrations.RunPython.noop),
+    ]
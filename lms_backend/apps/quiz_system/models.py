@@ -1,5 +1,7 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+from datetime import timedelta
 import uuid
 import random
 import string
@@ -45,6 +47,50 @@ class Quiz(models.Model):
     class Meta:
         ordering = ['-created_at']
 
+class BankQuestion(models.Model):
+    """Reusable question stored once per teacher and referenced by any number of quizzes"""
+    SOURCE_CHOICES = [
+        ('ai', 'AI Generated'),
+        ('sample', 'Sample Fallback'),
+        ('import', 'Imported'),
+    ]
+
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='bank_questions')
+    topic = models.CharField(max_length=255)
+    topic_key = models.CharField(max_length=255, help_text="Normalized topic used for lookups")
+    difficulty = models.CharField(max_length=10, choices=Quiz.DIFFICULTY_CHOICES)
+    question_text = models.TextField()
+    question_type = models.CharField(max_length=20, default='multiple_choice')
+    options = models.JSONField(default=list)
+    correct_answer = models.IntegerField(default=0)
+    explanation = models.TextField(blank=True)
+    text_hash = models.CharField(max_length=64, help_text="SHA-256 of the normalized question text")
+    minhash = models.JSONField(default=list, blank=True, help_text="MinHash signature for near-duplicate lookups")
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default='ai')
+    times_used = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"[{self.topic} / {self.difficulty}] {self.question_text[:50]}"
+
+    class Meta:
+        ordering = ['-created_at']
+        unique_together = ['created_by', 'text_hash']
+        indexes = [
+            models.Index(fields=['created_by', 'topic_key', 'difficulty'], name='bank_teacher_topic_idx'),
+        ]
+
+class BankQuestionBand(models.Model):
+    """One LSH band key of a bank question's MinHash signature, for bucket lookups"""
+    question = models.ForeignKey(BankQuestion, on_delete=models.CASCADE, related_name='bands')
+    key = models.CharField(max_length=16, db_index=True)
+
+    def __str__(self):
+        return f"{self.question_id}: {self.key}"
+
+    class Meta:
+        unique_together = ['question', 'key']
+
 class Question(models.Model):
     QUESTION_TYPES = [
         ('multiple_choice', 'Multiple Choice'),
@@ -53,6 +99,8 @@ class Question(models.Model):
     ]
 
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='questions')
+    bank_question = models.ForeignKey(BankQuestion, on_delete=models.SET_NULL, null=True, blank=True,
+                                      related_name='quiz_questions')
     question_text = models.TextField()
     question_type = models.CharField(max_length=20, choices=QUESTION_TYPES, default='multiple_choice')
     points = models.IntegerField(default=1)
@@ -91,12 +139,30 @@ class QuizSession(models.Model):
     total_points = models.IntegerField(null=True, blank=True)
     started_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True, help_text="Deadline derived from the quiz time limit")
+
+    def save(self, *args, **kwargs):
+        """Set the deadline from the quiz time limit when the session starts"""
+        if self.expires_at is None and self._state.adding:
+            self.expires_at = self.compute_expires_at(self.quiz)
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def compute_expires_at(quiz, started_at=None):
+        return (started_at or timezone.now()) + timedelta(minutes=quiz.time_limit)
+
+    def is_expired(self, grace_seconds=0):
+        return self.expires_at is not None and timezone.now() > self.expires_at + timedelta(seconds=grace_seconds)
 
     def __str__(self):
         return f"{self.student.username} - {self.quiz.title}"
 
     class Meta:
         ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['student', '-started_at'], name='session_student_started_idx'),
+            models.Index(fields=['status', 'expires_at'], name='session_status_expires_idx'),
+        ]
 
 class Answer(models.Model):
     session = models.ForeignKey(QuizSession, on_delete=models.CASCADE, related_name='answers')
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Quiz, Question, Choice, QuizSession, Answer, LiveQuizSession, LiveParticipant
+from .models import Quiz, Question, Choice, QuizSession, Answer, LiveQuizSession, LiveParticipant, BankQuestion
 
 class ChoiceSerializer(serializers.ModelSerializer):
     class Meta:
@@ -66,13 +66,29 @@ class QuizCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Time limit must be between 1 and 300 minutes")
         return value
 
+class BankQuestionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BankQuestion
+        fields = ['id', 'topic', 'difficulty', 'question_text', 'question_type', 'options',
+                 'correct_answer', 'explanation', 'source', 'times_used', 'created_at']
+
 class QuizSessionSerializer(serializers.ModelSerializer):
     quiz = QuizSerializer(read_only=True)
     student = serializers.StringRelatedField(read_only=True)
 
     class Meta:
         model = QuizSession
-        fields = ['id', 'quiz', 'student', 'status', 'score', 'total_points', 'started_at', 'completed_at']
+        fields = ['id', 'quiz', 'student', 'status', 'score', 'total_points', 'started_at', 'completed_at',
+                 'expires_at']
+
+class QuizHistorySerializer(QuizSessionSerializer):
+    """Session serializer that can be trimmed to the fields requested by the client"""
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
 
 class AnswerSerializer(serializers.ModelSerializer):
     # Accept question as integer primary key (matches Question model default PK)
@@ -84,13 +100,30 @@ class AnswerSerializer(serializers.ModelSerializer):
         fields = ['question', 'selected_choice', 'text_answer']
 
 class AnswerSubmissionSerializer(serializers.Serializer):
-    answers = AnswerSerializer(many=True)
+    # Optional on submit: answers may already have been stored via autosave
+    answers = AnswerSerializer(many=True, required=False)
 
     def validate_answers(self, value):
         if not value:
             raise serializers.ValidationError("At least one answer is required")
         return value
 
+class BatchSubmissionItemSerializer(serializers.Serializer):
+    session_id = serializers.UUIDField(required=False)
+    student = serializers.IntegerField(required=False)
+    answers = AnswerSerializer(many=True)
+    completed_at = serializers.DateTimeField(required=False)
+
+class BatchSubmissionSerializer(serializers.Serializer):
+    submissions = BatchSubmissionItemSerializer(many=True)
+
+    def validate_submissions(self, value):
+        if not value:
+            raise serializers.ValidationError("At least one submission is required")
+        if len(value) > 500:
+            raise serializers.ValidationError("At most 500 submissions per batch")
+        return value
+
 class QuizJoinSerializer(serializers.Serializer):
     quiz_code = serializers.CharField(max_length=8)
 
@@ -0,0 +1,38 @@
+"""Cache invalidation for quiz listings and quiz details"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.core.cache import invalidate
+from .models import Choice, LiveQuizSession, Question, Quiz
+
+
+def quiz_namespace(quiz_id):
+    return f'quiz_detail:{quiz_id}'
+
+
+def quiz_content_changed(*quiz_ids):
+    """Drop cached quiz details after writes that send no signals (bulk_create, update)"""
+    transaction.on_commit(lambda: invalidate(*(quiz_namespace(quiz_id) for quiz_id in quiz_ids)))
+
+
+@receiver([post_save, post_delete], sender=Quiz)
+def quiz_changed(sender, instance, **kwargs):
+    invalidate('quiz_sessions', quiz_namespace(instance.id))
+
+
+@receiver([post_save, post_delete], sender=LiveQuizSession)
+def live_session_changed(sender, instance, **kwargs):
+    invalidate('quiz_sessions')
+
+
+@receiver([post_save, post_delete], sender=Question)
+def question_changed(sender, instance, **kwargs):
+    invalidate(quiz_namespace(instance.quiz_id))
+
+
+@receiver([post_save, post_delete], sender=Choice)
+def choice_changed(sender, instance, **kwargs):
+    quiz_id = Question.objects.filter(id=instance.question_id).values_list('quiz_id', flat=True).first()
+    if quiz_id:
+        invalidate(quiz_namespace(quiz_id))
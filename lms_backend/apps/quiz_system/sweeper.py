@@ -0,0 +1,71 @@
+"""
+Periodic closing of expired quiz sessions.
+
+With QUIZ_SWEEP_IN_PROCESS (the default) every web process runs an
+ExpirySweeper thread, started with its first request like the conversion
+worker pool, that calls sweep_expired_sessions every QUIZ_SWEEP_INTERVAL
+seconds. Sweeps only touch sessions still 'started', so processes sweeping
+at the same time do not conflict. Deployments that turn it off run
+``manage.py sweep_expired_sessions --interval N`` instead.
+
+The sweep's writes go through the serialized database writer like the other
+background writes.
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from apps.core.db_writer import db_writer
+from .grading import sweep_expired_sessions
+
+logger = logging.getLogger(__name__)
+
+
+class ExpirySweeper:
+    """A daemon thread sweeping expired quiz sessions every ``interval`` seconds"""
+
+    def __init__(self, interval=None):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return self
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='quiz-expiry-sweeper', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        self._stop.set()
+        if thread is not None:
+            thread.join(timeout)
+
+    def sweep(self):
+        """Run one sweep; returns its counts, or None if it failed"""
+        try:
+            counts = db_writer.run(sweep_expired_sessions)
+        except Exception:
+            # Retried on the next interval
+            logger.exception('Expired quiz session sweep failed')
+            return None
+        if counts['completed'] or counts['abandoned']:
+            logger.info('Auto-submitted %d and abandoned %d expired quiz session(s)',
+                        counts['completed'], counts['abandoned'])
+        return counts
+
+    def _run(self):
+        interval = self.interval or getattr(settings, 'QUIZ_SWEEP_INTERVAL', 60)
+        while not self._stop.wait(interval):
+            self.sweep()
+        close_old_connections()
+
+
+sweeper = ExpirySweeper()
@@ -0,0 +1,375 @@
+import gzip
+import json
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core.signals import request_started
+from django.db import OperationalError
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from .autosave import save_answers
+from .dedup import LSHIndex, partition_near_duplicates, question_signature, similarity
+from .grading import submit_batch, sweep_expired_sessions
+from .models import Answer, BankQuestion, Question, Quiz, QuizSession
+from .signals import quiz_content_changed
+from .sweeper import ExpirySweeper
+from .utils import add_questions_to_bank, create_quiz_from_questions, generate_sample_questions, sample_bank_questions
+
+User = get_user_model()
+
+QUESTIONS = [
+    {'question': 'What is the capital of France?', 'options': ['Paris', 'Rome', 'Madrid', 'Berlin'],
+     'correct_answer': 0},
+    {'question': 'Which planet is closest to the sun?', 'options': ['Venus', 'Mercury', 'Mars', 'Earth'],
+     'correct_answer': 1},
+    {'question': 'How many legs does a spider have?', 'options': ['Six', 'Ten', 'Eight', 'Four'],
+     'correct_answer': 2},
+]
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class QuizTestCase(APITestCase):
+    """A teacher's three-question quiz and a student with a started session"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # No in-process conversion workers or sweeper: they would start with the first test request
+        request_started.disconnect(dispatch_uid='pdf_conversion_pool')
+        request_started.disconnect(dispatch_uid='quiz_expiry_sweeper')
+
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user(username='teacher', password='x', user_type='teacher')
+        self.student = User.objects.create_user(username='student', password='x', user_type='student')
+        self.quiz = create_quiz_from_questions(QUESTIONS, 'Quiz', 'General', 'easy', self.teacher)
+        self.questions = list(self.quiz.questions.order_by('order'))
+        self.session = QuizSession.objects.create(quiz=self.quiz, student=self.student)
+
+    def choice(self, question, correct=True):
+        return question.choices.filter(is_correct=correct).first().id
+
+
+class AutosaveTests(QuizTestCase):
+    def url(self):
+        return f'/api/quiz/session/{self.session.id}/autosave/'
+
+    def autosave(self, answers):
+        self.client.force_authenticate(self.student)
+        return self.client.post(self.url(), {'answers': answers}, format='json')
+
+    def test_repeated_saves_upsert_one_row_per_question(self):
+        first, second = self.questions[:2]
+        response = self.autosave([
+            {'question': first.id, 'selected_choice': self.choice(first, correct=False)},
+            {'question': second.id, 'selected_choice': self.choice(second)},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['saved'], 2)
+
+        # A later save of a question replaces the earlier answer
+        response = self.autosave([{'question': first.id, 'selected_choice': self.choice(first)}])
+        self.assertEqual(response.data['saved'], 1)
+
+        answers = {a.question_id: a for a in Answer.objects.filter(session=self.session)}
+        self.assertEqual(len(answers), 2)
+        self.assertEqual(answers[first.id].selected_choice_id, self.choice(first))
+        self.assertTrue(answers[first.id].is_correct)
+
+    def test_invalid_choice_is_rejected(self):
+        first, second = self.questions[:2]
+        response = self.autosave([{'question': first.id, 'selected_choice': self.choice(second)}])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Answer.objects.exists())
+
+    def test_session_submitted_meanwhile_is_not_altered(self):
+        first = self.questions[0]
+        QuizSession.objects.filter(pk=self.session.pk).update(status='completed')
+        self.assertIsNone(save_answers(self.session, [{'question': first.id, 'selected_choice': None}]))
+        self.assertFalse(Answer.objects.exists())
+
+    def test_busy_database_answers_503(self):
+        first = self.questions[0]
+        with mock.patch('apps.quiz_system.views.save_answers', side_effect=OperationalError('database is locked')):
+            response = self.autosave([{'question': first.id, 'selected_choice': self.choice(first)}])
+        self.assertEqual(response.status_code, 503)
+
+
+class BatchSubmissionTests(QuizTestCase):
+    def answers(self, correct):
+        return [{'question': q.id, 'selected_choice': self.choice(q, correct)} for q in self.questions]
+
+    def test_grades_existing_and_offline_sessions(self):
+        late_joiner = User.objects.create_user(username='offline', password='x', user_type='student')
+        # Autosaved before going offline; the submission overrides only the first question
+        first = self.questions[0]
+        save_answers(self.session, self.answers(correct=True))
+
+        results = submit_batch(self.quiz, [
+            {'session_id': self.session.id,
+             'answers': [{'question': first.id, 'selected_choice': self.choice(first, correct=False)}]},
+            {'student': late_joiner.id, 'answers': self.answers(correct=True)},
+        ])
+
+        self.assertEqual([r['status'] for r in results], ['completed', 'completed'])
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.status, 'completed')
+        self.assertEqual(self.session.score, round(2 / 3 * 100, 2))
+        self.assertEqual(QuizSession.objects.get(student=late_joiner).score, 100)
+
+    def test_completion_time_is_clamped_to_the_session_lifetime(self):
+        now = timezone.now()
+        other = QuizSession.objects.create(
+            quiz=self.quiz, student=User.objects.create_user(username='s2', password='x', user_type='student'))
+        results = submit_batch(self.quiz, [
+            {'session_id': self.session.id, 'answers': [], 'completed_at': now + timedelta(days=1)},
+            {'session_id': other.id, 'answers': [], 'completed_at': now - timedelta(days=1)},
+        ])
+
+        self.assertEqual([r['status'] for r in results], ['completed', 'completed'])
+        self.session.refresh_from_db()
+        other.refresh_from_db()
+        self.assertLessEqual(self.session.completed_at, timezone.now())
+        self.assertEqual(other.completed_at, other.started_at)
+
+    def test_completion_after_the_deadline_is_rejected(self):
+        self.session.expires_at = timezone.now() - timedelta(hours=1)
+        self.session.save(update_fields=['expires_at'])
+
+        # Stated completion after the deadline, and no stated time after the deadline
+        late = submit_batch(self.quiz, [{'session_id': self.session.id, 'answers': self.answers(True),
+                                         'completed_at': timezone.now()}])
+        missing = submit_batch(self.quiz, [{'session_id': self.session.id, 'answers': self.answers(True)}])
+
+        self.assertEqual(late[0]['error'], 'Time limit exceeded')
+        self.assertEqual(missing[0]['error'], 'Time limit exceeded')
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.status, 'started')
+        self.assertFalse(Answer.objects.exists())
+
+    def test_completion_before_the_deadline_is_accepted_late(self):
+        deadline = timezone.now() - timedelta(hours=1)
+        self.session.expires_at = deadline
+        self.session.save(update_fields=['expires_at'])
+
+        results = submit_batch(self.quiz, [{'session_id': self.session.id, 'answers': self.answers(True),
+                                            'completed_at': deadline - timedelta(minutes=5)}])
+
+        self.assertEqual(results[0]['status'], 'completed')
+        self.assertEqual(results[0]['score'], 100)
+
+
+class ExpirySweepTests(QuizTestCase):
+    def setUp(self):
+        super().setUp()
+        self.deadline = timezone.now() - timedelta(hours=1)
+        self.session.expires_at = self.deadline
+        self.session.save(update_fields=['expires_at'])
+        self.other = User.objects.create_user(username='other', password='x', user_type='student')
+        self.empty = QuizSession.objects.create(quiz=self.quiz, student=self.other, expires_at=self.deadline)
+        self.running = QuizSession.objects.create(
+            quiz=self.quiz, student=self.other, expires_at=timezone.now() + timedelta(hours=1))
+        first = self.questions[0]
+        save_answers(self.session, [{'question': first.id, 'selected_choice': self.choice(first)}])
+
+    def test_submit_policy_grades_answered_and_abandons_empty_sessions(self):
+        counts = sweep_expired_sessions(policy='submit')
+
+        self.assertEqual(counts, {'completed': 1, 'abandoned': 1})
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.status, 'completed')
+        self.assertEqual(self.session.completed_at, self.deadline)
+        self.assertEqual((self.session.score, self.session.total_points), (100, 1))
+        self.assertEqual(QuizSession.objects.get(pk=self.empty.pk).status, 'abandoned')
+        self.assertEqual(QuizSession.objects.get(pk=self.running.pk).status, 'started')
+
+    def test_abandon_policy(self):
+        self.assertEqual(sweep_expired_sessions(policy='abandon'), {'completed': 0, 'abandoned': 2})
+
+
+class ExpirySweeperTests(TransactionTestCase):
+    def test_sweeper_closes_expired_sessions_periodically(self):
+        teacher = User.objects.create_user(username='teacher', password='x', user_type='teacher')
+        student = User.objects.create_user(username='student', password='x', user_type='student')
+        quiz = create_quiz_from_questions(QUESTIONS, 'Quiz', 'General', 'easy', teacher)
+        session = QuizSession.objects.create(quiz=quiz, student=student,
+                                             expires_at=timezone.now() - timedelta(hours=1))
+
+        sweeper = ExpirySweeper(interval=0.05).start()
+        self.addCleanup(sweeper.stop)
+        deadline = time.monotonic() + 10
+        while QuizSession.objects.get(pk=session.pk).status == 'started' and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        self.assertEqual(QuizSession.objects.get(pk=session.pk).status, 'abandoned')
+
+
+class QuizDetailCacheTests(QuizTestCase):
+    def detail(self):
+        self.client.force_authenticate(self.teacher)
+        response = self.client.get(f'/api/quiz/{self.quiz.id}/')
+        return [q['question_text'] for q in response.data['questions']]
+
+    def test_saving_a_question_drops_the_cached_detail(self):
+        self.assertEqual(len(self.detail()), 3)
+        question = self.questions[0]
+        question.question_text = 'What is the capital of Italy?'
+        question.save()
+        self.assertEqual(self.detail()[0], 'What is the capital of Italy?')
+
+    def test_bulk_writes_drop_the_cached_detail_on_commit(self):
+        self.assertEqual(len(self.detail()), 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            # bulk_create sends no signals
+            Question.objects.bulk_create([Question(quiz=self.quiz, question_text='New?', order=4)])
+            self.assertEqual(len(self.detail()), 3)
+            quiz_content_changed(self.quiz.id)
+        self.assertEqual(len(self.detail()), 4)
+
+
+class QuizHistoryTests(QuizTestCase):
+    def setUp(self):
+        super().setUp()
+        for _ in range(11):
+            QuizSession.objects.create(quiz=self.quiz, student=self.student)
+        self.client.force_authenticate(self.student)
+
+    def test_page_numbers_and_count(self):
+        first = self.client.get('/api/quiz/history/').data
+        self.assertEqual(first['count'], 12)
+        self.assertEqual(len(first['results']), 10)
+        second = self.client.get('/api/quiz/history/', {'page': 2}).data
+        self.assertEqual(len(second['results']), 2)
+        ids = {r['id'] for r in first['results']} | {r['id'] for r in second['results']}
+        self.assertEqual(len(ids), 12)
+
+    def test_cursor_pages_are_opt_in(self):
+        first = self.client.get('/api/quiz/history/', {'cursor': '', 'fields': 'id,status'}).data
+        self.assertNotIn('count', first)
+        self.assertEqual(set(first['results'][0]), {'id', 'status'})
+        second = self.client.get(first['next']).data
+        self.assertEqual(len(first['results']) + len(second['results']), 12)
+        self.assertIsNone(second['next'])
+
+
+class NearDuplicateFillTests(QuizTestCase):
+    def test_sample_questions_skip_reworded_variants_unless_allowed(self):
+        distinct = generate_sample_questions('Science', 'easy', 10)
+        self.assertEqual(len(distinct), 3)
+        self.assertEqual(len(generate_sample_questions('Science', 'easy', 10, allow_duplicates=True)), 10)
+
+    def test_bank_sampling_refuses_to_fill_with_near_duplicates(self):
+        add_questions_to_bank([
+            {'question': 'What is the chemical symbol for water?', 'options': ['H2O', 'O2'], 'source': 'ai'},
+            {'question': 'Which gas do plants absorb from the air?', 'options': ['CO2', 'N2'], 'source': 'ai'},
+        ], 'Chemistry', 'easy', self.teacher)
+        # Stored separately by another path, but a reworded copy of the first question
+        add_questions_to_bank([
+            {'question': 'Consider this: what is the chemical symbol for water?', 'options': ['H2O', 'O2'],
+             'source': 'import'},
+        ], 'Chemistry Extra', 'easy', self.teacher)
+        BankQuestion.objects.filter(topic='Chemistry Extra').update(topic='Chemistry', topic_key='chemistry')
+
+        with self.assertRaisesMessage(ValueError, 'only 2 distinct'):
+            sample_bank_questions(self.teacher, 'Chemistry', 'easy', 3)
+        self.assertEqual(len(sample_bank_questions(self.teacher, 'Chemistry', 'easy', 3, allow_duplicates=True)), 3)
+        self.assertEqual(len(sample_bank_questions(self.teacher, 'Chemistry', 'easy', 2)), 2)
+
+
+class NearDuplicateDetectionTests(SimpleTestCase):
+    def test_variant_phrasings_are_near_duplicates(self):
+        base = 'What is the chemical symbol for water?'
+        variants = [
+            f'Consider this: {base}',
+            f'Analyze the following: {base}',
+            'Which is the chemical symbol for water?\nSelect the best answer:',
+            f'From the given options, {base.lower()}',
+            f'Final review: Consider this: {base}',
+            f'Extra: {base} (7)',
+        ]
+        signature = question_signature(base)
+        for variant in variants:
+            self.assertEqual(similarity(signature, question_signature(variant)), 1.0, variant)
+
+    def test_content_words_still_tell_questions_apart(self):
+        best = question_signature('Which sorting algorithm is best on random input?')
+        correct = question_signature('Which sorting algorithm is correct on random input?')
+        self.assertLess(similarity(best, correct), 0.7)
+
+    def test_partition_keeps_order_and_screens_against_the_index(self):
+        index = LSHIndex()
+        index.add('bank-1', question_signature('Who painted the Mona Lisa?'))
+        questions = [
+            {'question': 'Which planet is known as the red planet?'},
+            {'question': 'Consider this: Which planet is known as the red planet?'},
+            {'question': 'Who painted the Mona Lisa?'},
+            {'question': 'What is the boiling point of water at sea level?'},
+        ]
+        distinct, duplicates = partition_near_duplicates(questions, index=index)
+        self.assertEqual([q['question'] for q in distinct], [questions[0]['question'], questions[3]['question']])
+        self.assertEqual(len(duplicates), 2)
+
+
+class BankTransferTests(QuizTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.teacher)
+
+    def export(self, **params):
+        response = self.client.get('/api/quiz/bank/export/', params)
+        return b''.join(response.streaming_content)
+
+    def import_file(self, content, name='bank.jsonl'):
+        return self.client.post('/api/quiz/bank/import/', {'file': SimpleUploadedFile(name, content)},
+                                format='multipart')
+
+    def test_clone_copies_questions_and_choices_under_a_new_code(self):
+        response = self.client.post(f'/api/quiz/{self.quiz.id}/clone/', {'title': 'Copy'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertNotEqual(response.data['quiz_code'], self.quiz.quiz_code)
+
+        clone = Quiz.objects.get(id=response.data['id'])
+        original = [(q.question_text, [(c.choice_text, c.is_correct) for c in q.choices.all()])
+                    for q in self.quiz.questions.all()]
+        copied = [(q.question_text, [(c.choice_text, c.is_correct) for c in q.choices.all()])
+                  for q in clone.questions.all()]
+        self.assertEqual(copied, original)
+
+    def test_export_import_round_trip_reuses_existing_questions(self):
+        exported = self.export()
+        self.assertEqual(len(exported.splitlines()), 3)
+        self.assertEqual(gzip.decompress(self.export(gzip='1')), exported)
+
+        # Importing the gzip export again finds every question already in the bank
+        response = self.import_file(gzip.compress(exported), 'bank.jsonl.gz')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data, {'lines': 3, 'rejected': 0, 'added': 0, 'reused': 3})
+
+    def test_import_rejects_bad_lines_and_reports_damaged_files(self):
+        good = json.dumps({'topic': 'Art', 'difficulty': 'easy', 'question': 'Who painted the Mona Lisa?',
+                           'options': ['Leonardo da Vinci', 'Michelangelo'], 'correct_answer': 0})
+        response = self.import_file(f'{good}\nnot json\n{{"question": "No options"}}\n'.encode())
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data, {'lines': 3, 'rejected': 2, 'added': 1, 'reused': 0})
+
+        truncated = gzip.compress((good.replace('Mona Lisa', 'Night Watch') + '\n').encode() * 50)[:-20]
+        response = self.import_file(truncated, 'bank.jsonl.gz')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', response.data)
+
+    def test_assembly_uses_sample_questions_shown_in_the_bank(self):
+        add_questions_to_bank(generate_sample_questions('History', 'easy', 2), 'History', 'easy', self.teacher)
+        listed = self.client.get('/api/quiz/bank/', {'topic': 'History'}).data
+        self.assertEqual(listed['count'], 2)
+
+        response = self.client.post('/api/quiz/bank/assemble/', {
+            'title': 'History', 'topic': 'History', 'difficulty': 'easy', 'number_of_questions': 2,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['number_of_questions'], 2)
@@ -1,17 +1,29 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# AI-bound views: async variants under ASGI (see ASYNC_AI_VIEWS)
+ai_views = views
+if settings.ASYNC_AI_VIEWS:
+    from . import async_views as ai_views
+
 urlpatterns = [
     # Quiz creation and management (Teachers/Admins)
-    path('create/', views.create_quiz, name='create_quiz'),
+    path('create/', ai_views.create_quiz, name='create_quiz'),
     path('my-quizzes/', views.list_my_quizzes, name='list_my_quizzes'),
+    path('bank/', views.list_bank_questions, name='list_bank_questions'),
+    path('bank/assemble/', views.create_quiz_from_bank_view, name='create_quiz_from_bank'),
+    path('bank/export/', views.export_bank, name='export_bank'),
+    path('bank/import/', views.import_bank, name='import_bank'),
     path('<uuid:quiz_id>/', views.quiz_detail, name='quiz_detail'),
     path('<uuid:quiz_id>/analytics/', views.quiz_analytics, name='quiz_analytics'),
+    path('<uuid:quiz_id>/clone/', views.clone_quiz_view, name='clone_quiz'),
+    path('<uuid:quiz_id>/submit-batch/', views.submit_quiz_batch, name='submit_quiz_batch'),
 
     # Live quiz sessions
     path('sessions/', views.list_quiz_sessions, name='list_quiz_sessions'),
     path('sessions/completed/', views.list_completed_quiz_sessions, name='list_completed_quiz_sessions'),
-    path('live/create/', views.live_create, name='live_create'),
+    path('live/create/', ai_views.live_create, name='live_create'),
     path('live/join/', views.live_join, name='live_join'),
     path('live/<str:room_code>/state/', views.live_state, name='live_state'),
     path('live/<str:room_code>/answer/', views.live_answer, name='live_answer'),
@@ -21,6 +33,7 @@ urlpatterns = [
     # Student quiz participation
     path('join/', views.join_quiz, name='join_quiz'),
     path('session/<uuid:session_id>/', views.quiz_session, name='quiz_session'),
+    path('session/<uuid:session_id>/autosave/', views.autosave_answers, name='autosave_answers'),
     path('session/<uuid:session_id>/submit/', views.submit_quiz, name='submit_quiz'),
     path('history/', views.student_quiz_history, name='student_quiz_history'),
 ]
\ No newline at end of file
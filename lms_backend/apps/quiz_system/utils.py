@@ -1,13 +1,22 @@
-try:
-    import google.generativeai as genai  # type: ignore
-except Exception:  # ImportError or any env-related error
-    genai = None
+import hashlib
 import json
+import logging
 import os
 import random
 import string
+import threading
+import time
 from django.conf import settings
-from .models import Quiz, Question, Choice, LiveQuizSession
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from apps.core import metrics
+from apps.core.ai_gateway import AIUnavailable, ai_gateway
+from .models import Quiz, Question, Choice, Answer, LiveQuizSession, BankQuestion, BankQuestionBand
+from .signals import quiz_content_changed
+from .dedup import LSHIndex, band_hashes, partition_near_duplicates, question_signature
+
+logger = logging.getLogger(__name__)
 
 def generate_quiz_code():
     """Generate a unique 6-digit numeric quiz code"""
@@ -17,8 +26,14 @@ def generate_quiz_code():
         if not Quiz.objects.filter(quiz_code=code).exists():
             return code
 
-def generate_sample_questions(topic, difficulty, num_questions):
-    """Generate sample questions when OpenAI API is not available"""
+def generate_sample_questions(topic, difficulty, num_questions, allow_duplicates=False):
+    """Generate sample questions when OpenAI API is not available.
+
+    The sample pool per topic is small and larger counts are reached with
+    reworded variants, which are near-duplicates of their originals. Those are
+    dropped, so fewer than ``num_questions`` may be returned, unless
+    ``allow_duplicates`` is set to fill the count with them.
+    """
     sample_questions_templates = {
         'science': [
             {
@@ -203,19 +218,14 @@ def generate_sample_questions(topic, difficulty, num_questions):
         q['question'] = f"Review Question #{len(result) + 1}: {q['question']}"
         result.append(q)
 
-    # Final dedupe: ensure question texts are unique (preserve order)
-    seen = set()
-    deduped = []
-    for q in result:
-        qt = q.get('question')
-        if qt is None:
-            continue
-        if qt in seen:
-            continue
-        seen.add(qt)
-        deduped.append(q)
+    # Final dedupe: distinct questions first, then (only if allowed) near-duplicate
+    # variants, i.e. reworded copies of the same question, to reach the count
+    distinct, near_duplicates = partition_near_duplicates(result)
+    if not allow_duplicates:
+        return distinct[:num_questions]
+    deduped = (distinct + near_duplicates)[:num_questions]
 
-    # If deduping removed items and we have fewer questions, pad with simple variants
+    # If we still have fewer questions, pad with simple variants
     i = 0
     while len(deduped) < num_questions:
         base = questions[i % len(questions)].copy()
@@ -225,185 +235,379 @@ def generate_sample_questions(topic, difficulty, num_questions):
 
     return deduped
 
-def generate_questions_with_ai(topic, difficulty, num_questions):
-    """Generate quiz questions using Gemini API with fallback"""
-    # Prefer explicit environment variable, fall back to Django settings if available
-    api_key = os.getenv('GEMINI_API_KEY') or getattr(settings, 'GEMINI_API_KEY', None)
-    if not api_key or genai is None:
-        print("Gemini API key not configured or Gemini SDK unavailable, using sample questions")
-        return generate_sample_questions(topic, difficulty, num_questions)
+QUIZ_GENERATION_MODEL = 'gemini-2.5-flash'
 
-    try:
-        # Configure Gemini API
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-2.5-flash')
-
-        # Prepare the prompt based on difficulty
-        difficulty_instructions = {
-            'easy': 'Generate easy level questions suitable for beginners',
-            'medium': 'Generate medium level questions with moderate complexity',
-            'hard': 'Generate hard level questions that are challenging and require deep understanding',
-            'mixed': 'Generate a mix of easy, medium, and hard level questions'
-        }
-
-        prompt = f"""
-        Generate {num_questions} multiple choice questions about {topic}.
-        {difficulty_instructions[difficulty]}.
-
-        Requirements:
-        - Each question should have 4 options (A, B, C, D)
-        - Clearly indicate the correct answer
-        - Questions should be educational and relevant to the topic
-        - Avoid ambiguous or trick questions
-        - Provide varied question types within the topic
-
-        Format your response as a JSON array with this structure:
-        [
-            {{
-                "question": "Question text here?",
-                "options": [
-                    "Option A text",
-                    "Option B text",
-                    "Option C text",
-                    "Option D text"
-                ],
-                "correct_answer": 0,
-                "explanation": "Brief explanation of why this is correct"
-            }}
-        ]
+def _gemini_api_key():
+    # Prefer explicit environment variable, fall back to Django settings if available
+    return os.getenv('GEMINI_API_KEY') or getattr(settings, 'GEMINI_API_KEY', None)
+
+def _questions_prompt(topic, difficulty, num_questions):
+    # Prepare the prompt based on difficulty
+    difficulty_instructions = {
+        'easy': 'Generate easy level questions suitable for beginners',
+        'medium': 'Generate medium level questions with moderate complexity',
+        'hard': 'Generate hard level questions that are challenging and require deep understanding',
+        'mixed': 'Generate a mix of easy, medium, and hard level questions'
+    }
 
-        Where correct_answer is the index (0-3) of the correct option.
-        Return ONLY the JSON array, no additional text.
-        """
+    prompt = f"""
+    Generate {num_questions} multiple choice questions about {topic}.
+    {difficulty_instructions[difficulty]}.
+
+    Requirements:
+    - Each question should have 4 options (A, B, C, D)
+    - Clearly indicate the correct answer
+    - Questions should be educational and relevant to the topic
+    - Avoid ambiguous or trick questions
+    - Provide varied question types within the topic
+
+    Format your response as a JSON array with this structure:
+    [
+        {{
+            "question": "Question text here?",
+            "options": [
+                "Option A text",
+                "Option B text",
+                "Option C text",
+                "Option D text"
+            ],
+            "correct_answer": 0,
+            "explanation": "Brief explanation of why this is correct"
+        }}
+    ]
 
-        response = model.generate_content(prompt)
-        content = response.text
+    Where correct_answer is the index (0-3) of the correct option.
+    Return ONLY the JSON array, no additional text.
+    """
+    return prompt
 
-        # Try to extract JSON from the response
-        try:
-            # Find JSON array in the response
-            start_idx = content.find('[')
-            end_idx = content.rfind(']') + 1
-            if start_idx != -1 and end_idx != 0:
-                json_str = content[start_idx:end_idx]
-                questions_data = json.loads(json_str)
-            else:
-                questions_data = json.loads(content)
-        except json.JSONDecodeError:
-            # Fallback: try to parse the entire content
+def _questions_from_ai_text(content, topic, difficulty, num_questions):
+    """Parse, normalize and dedupe the model's JSON answer, padding with sample questions"""
+    # Try to extract JSON from the response
+    try:
+        # Find JSON array in the response
+        start_idx = content.find('[')
+        end_idx = content.rfind(']') + 1
+        if start_idx != -1 and end_idx != 0:
+            json_str = content[start_idx:end_idx]
+            questions_data = json.loads(json_str)
+        else:
             questions_data = json.loads(content)
+    except json.JSONDecodeError:
+        # Fallback: try to parse the entire content
+        questions_data = json.loads(content)
+
+    # Normalize the questions list to match num_questions and ensure structure
+    if not isinstance(questions_data, list):
+        raise ValueError('AI did not return a list')
+
+    # Filter/transform any malformed items
+    normalized = []
+    for item in questions_data:
+        if not isinstance(item, dict):
+            continue
+        qtext = item.get('question')
+        options = item.get('options')
+        correct = item.get('correct_answer', 0)
+        if not isinstance(qtext, str) or not isinstance(options, list) or len(options) < 2:
+            continue
+        try:
+            correct_idx = int(correct)
+        except (TypeError, ValueError):
+            correct_idx = 0
+        if correct_idx < 0 or correct_idx >= len(options):
+            correct_idx = 0
+        normalized.append({
+            'question': qtext,
+            'options': options[:4] if len(options) >= 4 else (options + ["Option C", "Option D"])[:4],
+            'correct_answer': correct_idx,
+            'explanation': item.get('explanation', f'About {topic}'),
+            'source': 'ai',
+        })
+
+    # If AI returned fewer than needed, pad with samples; if more, trim
+    if len(normalized) < num_questions:
+        filler = generate_sample_questions(topic, difficulty, num_questions - len(normalized))
+        normalized.extend(filler)
+    elif len(normalized) > num_questions:
+        normalized = normalized[:num_questions]
+
+    # Drop near-duplicates (same question, different wording); the index
+    # also screens the sample filler against the AI questions
+    index = LSHIndex()
+    unique, _ = partition_near_duplicates(normalized, index=index)
+
+    # If dedupe removed items, pad with sample questions distinct from the rest
+    if len(unique) < num_questions:
+        filler = generate_sample_questions(topic, difficulty, num_questions - len(unique))
+        distinct_filler, _ = partition_near_duplicates(filler, index=index)
+        unique.extend(distinct_filler)
+
+    return unique[:num_questions]
+
+def _sample_fallback(topic, difficulty, num_questions, error):
+    if isinstance(error, AIUnavailable):
+        logger.info("Gemini API key not configured or Gemini SDK unavailable, using sample questions")
+    else:
+        logger.warning("Gemini API failed: %s, using sample questions", error)
+        metrics.errors.inc(component='quiz_generation')
+    metrics.fallbacks.inc(kind='sample_questions')
+    return generate_sample_questions(topic, difficulty, num_questions)
 
-        # Normalize the questions list to match num_questions and ensure structure
-        if not isinstance(questions_data, list):
-            raise ValueError('AI did not return a list')
-
-        # Filter/transform any malformed items
-        normalized = []
-        for item in questions_data:
-            if not isinstance(item, dict):
-                continue
-            qtext = item.get('question')
-            options = item.get('options')
-            correct = item.get('correct_answer', 0)
-            if not isinstance(qtext, str) or not isinstance(options, list) or len(options) < 2:
-                continue
-            try:
-                correct_idx = int(correct)
-            except (TypeError, ValueError):
-                correct_idx = 0
-            if correct_idx < 0 or correct_idx >= len(options):
-                correct_idx = 0
-            normalized.append({
-                'question': qtext,
-                'options': options[:4] if len(options) >= 4 else (options + ["Option C", "Option D"])[:4],
-                'correct_answer': correct_idx,
-                'explanation': item.get('explanation', f'About {topic}')
-            })
-
-        # If AI returned fewer than needed, pad with samples; if more, trim
-        if len(normalized) < num_questions:
-            filler = generate_sample_questions(topic, difficulty, num_questions - len(normalized))
-            normalized.extend(filler)
-        elif len(normalized) > num_questions:
-            normalized = normalized[:num_questions]
-
-        # Dedupe by question text to avoid exact repeats
-        seen_q = set()
-        unique = []
-        for it in normalized:
-            qt = it.get('question')
-            if qt and qt not in seen_q:
-                seen_q.add(qt)
-                unique.append(it)
-
-        # If dedupe removed items, pad with sample questions
-        if len(unique) < num_questions:
-            filler = generate_sample_questions(topic, difficulty, num_questions - len(unique))
-            unique.extend(filler)
-
-        return unique[:num_questions]
+def generate_questions_with_ai(topic, difficulty, num_questions):
+    """Generate quiz questions using Gemini API with fallback"""
+    try:
+        content = ai_gateway.generate('quiz_generation', _questions_prompt(topic, difficulty, num_questions),
+                                      QUIZ_GENERATION_MODEL, _gemini_api_key())
+        return _questions_from_ai_text(content, topic, difficulty, num_questions)
+    except Exception as e:
+        return _sample_fallback(topic, difficulty, num_questions, e)
 
+async def agenerate_questions_with_ai(topic, difficulty, num_questions):
+    """Async variant of generate_questions_with_ai for async views"""
+    try:
+        content = await ai_gateway.agenerate('quiz_generation', _questions_prompt(topic, difficulty, num_questions),
+                                             QUIZ_GENERATION_MODEL, _gemini_api_key())
+        return _questions_from_ai_text(content, topic, difficulty, num_questions)
     except Exception as e:
-        print(f"Gemini API failed: {str(e)}, using sample questions")
-        return generate_sample_questions(topic, difficulty, num_questions)
+        return _sample_fallback(topic, difficulty, num_questions, e)
 
-def create_quiz_from_ai(title, topic, difficulty, num_questions, created_by, time_limit=30):
-    """Create a complete quiz using AI-generated questions"""
+def normalize_topic(topic):
+    """Normalized topic key used to index the question bank"""
+    return ' '.join((topic or '').lower().split())
+
+def question_text_hash(question_text):
+    """SHA-256 of the whitespace/case-normalized question text"""
+    normalized = ' '.join((question_text or '').lower().split())
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+def _clean_options(q_data):
+    """Return (options, correct_idx) with placeholder options and a valid correct index"""
     try:
-        # Generate questions using AI
-        questions_data = generate_questions_with_ai(topic, difficulty, num_questions)
+        correct_idx = int(q_data.get('correct_answer', 0))
+    except (TypeError, ValueError):
+        correct_idx = 0
+    options = [str(opt) for opt in q_data.get('options', [])]
+    if not options:
+        # Fallback: generate placeholder options if missing
+        options = ["Option A", "Option B", "Option C", "Option D"]
+    if correct_idx < 0 or correct_idx >= len(options):
+        correct_idx = 0
+    return options, correct_idx
+
+def bank_candidates_index(created_by, topic_key, signatures):
+    """LSH index over the bank questions sharing a band with any of ``signatures``.
+
+    Looks up the persisted band keys, so the cost follows the number of
+    matching buckets rather than the size of the teacher's bank.
+    """
+    keys = list({key for signature in signatures for key in band_hashes(signature)})
+    index = LSHIndex()
+    seen = set()
+    for start in range(0, len(keys), 500):
+        rows = (BankQuestion.objects
+                .filter(created_by=created_by, topic_key=topic_key, bands__key__in=keys[start:start + 500])
+                .order_by().values_list('id', 'minhash').distinct())
+        for pk, minhash in rows:
+            if pk not in seen:
+                seen.add(pk)
+                index.add(pk, minhash)
+    return index
+
+def _store_bands(bank_questions):
+    BankQuestionBand.objects.bulk_create(
+        [BankQuestionBand(question_id=bq.id, key=key) for bq in bank_questions for key in band_hashes(bq.minhash)],
+        ignore_conflicts=True, batch_size=500,
+    )
+
+def add_questions_to_bank(questions_data, topic, difficulty, created_by, source=None):
+    """Store generated questions in the teacher's bank, reusing rows that already exist.
+
+    A question matches an existing row by exact normalized text, or by being a
+    near-duplicate of a bank question on the same topic. Returns the
+    BankQuestion rows in the same order as ``questions_data``.
+    """
+    topic_key = normalize_topic(topic)
+    hashes = [question_text_hash(q['question']) for q in questions_data]
+    existing = {
+        bq.text_hash: bq
+        for bq in BankQuestion.objects.filter(created_by=created_by, text_hash__in=set(hashes))
+    }
+    signatures = [question_signature(q['question']) for q in questions_data]
+    index = bank_candidates_index(created_by, topic_key, signatures)
 
-        # Create the quiz
+    new_rows = []
+    near_matches = {}
+    for q_data, text_hash, signature in zip(questions_data, hashes, signatures):
+        if text_hash in existing or text_hash in near_matches:
+            continue
+        # Filler-only texts have no signature and only match exactly (above)
+        match = index.find_duplicate(signature)
+        if match is not None:
+            near_matches[text_hash] = match
+            continue
+        options, correct_idx = _clean_options(q_data)
+        row = BankQuestion(
+            created_by=created_by,
+            topic=topic,
+            topic_key=topic_key,
+            difficulty=difficulty,
+            question_text=q_data['question'],
+            question_type='multiple_choice',
+            options=options,
+            correct_answer=correct_idx,
+            explanation=q_data.get('explanation') or '',
+            text_hash=text_hash,
+            minhash=signature,
+            source=source or q_data.get('source', 'sample'),
+        )
+        index.add(('new', text_hash), signature)
+        existing[text_hash] = row
+        new_rows.append(row)
+
+    if new_rows:
+        BankQuestion.objects.bulk_create(new_rows, ignore_conflicts=True)
+    # ignore_conflicts does not return primary keys; re-read the rows we just
+    # wrote together with the near-duplicate matches
+    new_hashes = [r.text_hash for r in new_rows]
+    if new_hashes or near_matches:
+        matched = BankQuestion.objects.in_bulk(
+            {m for m in near_matches.values() if not isinstance(m, tuple)}
+        )
+        created = list(BankQuestion.objects.filter(created_by=created_by, text_hash__in=new_hashes))
+        _store_bands(created)
+        existing.update({bq.text_hash: bq for bq in created})
+        for text_hash, match in near_matches.items():
+            # Matches against rows from this same batch are keyed ('new', text_hash)
+            existing[text_hash] = existing[match[1]] if isinstance(match, tuple) else matched[match]
+
+    return [existing[h] for h in hashes]
+
+def bank_queryset(created_by, topic, difficulty):
+    """Bank questions of a teacher matching a topic and difficulty ('mixed' matches all).
+
+    Includes every source, fallback sample questions too: the bank listing
+    shows them, so assembly counts them as well.
+    """
+    queryset = BankQuestion.objects.filter(created_by=created_by, topic_key=normalize_topic(topic))
+    if difficulty != 'mixed':
+        queryset = queryset.filter(difficulty=difficulty)
+    return queryset
+
+def sample_bank_questions(created_by, topic, difficulty, num_questions, allow_duplicates=False):
+    """Randomly pick ``num_questions`` bank questions, avoiding near-duplicates.
+
+    Candidates are drawn in random order from an index-only scan and checked
+    against a per-quiz LSH index. When the bank has too few distinct questions
+    a ValueError is raised, unless ``allow_duplicates`` is set to fill the
+    count with near-duplicates.
+    """
+    rows = list(bank_queryset(created_by, topic, difficulty).values_list('id', 'minhash', 'question_text'))
+    if len(rows) < num_questions:
+        raise ValueError(
+            f"Question bank has only {len(rows)} question(s) for '{topic}' ({difficulty}); "
+            f"{num_questions} requested"
+        )
+    random.shuffle(rows)
+
+    quiz_index = LSHIndex()
+    picked, near_duplicates = [], []
+    for pk, minhash, question_text in rows:
+        if len(picked) == num_questions:
+            break
+        signature = minhash or question_signature(question_text)
+        if quiz_index.find_duplicate(signature) is not None:
+            near_duplicates.append(pk)
+            continue
+        quiz_index.add(pk, signature)
+        picked.append(pk)
+    if len(picked) < num_questions:
+        if not allow_duplicates:
+            raise ValueError(
+                f"Question bank has only {len(picked)} distinct question(s) for '{topic}' ({difficulty}); "
+                f"{num_questions} requested"
+            )
+        picked.extend(near_duplicates[:num_questions - len(picked)])
+
+    bank_rows = BankQuestion.objects.in_bulk(picked)
+    return [bank_rows[pk] for pk in picked]
+
+def build_quiz_from_bank(bank_questions, title, topic, difficulty, created_by, time_limit=30,
+                         questions_data=None):
+    """Create a quiz whose questions reference the given bank rows.
+
+    Runs as a handful of bulk statements inside one transaction: no AI calls.
+    When ``questions_data`` is given (freshly generated questions), the quiz
+    keeps that wording while still referencing the matching bank rows.
+    """
+    if questions_data is None:
+        questions_data = [
+            {'question': bq.question_text, 'options': bq.options, 'correct_answer': bq.correct_answer}
+            for bq in bank_questions
+        ]
+
+    with transaction.atomic():
         quiz = Quiz.objects.create(
             title=title,
             topic=topic,
             difficulty=difficulty,
-            number_of_questions=num_questions,
+            number_of_questions=len(bank_questions),
             time_limit=time_limit,
             created_by=created_by,
             quiz_code=generate_quiz_code(),
             is_active=True
         )
 
-        # Create questions and choices
-        for i, q_data in enumerate(questions_data):
-            question = Question.objects.create(
+        questions = Question.objects.bulk_create([
+            Question(
                 quiz=quiz,
+                bank_question=bq,
                 question_text=q_data['question'],
-                question_type='multiple_choice',
+                question_type=bq.question_type,
                 points=1,
                 order=i + 1
             )
+            for i, (bq, q_data) in enumerate(zip(bank_questions, questions_data))
+        ])
 
-            # Determine correct index safely
-            try:
-                correct_idx = int(q_data.get('correct_answer', 0))
-            except (TypeError, ValueError):
-                correct_idx = 0
-            options = list(q_data.get('options', []))
-            if not options:
-                # Fallback: generate placeholder options if missing
-                options = ["Option A", "Option B", "Option C", "Option D"]
-            if correct_idx < 0 or correct_idx >= len(options):
-                correct_idx = 0
-
-            # Create choices and ensure exactly one correct
-            created_choices = []
+        choices = []
+        for question, q_data in zip(questions, questions_data):
+            options, correct_idx = _clean_options(q_data)
+            # Exactly one correct choice per question
             for j, choice_text in enumerate(options):
-                created_choices.append(
-                    Choice.objects.create(
-                        question=question,
-                        choice_text=choice_text,
-                        is_correct=(j == correct_idx),
-                        order=j + 1
-                    )
-                )
-
-            # Safety net: ensure at least one correct choice
-            if not any(c.is_correct for c in created_choices):
-                first_choice = created_choices[0]
-                first_choice.is_correct = True
-                first_choice.save(update_fields=["is_correct"]) 
+                choices.append(Choice(
+                    question=question,
+                    choice_text=choice_text,
+                    is_correct=(j == correct_idx),
+                    order=j + 1
+                ))
+        Choice.objects.bulk_create(choices)
+        quiz_content_changed(quiz.id)
+
+        BankQuestion.objects.filter(id__in=[bq.id for bq in bank_questions]).update(times_used=F('times_used') + 1)
+
+    return quiz
+
+def create_quiz_from_bank(title, topic, difficulty, num_questions, created_by, time_limit=30,
+                          allow_duplicates=False):
+    """Assemble a quiz by sampling the teacher's existing question bank"""
+    bank_questions = sample_bank_questions(created_by, topic, difficulty, num_questions, allow_duplicates)
+    return build_quiz_from_bank(bank_questions, title, topic, difficulty, created_by, time_limit)
+
+def create_quiz_from_ai(title, topic, difficulty, num_questions, created_by, time_limit=30):
+    """Create a complete quiz using AI-generated questions.
+
+    Generated questions are stored in the teacher's question bank first, so the
+    bank grows with every generation and the quiz references the bank rows.
+    """
+    # Generate questions using AI
+    questions_data = generate_questions_with_ai(topic, difficulty, num_questions)
+    return create_quiz_from_questions(questions_data, title, topic, difficulty, created_by, time_limit)
+
+def create_quiz_from_questions(questions_data, title, topic, difficulty, created_by, time_limit=30):
+    """Bank already generated questions and build the quiz from them"""
+    try:
+        bank_questions = add_questions_to_bank(questions_data, topic, difficulty, created_by)
 
         # Previously we created a LiveQuizSession here for teacher-controlled live quizzes.
         # For the simplified flow we now return the created Quiz and use the quiz's
@@ -411,25 +615,137 @@ def create_quiz_from_ai(title, topic, difficulty, num_questions, created_by, tim
         # a LiveQuizSession automatically — that enables students to join by code
         # and take the quiz independently (Next/Submit is client-driven).
 
-        return quiz
+        return build_quiz_from_bank(bank_questions, title, topic, difficulty, created_by, time_limit,
+                                    questions_data=questions_data)
 
     except Exception as e:
         raise Exception(f"Error creating quiz: {str(e)}")
 
+def clone_quiz(quiz, created_by, title=None):
+    """Copy a quiz with all questions and choices under a new quiz code.
+
+    Reads the source in two queries and writes the copy with bulk inserts
+    inside one transaction.
+    """
+    questions = list(quiz.questions.all())
+    choices_by_question = {}
+    for choice in Choice.objects.filter(question__quiz=quiz).order_by('question_id', 'order'):
+        choices_by_question.setdefault(choice.question_id, []).append(choice)
+
+    with transaction.atomic():
+        clone = Quiz.objects.create(
+            title=title or quiz.title,
+            topic=quiz.topic,
+            difficulty=quiz.difficulty,
+            number_of_questions=quiz.number_of_questions,
+            time_limit=quiz.time_limit,
+            created_by=created_by,
+            quiz_code=generate_quiz_code(),
+            is_active=True
+        )
+
+        new_questions = Question.objects.bulk_create([
+            Question(
+                quiz=clone,
+                bank_question_id=q.bank_question_id,
+                question_text=q.question_text,
+                question_type=q.question_type,
+                points=q.points,
+                order=q.order
+            )
+            for q in questions
+        ])
+
+        Choice.objects.bulk_create([
+            Choice(
+                question=new_question,
+                choice_text=choice.choice_text,
+                is_correct=choice.is_correct,
+                order=choice.order
+            )
+            for old_question, new_question in zip(questions, new_questions)
+            for choice in choices_by_question.get(old_question.id, [])
+        ])
+        quiz_content_changed(clone.id)
+
+    return clone
+
+# Answer keys are immutable once a quiz is generated; keep them briefly per process
+ANSWER_KEY_TTL_SECONDS = 60
+_answer_keys = {}
+_answer_keys_lock = threading.Lock()
+
+class AnswerKey:
+    """Question ids, points and choice ownership/correctness for one quiz"""
+
+    def __init__(self, quiz_id, questions, choices):
+        self.quiz_id = quiz_id
+        self.questions = questions  # question_id -> (points, question_type)
+        self.choices = choices  # choice_id -> (question_id, is_correct)
+
+    def validate(self, question_id, choice_id=None):
+        """True if the question belongs to the quiz and the choice to the question"""
+        if question_id not in self.questions:
+            return False
+        return choice_id is None or self.choices.get(choice_id, (None,))[0] == question_id
+
+    def is_correct(self, question_id, choice_id):
+        if choice_id is None or self.questions[question_id][1] not in ('multiple_choice', 'true_false'):
+            return False
+        return self.choices[choice_id][1]
+
+def load_answer_key(quiz_id, use_cache=True):
+    """Load a quiz's answer key in two queries, reusing a recent copy when allowed"""
+    now = time.monotonic()
+    if use_cache:
+        with _answer_keys_lock:
+            cached = _answer_keys.get(quiz_id)
+        hit = bool(cached and now - cached[0] < ANSWER_KEY_TTL_SECONDS)
+        metrics.record_cache('answer_key', hit)
+        if hit:
+            return cached[1]
+
+    questions = {
+        pk: (points, question_type)
+        for pk, points, question_type in Question.objects.filter(quiz_id=quiz_id)
+        .values_list('id', 'points', 'question_type')
+    }
+    choices = {
+        pk: (question_id, is_correct)
+        for pk, question_id, is_correct in Choice.objects.filter(question__quiz_id=quiz_id)
+        .values_list('id', 'question_id', 'is_correct')
+    }
+    key = AnswerKey(quiz_id, questions, choices)
+    with _answer_keys_lock:
+        _answer_keys[quiz_id] = (now, key)
+    return key
+
+def grade_stored_answers(session_ids):
+    """Mark correctness and points of every stored answer of the sessions in one UPDATE"""
+    correct_choice = Choice.objects.filter(
+        pk=OuterRef('selected_choice_id'),
+        is_correct=True,
+        question__question_type__in=['multiple_choice', 'true_false'],
+    )
+    return Answer.objects.filter(session_id__in=session_ids).update(
+        is_correct=Exists(correct_choice),
+        points_earned=Coalesce(Subquery(correct_choice.values('question__points')[:1]), 0),
+    )
+
 def calculate_quiz_score(session):
-    """Calculate the final score for a quiz session"""
-    answers = session.answers.all()
-    total_points = 0
-    earned_points = 0
-
-    for answer in answers:
-        total_points += answer.question.points
-        if answer.is_correct:
-            earned_points += answer.question.points
-            answer.points_earned = answer.question.points
-        else:
-            answer.points_earned = 0
-        answer.save()
+    """Calculate the final score for a quiz session from its stored answers.
+
+    Grading is set-based: one UPDATE marks every answer, one aggregate sums
+    the points, regardless of the number of questions.
+    """
+    grade_stored_answers([session.id])
+
+    totals = session.answers.aggregate(
+        total_points=Sum('question__points'),
+        earned_points=Sum('points_earned'),
+    )
+    total_points = totals['total_points'] or 0
+    earned_points = totals['earned_points'] or 0
 
     score_percentage = (earned_points / total_points * 100) if total_points > 0 else 0
 
@@ -437,4 +753,4 @@ def calculate_quiz_score(session):
     session.total_points = total_points
     session.save()
 
-    return session.score
\ No newline at end of file
+    return session.score
@@ -1,29 +1,51 @@
+import logging
+
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import PageNumberPagination, CursorPagination
+from django.conf import settings
 from django.shortcuts import get_object_or_404
+from django.http import StreamingHttpResponse
 from django.utils import timezone
-from django.db.models import Count, Avg
-from .models import Quiz, Question, Choice, QuizSession, Answer, LiveQuizSession, LiveParticipant
+from django.db import OperationalError
+from django.db.models import Count, Avg, prefetch_related_objects
+from .models import Quiz, Question, Choice, QuizSession, LiveQuizSession, LiveParticipant, BankQuestion
 from .serializers import (
     QuizSerializer, QuizDetailSerializer, QuizCreateSerializer,
     QuizSessionSerializer, AnswerSubmissionSerializer, QuizJoinSerializer,
     QuizResultSerializer, LiveSessionCreateSerializer, LiveSessionStateSerializer,
-    QuestionSerializer
+    QuestionSerializer, BankQuestionSerializer, QuizHistorySerializer, BatchSubmissionSerializer
+)
+from .utils import (
+    create_quiz_from_ai, create_quiz_from_bank, clone_quiz, calculate_quiz_score, normalize_topic,
+    load_answer_key
 )
-from .utils import create_quiz_from_ai, calculate_quiz_score
+from .autosave import save_answers
+from .grading import submit_batch
+from .bank_io import READ_ERRORS, iter_bank_jsonl, gzip_stream, open_jsonl_upload, import_bank_jsonl
+from .signals import quiz_namespace
+from apps.core.cache import get_or_set
 import threading
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import get_user_model
 from django.utils.crypto import get_random_string
 
+logger = logging.getLogger(__name__)
+
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 100
 
+class QuizHistoryCursorPagination(CursorPagination):
+    """Keyset pagination on started_at: every page costs the same however deep it is"""
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = '-started_at'
+
 # Quiz Management Views (for Teachers/Admins)
 
 @api_view(['POST'])
@@ -67,6 +89,106 @@ def create_quiz(request):
             )
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def list_bank_questions(request):
+    """List the current teacher's question bank, optionally filtered by topic and difficulty"""
+    if request.user.user_type not in ['teacher', 'admin']:
+        return Response({'error': 'Only teachers and admins can view the question bank'},
+                       status=status.HTTP_403_FORBIDDEN)
+
+    questions = BankQuestion.objects.filter(created_by=request.user)
+    topic = request.query_params.get('topic')
+    if topic:
+        questions = questions.filter(topic_key=normalize_topic(topic))
+    difficulty = request.query_params.get('difficulty')
+    if difficulty:
+        questions = questions.filter(difficulty=difficulty)
+
+    paginator = StandardResultsSetPagination()
+    page = paginator.paginate_queryset(questions, request)
+    if page is not None:
+        serializer = BankQuestionSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    serializer = BankQuestionSerializer(questions, many=True)
+    return Response(serializer.data)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def create_quiz_from_bank_view(request):
+    """Create a new quiz by sampling the teacher's question bank (no AI call)"""
+    if request.user.user_type not in ['teacher', 'admin']:
+        return Response({'error': 'Only teachers and admins can create quizzes'},
+                       status=status.HTTP_403_FORBIDDEN)
+
+    serializer = QuizCreateSerializer(data=request.data)
+    if serializer.is_valid():
+        try:
+            quiz = create_quiz_from_bank(
+                title=serializer.validated_data['title'],
+                topic=serializer.validated_data['topic'],
+                difficulty=serializer.validated_data['difficulty'],
+                num_questions=serializer.validated_data['number_of_questions'],
+                created_by=request.user,
+                time_limit=serializer.validated_data.get('time_limit', 30),
+                # Reworded copies of the same question only fill the quiz on request
+                allow_duplicates=str(request.data.get('allow_duplicates', '')).lower() in ('1', 'true'),
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        response_data = QuizSerializer(quiz).data
+        response_data['quiz_code'] = quiz.quiz_code
+        response_data['room_code'] = quiz.quiz_code
+        return Response(response_data, status=status.HTTP_201_CREATED)
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_bank(request):
+    """Stream the current teacher's question bank as JSON Lines (gzip with ?gzip=1)"""
+    if request.user.user_type not in ['teacher', 'admin']:
+        return Response({'error': 'Only teachers and admins can export the question bank'},
+                       status=status.HTTP_403_FORBIDDEN)
+
+    questions = BankQuestion.objects.filter(created_by=request.user).order_by('id')
+    topic = request.query_params.get('topic')
+    if topic:
+        questions = questions.filter(topic_key=normalize_topic(topic))
+
+    chunks = iter_bank_jsonl(questions)
+    filename = 'question_bank.jsonl'
+    if request.query_params.get('gzip') in ('1', 'true'):
+        chunks = gzip_stream(chunks)
+        filename += '.gz'
+        response = StreamingHttpResponse(chunks, content_type='application/gzip')
+    else:
+        response = StreamingHttpResponse(chunks, content_type='application/x-ndjson')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def import_bank(request):
+    """Import questions from an uploaded JSON Lines file (optionally gzip) into the bank"""
+    if request.user.user_type not in ['teacher', 'admin']:
+        return Response({'error': 'Only teachers and admins can import questions'},
+                       status=status.HTTP_403_FORBIDDEN)
+
+    if 'file' not in request.FILES:
+        return Response({'error': 'file field is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        report = import_bank_jsonl(open_jsonl_upload(request.FILES['file']), request.user)
+    except READ_ERRORS as e:
+        return Response({'error': f'Could not read import file: {str(e) or type(e).__name__}'},
+                       status=status.HTTP_400_BAD_REQUEST)
+    if report.get('error'):
+        # Lines before the damage were imported; the report says how many
+        return Response(report, status=status.HTTP_400_BAD_REQUEST)
+    return Response(report, status=status.HTTP_201_CREATED)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def list_my_quizzes(request):
@@ -98,18 +220,45 @@ def quiz_detail(request, quiz_id):
     # Check permissions
     if request.user.user_type == 'student':
         # Students can only see basic info and questions if they have an active session
-        try:
-            session = QuizSession.objects.get(quiz=quiz, student=request.user, status='started')
-            serializer = QuizDetailSerializer(quiz)
-        except QuizSession.DoesNotExist:
-            serializer = QuizSerializer(quiz)
+        has_active_session = QuizSession.objects.filter(
+            quiz=quiz, student=request.user, status='started'
+        ).exclude(expires_at__lt=timezone.now()).exists()
+        detailed = has_active_session
     else:
         # Teachers and admins can see full details
-        if quiz.created_by != request.user and request.user.user_type != 'admin':
+        if quiz.created_by_id != request.user.id and request.user.user_type != 'admin':
             return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
-        serializer = QuizDetailSerializer(quiz)
+        detailed = True
 
-    return Response(serializer.data)
+    def serialize():
+        if not detailed:
+            return QuizSerializer(quiz).data
+        prefetch_related_objects([quiz], 'questions__choices')
+        return QuizDetailSerializer(quiz).data
+
+    # Cached per quiz; signals drop the entries when the quiz, questions or choices change
+    data = get_or_set(quiz_namespace(quiz.id), 'detail' if detailed else 'basic', serialize,
+                      ttl=settings.QUIZ_DETAIL_CACHE_TTL)
+    return Response(data)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def clone_quiz_view(request, quiz_id):
+    """Copy a quiz with all its questions under a new quiz code"""
+    if request.user.user_type not in ['teacher', 'admin']:
+        return Response({'error': 'Only teachers and admins can clone quizzes'},
+                       status=status.HTTP_403_FORBIDDEN)
+
+    quiz = get_object_or_404(Quiz, id=quiz_id)
+    if quiz.created_by != request.user and request.user.user_type != 'admin':
+        return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+
+    clone = clone_quiz(quiz, request.user, title=request.data.get('title'))
+
+    response_data = QuizSerializer(clone).data
+    response_data['quiz_code'] = clone.quiz_code
+    response_data['room_code'] = clone.quiz_code
+    return Response(response_data, status=status.HTTP_201_CREATED)
 
 # Student Quiz Views
 
@@ -152,7 +301,8 @@ def join_quiz(request):
         guest_token = token_obj.key
         created_guest = True
 
-    print(f"JOIN QUIZ DEBUG: User={user}, UserType={getattr(user, 'user_type', None)}, Data={request.data}")
+    logger.debug("join_quiz user=%s user_type=%s quiz_code=%s",
+                 user.pk, getattr(user, 'user_type', None), request.data.get('quiz_code'))
 
     if getattr(user, 'user_type', None) != 'student':
         return Response({'error': 'Only students can join quizzes'},
@@ -181,6 +331,9 @@ def join_quiz(request):
             if existing_session.status == 'completed':
                 return Response({'error': 'You have already completed this quiz'},
                                status=status.HTTP_400_BAD_REQUEST)
+            elif existing_session.status == 'abandoned' or existing_session.is_expired():
+                return Response({'error': 'The time limit for this quiz has expired'},
+                               status=status.HTTP_400_BAD_REQUEST)
             else:
                 # Return existing session (include guest token if one was created just now)
                 payload = QuizSessionSerializer(existing_session).data
@@ -236,54 +389,79 @@ def quiz_session(request, session_id):
             'quiz': serializer.data
         })
 
+def _validated_answers(session, answers_data):
+    """Check answers against the quiz's answer key; returns an error message or None"""
+    key = load_answer_key(session.quiz_id)
+    for answer_data in answers_data:
+        if not key.validate(answer_data['question'], answer_data.get('selected_choice')):
+            return f"Invalid question or choice for question {answer_data['question']}"
+    return None
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
-def submit_quiz(request, session_id):
-    """Submit quiz answers"""
+def autosave_answers(request, session_id):
+    """Save in-progress answers (one IMMEDIATE-transaction upsert per request)"""
     session = get_object_or_404(QuizSession, id=session_id, student=request.user)
 
     if session.status != 'started':
         return Response({'error': 'Quiz session is not active'},
                        status=status.HTTP_400_BAD_REQUEST)
+    if session.is_expired(settings.QUIZ_SESSION_GRACE_SECONDS):
+        return Response({'error': 'Time limit exceeded'},
+                       status=status.HTTP_400_BAD_REQUEST)
 
     serializer = AnswerSubmissionSerializer(data=request.data)
     if serializer.is_valid():
-        answers_data = serializer.validated_data['answers']
+        answers_data = serializer.validated_data.get('answers', [])
+        error = _validated_answers(session, answers_data)
+        if error:
+            return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Save answers
-        for answer_data in answers_data:
-            question = get_object_or_404(Question, id=answer_data['question'], quiz=session.quiz)
-
-            # Resolve selected_choice to object (and ensure it belongs to the same question)
-            selected_choice_obj = None
-            selected_choice_id = answer_data.get('selected_choice')
-            if selected_choice_id is not None:
-                selected_choice_obj = get_object_or_404(Choice, id=selected_choice_id, question=question)
-
-            # Check if answer already exists (prevent duplicate submission)
-            answer, created = Answer.objects.get_or_create(
-                session=session,
-                question=question,
-                defaults={
-                    'selected_choice': selected_choice_obj,
-                    'text_answer': answer_data.get('text_answer', ''),
-                }
-            )
+        try:
+            saved = save_answers(session, answers_data)
+        except OperationalError as e:
+            # The write lock stayed busy past the timeout; the client keeps the answers and retries
+            logger.warning("Autosave for session %s failed: %s", session.id, e)
+            return Response({'error': 'Answers could not be saved right now; try again'},
+                           status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        if saved is None:
+            return Response({'error': 'Quiz session is not active'},
+                           status=status.HTTP_400_BAD_REQUEST)
+        return Response({'saved': saved}, status=status.HTTP_200_OK)
+
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-            if not created:
-                # Update existing answer
-                answer.selected_choice = selected_choice_obj
-                answer.text_answer = answer_data.get('text_answer', '')
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def submit_quiz(request, session_id):
+    """Submit quiz answers.
+
+    Answers in the request are merged with any autosaved answers, written as
+    one upsert batch and graded from what is stored. After the deadline (plus
+    grace period) only the answers already stored are graded.
+    """
+    session = get_object_or_404(QuizSession, id=session_id, student=request.user)
+
+    if session.status != 'started':
+        return Response({'error': 'Quiz session is not active'},
+                       status=status.HTTP_400_BAD_REQUEST)
 
-            # Check if answer is correct
-            if question.question_type in ('multiple_choice', 'true_false') and answer.selected_choice:
-                answer.is_correct = answer.selected_choice.is_correct
+    serializer = AnswerSubmissionSerializer(data=request.data)
+    if serializer.is_valid():
+        answers_data = serializer.validated_data.get('answers', [])
+        error = _validated_answers(session, answers_data)
+        if error:
+            return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
 
-            answer.save()
+        expired = session.is_expired(settings.QUIZ_SESSION_GRACE_SECONDS)
+
+        # Save answers
+        if answers_data and not expired:
+            save_answers(session, answers_data)
 
         # Complete the session
         session.status = 'completed'
-        session.completed_at = timezone.now()
+        session.completed_at = session.expires_at if expired else timezone.now()
         session.save()
 
         # Calculate score
@@ -291,16 +469,17 @@ def submit_quiz(request, session_id):
 
         # Build user_answers mapping for immediate client consumption
         user_answers = {}
-        for answer in session.answers.select_related('question', 'selected_choice').all():
-            user_answers[str(answer.question.id)] = {
-                'selected_choice': answer.selected_choice.id if answer.selected_choice else None,
+        for answer in session.answers.all():
+            user_answers[str(answer.question_id)] = {
+                'selected_choice': answer.selected_choice_id,
                 'text_answer': answer.text_answer,
                 'is_correct': answer.is_correct,
                 'points_earned': answer.points_earned,
             }
 
         return Response({
-            'message': 'Quiz submitted successfully',
+            'message': 'Time limit exceeded; saved answers were graded' if expired else 'Quiz submitted successfully',
+            'expired': expired,
             'score': final_score,
             'session_id': session.id,
             'user_answers': user_answers,
@@ -308,6 +487,30 @@ def submit_quiz(request, session_id):
 
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def submit_quiz_batch(request, quiz_id):
+    """Submit many students' answers for one quiz in a single request (offline sync)"""
+    if request.user.user_type not in ['teacher', 'admin']:
+        return Response({'error': 'Only teachers and admins can sync submissions'},
+                       status=status.HTTP_403_FORBIDDEN)
+
+    quiz = get_object_or_404(Quiz, id=quiz_id)
+    if quiz.created_by != request.user and request.user.user_type != 'admin':
+        return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+
+    serializer = BatchSubmissionSerializer(data=request.data)
+    if serializer.is_valid():
+        results = submit_batch(quiz, serializer.validated_data['submissions'])
+        return Response({
+            'quiz_id': str(quiz.id),
+            'completed': sum(1 for r in results if r['status'] == 'completed'),
+            'failed': sum(1 for r in results if r['status'] == 'error'),
+            'results': results,
+        }, status=status.HTTP_200_OK)
+
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
 # Analytics Views
 
 @api_view(['GET'])
@@ -346,23 +549,39 @@ def student_quiz_history(request):
         return Response({'error': 'Only students can view quiz history'},
                        status=status.HTTP_403_FORBIDDEN)
 
-    sessions = QuizSession.objects.filter(student=request.user)
+    # ?fields=id,status,score returns a slim payload and skips the quiz join
+    fields = None
+    if request.query_params.get('fields'):
+        fields = [f.strip() for f in request.query_params['fields'].split(',') if f.strip()]
 
-    paginator = StandardResultsSetPagination()
+    sessions = QuizSession.objects.filter(student=request.user)
+    if fields is None or 'quiz' in fields:
+        sessions = sessions.select_related('quiz__created_by')
+    if fields is None or 'student' in fields:
+        sessions = sessions.select_related('student')
+
+    # Page numbers with a count (the count is an index-only scan of the
+    # student's sessions); clients opt into keyset pages with ?cursor=
+    if 'cursor' in request.query_params:
+        paginator = QuizHistoryCursorPagination()
+    else:
+        paginator = StandardResultsSetPagination()
     page = paginator.paginate_queryset(sessions, request)
-    if page is not None:
-        serializer = QuizSessionSerializer(page, many=True)
-        return paginator.get_paginated_response(serializer.data)
-
-    serializer = QuizSessionSerializer(sessions, many=True)
-    return Response(serializer.data)
+    serializer = QuizHistorySerializer(page, many=True, fields=fields)
+    return paginator.get_paginated_response(serializer.data)
 
 @api_view(['GET'])
 @permission_classes([])
 def list_quiz_sessions(request):
     """List active quizzes that can be joined via quiz code."""
+    # Same list for every user; cached briefly and dropped when quizzes or live rooms change
+    return Response(get_or_set('quiz_sessions', 'active', _joinable_sessions,
+                               ttl=settings.QUIZ_SESSIONS_CACHE_TTL))
+
+def _joinable_sessions():
     # Prefer active LiveQuizSession entries (teacher-created live rooms).
-    live_sessions = LiveQuizSession.objects.filter(is_active=True).order_by('-created_at')
+    live_sessions = LiveQuizSession.objects.filter(is_active=True).select_related('quiz', 'host') \
+        .order_by('-created_at')
 
     sessions_data = []
     for ls in live_sessions:
@@ -379,7 +598,7 @@ def list_quiz_sessions(request):
 
     # If no live sessions exist, fall back to active quizzes so students still see joinable quizzes
     if not sessions_data:
-        quizzes = Quiz.objects.filter(is_active=True).order_by('-created_at')
+        quizzes = Quiz.objects.filter(is_active=True).select_related('created_by').order_by('-created_at')
         for quiz in quizzes:
             sessions_data.append({
                 'id': str(quiz.id),
@@ -392,7 +611,7 @@ def list_quiz_sessions(request):
                 'is_active': quiz.is_active,
             })
 
-    return Response(sessions_data)
+    return sessions_data
 
 @api_view(['GET'])
 @permission_classes([])
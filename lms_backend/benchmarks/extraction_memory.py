@@ -0,0 +1,109 @@
+"""
+Peak-memory benchmark for PDF text extraction.
+
+Extracts a 1,000-page synthetic PDF and measures the peak Python heap
+(tracemalloc) and peak RSS of the extracting process for:
+
+  legacy     the previous extractor: pages appended with ``text += ...`` and
+             the whole string kept for PDFDocument.text_content
+  streaming  extraction.write_text() reading pages inline, written to a file as they come
+  pool       extraction.write_text() with the extraction process pool (the worker
+             processes' own RSS is reported separately)
+
+Each mode runs in a fresh interpreter so the numbers do not mix. Times are
+not reported: tracemalloc slows the inline modes several times over.
+
+    python benchmarks/extraction_memory.py
+    python benchmarks/extraction_memory.py --pages 2000 --workers 4
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+MODES = ('legacy', 'streaming', 'pool')
+
+
+def legacy_extract(path):
+    """The extractor as it was: quadratic string growth, full text returned"""
+    import PyPDF2
+    with open(path, 'rb') as pdf_file:
+        reader = PyPDF2.PdfReader(pdf_file)
+        text = ""
+        for page in reader.pages:
+            page_text = page.extract_text()
+            if page_text:
+                page_text = '\n'.join(line.strip() for line in page_text.split('\n') if line.strip())
+            if page_text and len(page_text.strip()) > 0:
+                text += page_text + "\n\n"
+        return text.strip()
+
+
+def run_mode(mode, path, workers):
+    from django.conf import settings
+    settings.configure(PDF_EXTRACT_WORKERS=workers if mode == 'pool' else 0)
+    from apps.document_store import extraction
+
+    tracemalloc.start()
+    if mode == 'legacy':
+        text = legacy_extract(path)
+        chars = len(text)
+    else:
+        with tempfile.TemporaryFile() as out:
+            _, chars, _ = extraction.write_text(path, out)
+    _, peak = tracemalloc.get_traced_memory()
+    executor = extraction.get_executor()
+    if executor is not None:
+        executor.shutdown(wait=True)  # reap the workers so their RSS is counted
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    print(json.dumps({
+        'mode': mode, 'chars': chars, 'heap_peak': peak,
+        'rss_peak': usage.ru_maxrss * scale, 'children_rss_peak': children.ru_maxrss * scale,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=2, help='Pool size for the pool mode')
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--pdf', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.pdf, args.workers)
+        return
+
+    from benchmarks.synthetic_pdf import write_pdf
+
+    mb = 1024 * 1024
+    with tempfile.TemporaryDirectory(prefix='extract_mem_') as workdir:
+        path = write_pdf(os.path.join(workdir, 'book.pdf'), args.pages)
+        print(f'1 document x {args.pages} pages ({os.path.getsize(path) / mb:.1f} MB PDF)\n')
+        print(f"{'mode':<10} {'chars':>10} {'heap peak MB':>13} {'RSS peak MB':>12} {'worker RSS MB':>14}")
+        for mode in MODES:
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--mode', mode, '--pdf', path,
+                 '--workers', str(args.workers)],
+                capture_output=True, text=True,
+            )
+            if proc.returncode != 0:
+                sys.exit(f'{mode} failed:\n{proc.stderr[-2000:]}')
+            r = json.loads(proc.stdout.strip().splitlines()[-1])
+            workers_rss = f"{r['children_rss_peak'] / mb:>14.1f}" if mode == 'pool' else f"{'-':>14}"
+            print(f"{mode:<10} {r['chars']:>10} {r['heap_peak'] / mb:>13.1f} "
+                  f"{r['rss_peak'] / mb:>12.1f} {workers_rss}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+PDF extraction throughput benchmark.
+
+Extracts a batch of synthetic PDFs with a thread pool (the old behaviour:
+concurrent extractions share the GIL) and with the extraction process pool,
+for a range of worker counts, and reports documents/s and the speedup over
+one worker. Process-pool throughput should scale with the number of cores;
+thread-pool throughput stays flat.
+
+    python benchmarks/extraction_throughput.py                    # 1, 2, 4, ... up to the CPU count
+    python benchmarks/extraction_throughput.py --docs 32 --pages 50 --workers 1 2 4 8
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from apps.document_store.extraction import extract_pages  # noqa: E402
+from benchmarks.synthetic_pdf import write_pdf  # noqa: E402
+
+
+def run(executor_class, workers, paths):
+    kwargs = {'mp_context': multiprocessing.get_context('spawn')} if executor_class is ProcessPoolExecutor else {}
+    with executor_class(max_workers=workers, **kwargs) as executor:
+        # Start the workers before timing, as the long-lived pool would be
+        list(executor.map(abs, range(workers)))
+        start = time.perf_counter()
+        pages = sum(page_count for _, page_count in executor.map(extract_pages, paths))
+        elapsed = time.perf_counter() - start
+    return elapsed, pages
+
+
+def default_workers():
+    counts, n = [], 1
+    while n < (os.cpu_count() or 1):
+        counts.append(n)
+        n *= 2
+    return counts + [os.cpu_count() or 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--docs', type=int, default=16, help='Documents per run')
+    parser.add_argument('--pages', type=int, default=30, help='Pages per document')
+    parser.add_argument('--workers', type=int, nargs='+', default=None, help='Worker counts to compare')
+    args = parser.parse_args()
+    worker_counts = args.workers or default_workers()
+
+    with tempfile.TemporaryDirectory(prefix='extract_bench_') as workdir:
+        paths = [write_pdf(os.path.join(workdir, f'doc{n}.pdf'), args.pages, seed=n) for n in range(args.docs)]
+        print(f'{args.docs} documents x {args.pages} pages, {os.cpu_count()} CPU(s)\n')
+        print(f"{'mode':<8} {'workers':>7} {'seconds':>8} {'docs/s':>8} {'pages/s':>8} {'speedup':>8}")
+        for name, executor_class in (('threads', ThreadPoolExecutor), ('process', ProcessPoolExecutor)):
+            baseline = None
+            for workers in worker_counts:
+                elapsed, pages = run(executor_class, workers, paths)
+                baseline = baseline or elapsed
+                print(f'{name:<8} {workers:>7} {elapsed:>8.2f} {args.docs / elapsed:>8.1f} '
+                      f'{pages / elapsed:>8.0f} {baseline / elapsed:>7.2f}x')
+
+
+if __name__ == '__main__':
+    main()
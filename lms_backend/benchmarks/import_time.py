@@ -0,0 +1,93 @@
+"""
+Import-time benchmark for worker boot.
+
+Starts a fresh interpreter with ``python -X importtime``, runs django.setup()
+and imports the URL conf (everything a worker loads before its first
+request), then reports total import time, the slowest top-level packages and
+whether any deferred heavy dependency was imported during boot.
+
+    python benchmarks/import_time.py                 # report
+    python benchmarks/import_time.py --budget-ms 800 # also fail above a budget
+    python benchmarks/import_time.py --runs 5        # median of several runs
+
+Exits non-zero if a deferred module is imported at boot or the budget is
+exceeded, so it can run in CI to catch start-up regressions.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Must only be imported on first use (see apps.core.lazy_imports)
+DEFERRED_MODULES = ['google.generativeai', 'PyPDF2', 'pyttsx3']
+
+BOOT_CODE = 'import django; django.setup(); import lms_backend.urls'
+
+_LINE_RE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def measure():
+    """One cold boot; returns (total_us, {top_level_package: cumulative_us}, imported names)"""
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'lms_backend.settings'))
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', BOOT_CODE],
+        cwd=BASE_DIR, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        sys.exit(f'Boot failed:\n{proc.stderr[-2000:]}')
+
+    total = 0
+    packages = defaultdict(int)
+    imported = set()
+    for line in proc.stderr.splitlines():
+        match = _LINE_RE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = int(match[1]), int(match[2]), match[3], match[4]
+        imported.add(name)
+        total += self_us
+        if len(indent) == 1:  # imported directly by the boot code or Django, not nested
+            packages[name.split('.')[0]] += cumulative_us
+    return total, packages, imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=3, help='Cold boots to measure (median is reported)')
+    parser.add_argument('--top', type=int, default=15, help='Slowest top-level packages to list')
+    parser.add_argument('--budget-ms', type=float, default=None, help='Fail if median import time exceeds this')
+    args = parser.parse_args()
+
+    runs = [measure() for _ in range(args.runs)]
+    totals = [total for total, _, _ in runs]
+    median_ms = statistics.median(totals) / 1000
+    _, packages, imported = runs[totals.index(sorted(totals)[len(totals) // 2])]
+
+    print(f'Worker boot import time: median {median_ms:.1f} ms over {args.runs} run(s) '
+          f'(min {min(totals) / 1000:.1f}, max {max(totals) / 1000:.1f})')
+    print(f"\n{'package':<30} {'cumulative ms':>14}")
+    for name, cumulative in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f'{name:<30} {cumulative / 1000:>14.1f}')
+
+    failures = []
+    eager = [name for name in DEFERRED_MODULES if name in imported]
+    if eager:
+        failures.append(f'deferred modules imported at boot: {", ".join(eager)}')
+    if args.budget_ms is not None and median_ms > args.budget_ms:
+        failures.append(f'median {median_ms:.1f} ms exceeds budget of {args.budget_ms:g} ms')
+
+    print()
+    if failures:
+        for failure in failures:
+            print(f'FAIL: {failure}')
+        sys.exit(1)
+    print(f'OK: none of {", ".join(DEFERRED_MODULES)} imported at boot')
+
+
+if __name__ == '__main__':
+    main()
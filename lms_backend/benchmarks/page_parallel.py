@@ -0,0 +1,62 @@
+"""
+Single-document extraction benchmark for page-range sharding.
+
+Extracts one large synthetic PDF (400 pages by default) with run_extraction()
+on process pools of increasing size, sharding the document into one page
+range per worker, and reports wall time and speedup over one worker. On a
+multi-core machine the speedup should grow roughly linearly up to the core
+count.
+
+    python benchmarks/page_parallel.py
+    python benchmarks/page_parallel.py --pages 1000 --workers 1 2 4 8
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from benchmarks.extraction_throughput import default_workers  # noqa: E402
+from benchmarks.synthetic_pdf import write_pdf  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', type=int, default=400)
+    parser.add_argument('--workers', type=int, nargs='+', default=None, help='Pool sizes to compare')
+    parser.add_argument('--min-pages', type=int, default=25, help='Minimum pages per shard')
+    parser.add_argument('--runs', type=int, default=3, help='Runs per pool size (best is reported)')
+    args = parser.parse_args()
+
+    from django.conf import settings
+    settings.configure(PDF_EXTRACT_SHARD_MIN_PAGES=args.min_pages)
+    from apps.document_store.extraction import run_extraction
+
+    with tempfile.TemporaryDirectory(prefix='page_parallel_') as workdir:
+        path = write_pdf(os.path.join(workdir, 'book.pdf'), args.pages)
+        print(f'1 document x {args.pages} pages, {os.cpu_count()} CPU(s)\n')
+        print(f"{'workers':>7} {'shards':>6} {'seconds':>8} {'pages/s':>8} {'speedup':>8}")
+        baseline = None
+        for workers in args.workers or default_workers():
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+                list(executor.map(abs, range(workers)))  # start the workers before timing
+                best = None
+                for _ in range(args.runs):
+                    start = time.perf_counter()
+                    pages, page_count = run_extraction(path, executor=executor, shards=workers)
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+            assert [page['page'] for page in pages] == list(range(1, page_count + 1)), 'pages out of order'
+            shards = -(-page_count // max(args.min_pages, -(-page_count // workers)))
+            baseline = baseline or best
+            print(f'{workers:>7} {shards:>6} {best:>8.2f} {page_count / best:>8.0f} {baseline / best:>7.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Synthetic text PDFs for the extraction benchmarks.
+
+Writes a valid PDF with one Helvetica text stream per page, without any
+PDF-writing dependency:
+
+    python benchmarks/synthetic_pdf.py /tmp/book.pdf --pages 400
+"""
+import argparse
+import random
+
+WORDS = ('lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut '
+         'labore et dolore magna aliqua enim ad minim veniam quis nostrud exercitation ullamco laboris').split()
+
+
+def _page_stream(page_num, lines, rng):
+    parts = ['BT', '/F1 10 Tf', '12 TL', '50 760 Td', f'(Page {page_num}) Tj', 'T*']
+    for _ in range(lines):
+        parts.append(f"({' '.join(rng.choice(WORDS) for _ in range(12))}) Tj")
+        parts.append('T*')
+    parts.append('ET')
+    return '\n'.join(parts).encode('latin-1')
+
+
+def write_pdf(path, pages=100, lines_per_page=40, seed=0):
+    """Write a ``pages``-page text PDF to ``path``"""
+    rng = random.Random(seed)
+    # Object numbers: 1 catalog, 2 page tree, 3 font, then (page, content) pairs
+    objects = {
+        1: b'<< /Type /Catalog /Pages 2 0 R >>',
+        3: b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    }
+    kids = []
+    for n in range(pages):
+        page_obj, content_obj = 4 + 2 * n, 5 + 2 * n
+        kids.append(f'{page_obj} 0 R')
+        stream = _page_stream(n + 1, lines_per_page, rng)
+        objects[page_obj] = (f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+                             f'/Resources << /Font << /F1 3 0 R >> >> /Contents {content_obj} 0 R >>').encode()
+        objects[content_obj] = b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream)
+    objects[2] = f'<< /Type /Pages /Kids [{" ".join(kids)}] /Count {pages} >>'.encode()
+
+    with open(path, 'wb') as out:
+        out.write(b'%PDF-1.4\n')
+        offsets = {}
+        for number in sorted(objects):
+            offsets[number] = out.tell()
+            out.write(b'%d 0 obj\n%s\nendobj\n' % (number, objects[number]))
+        xref = out.tell()
+        count = max(objects) + 1
+        out.write(b'xref\n0 %d\n0000000000 65535 f \n' % count)
+        for number in range(1, count):
+            out.write(b'%010d 00000 n \n' % offsets[number])
+        out.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (count, xref))
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('path')
+    parser.add_argument('--pages', type=int, default=100)
+    parser.add_argument('--lines', type=int, default=40, help='Text lines per page')
+    args = parser.parse_args()
+    write_pdf(args.path, args.pages, args.lines)
+    print(f'Wrote {args.pages} pages to {args.path}')
+
+
+if __name__ == '__main__':
+    main()
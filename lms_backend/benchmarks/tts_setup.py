@@ -0,0 +1,81 @@
+"""
+Per-document TTS setup benchmark: fresh engines vs. the persistent worker pool.
+
+Converts a number of short synthetic documents (a few chunks each) to WAV
+with tts.write_wav() and reports milliseconds per document for:
+
+  per-call   TTS_WORKERS = 0: a fresh pyttsx3 engine is started for every
+             chunk, as every conversion used to do
+  pool       TTS_WORKERS workers started and warmed up once (their start-up
+             time is reported separately), then reused for every document
+
+Short documents make the engine start-up dominate, which is the cost the
+pool removes. Needs a working pyttsx3 engine (eSpeak on Linux).
+
+    python benchmarks/tts_setup.py
+    python benchmarks/tts_setup.py --documents 20 --chunks 3 --workers 2
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+SENTENCE = 'The quick brown fox jumps over the lazy dog.'
+
+
+def document(chunks, chunk_chars):
+    """Text that splits into ``chunks`` chunks of about ``chunk_chars`` characters"""
+    sentences = max(1, chunk_chars // (len(SENTENCE) + 1))
+    return '\n\n'.join(' '.join([SENTENCE] * sentences) for _ in range(chunks))
+
+
+def convert(tts, texts):
+    start = time.perf_counter()
+    for text in texts:
+        with tempfile.TemporaryFile() as out:
+            written, failed = tts.write_wav(tts.split_text(text), out)
+            if failed:
+                sys.exit(f'{failed} chunks failed')
+    return (time.perf_counter() - start) / len(texts) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--documents', type=int, default=10)
+    parser.add_argument('--chunks', type=int, default=2, help='Chunks per document')
+    parser.add_argument('--chunk-chars', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=2, help='Pool size for the pool mode')
+    args = parser.parse_args()
+
+    from django.conf import settings
+    settings.configure(TTS_WORKERS=0, TTS_CHUNK_CHARS=args.chunk_chars, TTS_TIMEOUT=120)
+    from apps.pdf_converter import tts
+
+    texts = [document(args.chunks, args.chunk_chars) for _ in range(args.documents)]
+    print(f'{args.documents} documents x {args.chunks} chunks of ~{args.chunk_chars} characters\n')
+
+    per_call = convert(tts, texts)
+
+    settings.TTS_WORKERS = args.workers
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix='tts_warm_') as workdir:
+        # One chunk per worker, so the timed runs don't wait for engines to start
+        futures = [tts.pool.submit('Warm up.', os.path.join(workdir, f'{n}.wav')) for n in range(args.workers)]
+        for future in futures:
+            future.result()
+    warm_up = time.perf_counter() - start
+    pooled = convert(tts, texts)
+    tts.shutdown()
+
+    print(f"{'mode':<10} {'ms/document':>12}")
+    print(f"{'per-call':<10} {per_call:>12.1f}")
+    print(f"{'pool':<10} {pooled:>12.1f}   ({args.workers} workers, {warm_up:.2f}s to start once)")
+    print(f'\nsaved {per_call - pooled:.1f} ms per document ({per_call / pooled:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
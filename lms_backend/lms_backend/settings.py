@@ -4,6 +4,7 @@ Django settings for lms_backend project.
 
 from pathlib import Path
 import os
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -26,14 +27,18 @@ INSTALLED_APPS = [
     'rest_framework',
     'rest_framework.authtoken',
     'corsheaders',
+    'apps.core',
     'apps.authentication',
+    'apps.document_store',
     'apps.pdf_converter',
     'apps.quiz_system',
     'apps.pdf_analyzer',
 ]
 
 MIDDLEWARE = [
+    'apps.core.metrics.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'apps.core.query_budget.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -41,6 +46,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'apps.core.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'lms_backend.urls'
@@ -63,12 +69,115 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'lms_backend.wsgi.application'
 
+# SQLite tuned for request threads and background jobs writing concurrently:
+# WAL lets readers run during a write, IMMEDIATE transactions take the write
+# lock up front (no failing read-to-write lock upgrades) and the busy timeout
+# makes writers wait their turn instead of raising "database is locked".
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '20000'))
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', str(64 * 1024)))
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000,
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS};'
+                f'PRAGMA mmap_size={SQLITE_MMAP_SIZE};'
+                f'PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB};'
+                'PRAGMA temp_store=MEMORY;'
+            ),
+        },
+    }
+}
+
+# Cache shared by every worker process on the host, so invalidation (apps.core.cache
+# bumps a namespace version in the cache) reaches all of them: 'file' (the default).
+# 'locmem' is per process and only correct with a single worker; 'dummy' disables caching.
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'file')
+CACHE_BACKENDS = {
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', os.path.join(BASE_DIR, 'cache')),
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'lms-default'),
+    'dummy': ('django.core.cache.backends.dummy.DummyCache', ''),
+}
+if CACHE_BACKEND not in CACHE_BACKENDS:
+    raise ImproperlyConfigured(f"CACHE_BACKEND must be one of {', '.join(CACHE_BACKENDS)}")
+CACHE_TTL = int(os.getenv('CACHE_TTL', '300'))
+QUIZ_SESSIONS_CACHE_TTL = int(os.getenv('QUIZ_SESSIONS_CACHE_TTL', '30'))
+QUIZ_DETAIL_CACHE_TTL = int(os.getenv('QUIZ_DETAIL_CACHE_TTL', '600'))
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND][0],
+        'LOCATION': os.getenv('CACHE_LOCATION', CACHE_BACKENDS[CACHE_BACKEND][1]),
+        'TIMEOUT': CACHE_TTL,
     }
 }
+if CACHE_BACKEND in ('file', 'locmem'):
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '10000'))}
+
+# Background-job writes are funneled through one writer thread (apps.core.db_writer)
+DB_WRITER_MAX_BATCH = int(os.getenv('DB_WRITER_MAX_BATCH', '100'))
+DB_WRITER_MAX_WAIT_MS = int(os.getenv('DB_WRITER_MAX_WAIT_MS', '5'))
+
+# PDF-to-audio conversion queue (apps.pdf_converter.jobs). Set PDF_JOBS_IN_PROCESS=0
+# when running `manage.py conversion_worker` as a separate process instead.
+PDF_JOBS_IN_PROCESS = os.getenv('PDF_JOBS_IN_PROCESS', '1') == '1'
+PDF_JOB_WORKERS = int(os.getenv('PDF_JOB_WORKERS', '2'))
+PDF_JOB_LEASE_SECONDS = int(os.getenv('PDF_JOB_LEASE_SECONDS', '60'))
+PDF_JOB_HEARTBEAT_SECONDS = int(os.getenv('PDF_JOB_HEARTBEAT_SECONDS', '15'))
+PDF_JOB_MAX_ATTEMPTS = int(os.getenv('PDF_JOB_MAX_ATTEMPTS', '3'))
+# Conversions running at once across all processes (every web worker runs its own
+# in-process pool); 0 = no global cap
+PDF_JOB_MAX_RUNNING = int(os.getenv('PDF_JOB_MAX_RUNNING', str(PDF_JOB_WORKERS)))
+PDF_JOB_MAX_RUNNING_PER_USER = int(os.getenv('PDF_JOB_MAX_RUNNING_PER_USER', '0'))
+PDF_JOB_POLL_SECONDS = float(os.getenv('PDF_JOB_POLL_SECONDS', '2'))
+
+# PDF text extraction process pool (apps.document_store.extraction); 0 workers
+# extracts inline, unset uses one worker per CPU
+PDF_EXTRACT_WORKERS = int(os.getenv('PDF_EXTRACT_WORKERS')) if os.getenv('PDF_EXTRACT_WORKERS') else None
+PDF_EXTRACT_START_METHOD = os.getenv('PDF_EXTRACT_START_METHOD', 'spawn')
+PDF_EXTRACT_TIMEOUT = float(os.getenv('PDF_EXTRACT_TIMEOUT', '300'))
+# A stored document is claimed while extracted; others wait, polling every PDF_EXTRACT_CLAIM_POLL
+# seconds, and take over claims older than PDF_EXTRACT_CLAIM_SECONDS (a process that died)
+PDF_EXTRACT_CLAIM_SECONDS = int(os.getenv('PDF_EXTRACT_CLAIM_SECONDS', '1800'))
+PDF_EXTRACT_CLAIM_POLL = float(os.getenv('PDF_EXTRACT_CLAIM_POLL', '0.5'))
+# Documents are split into page ranges of at least this many pages, one per worker
+PDF_EXTRACT_SHARD_MIN_PAGES = int(os.getenv('PDF_EXTRACT_SHARD_MIN_PAGES', '25'))
+# ... and at most this many, so extracted text streams back in bounded pieces
+PDF_EXTRACT_SHARD_MAX_PAGES = int(os.getenv('PDF_EXTRACT_SHARD_MAX_PAGES', '100'))
+# Characters of extracted text kept on PDFDocument.text_content, served as text_preview;
+# the full text is in text_file (and at documents/<id>/text/)
+PDF_TEXT_PREVIEW_CHARS = int(os.getenv('PDF_TEXT_PREVIEW_CHARS', '5000'))
+
+# Text-to-speech (apps.pdf_converter.tts): text is split into chunks of at most
+# TTS_CHUNK_CHARS on sentence boundaries and synthesized by TTS_WORKERS persistent
+# worker processes with warm engines (0 synthesizes inline). Every web process runs
+# its own pool, so this is engines per process, not per CPU
+TTS_WORKERS = int(os.getenv('TTS_WORKERS', '2'))
+TTS_START_METHOD = os.getenv('TTS_START_METHOD', 'spawn')
+TTS_CHUNK_CHARS = int(os.getenv('TTS_CHUNK_CHARS', '1000'))
+TTS_TIMEOUT = float(os.getenv('TTS_TIMEOUT', '120'))  # seconds per chunk; the worker is restarted after
+# Idle workers are pinged every TTS_HEALTH_INTERVAL seconds and restarted if they
+# don't answer within TTS_HEALTH_TIMEOUT; if no engine can start, retry after the backoff
+TTS_HEALTH_INTERVAL = float(os.getenv('TTS_HEALTH_INTERVAL', '30'))
+TTS_HEALTH_TIMEOUT = float(os.getenv('TTS_HEALTH_TIMEOUT', '10'))
+TTS_RESTART_BACKOFF = float(os.getenv('TTS_RESTART_BACKOFF', '30'))
+TTS_RATE = int(os.getenv('TTS_RATE', '150'))
+TTS_VOLUME = float(os.getenv('TTS_VOLUME', '0.9'))
+TTS_VOICE = os.getenv('TTS_VOICE') or None  # engine voice id; the engine default when unset
+# Synthesized sentences are cached on disk by text + voice settings (LRU, bounded
+# to TTS_CACHE_MAX_BYTES; 0 disables the cache)
+TTS_CACHE_DIR = os.getenv('TTS_CACHE_DIR', os.path.join(BASE_DIR, 'tts_cache'))
+TTS_CACHE_MAX_BYTES = int(os.getenv('TTS_CACHE_MAX_BYTES', str(1024 * 1024 * 1024)))
+# Audio is also saved in segments of about TTS_SEGMENT_SECONDS as it is synthesized,
+# so playback can start during the conversion; clients poll the playlist meanwhile
+TTS_SEGMENT_SECONDS = float(os.getenv('TTS_SEGMENT_SECONDS', '60'))
+AUDIO_PLAYLIST_POLL_SECONDS = int(os.getenv('AUDIO_PLAYLIST_POLL_SECONDS', '5'))
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -119,7 +228,105 @@ CORS_ALLOW_ALL_ORIGINS = True
 
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', '')
 
+# Quiz deadlines: submissions are accepted until expires_at plus the grace period;
+# expired sessions are then auto-submitted ('submit') or abandoned ('abandon') by the sweep,
+# which each web process runs every QUIZ_SWEEP_INTERVAL seconds (apps.quiz_system.sweeper).
+# With QUIZ_SWEEP_IN_PROCESS=0, run `manage.py sweep_expired_sessions --interval N` instead.
+QUIZ_SESSION_GRACE_SECONDS = int(os.getenv('QUIZ_SESSION_GRACE_SECONDS', '30'))
+QUIZ_EXPIRED_SESSION_POLICY = os.getenv('QUIZ_EXPIRED_SESSION_POLICY', 'submit')
+QUIZ_SWEEP_IN_PROCESS = os.getenv('QUIZ_SWEEP_IN_PROCESS', '1') == '1'
+QUIZ_SWEEP_INTERVAL = float(os.getenv('QUIZ_SWEEP_INTERVAL', '60'))
+
 # AI API Key for PDF Analysis module
 AI_API_KEY = os.getenv('AI_API_KEY', '')
 
-AUTH_USER_MODEL = 'authentication.User'
\ No newline at end of file
+# Serve analyze/create_quiz/live_create with async views that await the AI
+# gateway; enable when running under an ASGI server (uvicorn lms_backend.asgi:application)
+ASYNC_AI_VIEWS = os.getenv('ASYNC_AI_VIEWS', '0') == '1'
+# Maximum in-flight Gemini calls per event loop
+AI_MAX_CONCURRENCY = int(os.getenv('AI_MAX_CONCURRENCY', '64'))
+
+AUTH_USER_MODEL = 'authentication.User'
+
+LOG_DIR = os.getenv('LOG_DIR', os.path.join(BASE_DIR, 'logs'))
+os.makedirs(LOG_DIR, exist_ok=True)
+
+# Per-request query instrumentation (apps.core.query_budget); summarize with `manage.py query_report`
+QUERY_STATS_ENABLED = os.getenv('QUERY_STATS_ENABLED', '1' if DEBUG else '0') == '1'
+QUERY_STATS_FILE = os.getenv('QUERY_STATS_FILE', os.path.join(LOG_DIR, 'query_stats.jsonl'))
+QUERY_BUDGET = {
+    'max_queries': int(os.getenv('QUERY_BUDGET_MAX_QUERIES', '50')),
+    'max_db_ms': int(os.getenv('QUERY_BUDGET_MAX_DB_MS', '500')),
+    'path_prefixes': ['/api/'],
+}
+
+# Request profiling (apps.core.profiling): staff send `X-Profile: 1` or `?profile=1`;
+# PROFILE_SAMPLE_EVERY=N also profiles one in every N API requests (0 disables sampling)
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(LOG_DIR, 'profiles'))
+PROFILE_SAMPLE_EVERY = int(os.getenv('PROFILE_SAMPLE_EVERY', '0'))
+PROFILE_KEEP_PER_ROUTE = int(os.getenv('PROFILE_KEEP_PER_ROUTE', '20'))
+
+# Prometheus metrics at /metrics (apps.core.metrics), scraped with a bearer METRICS_TOKEN;
+# without a token the endpoint is only served when DEBUG is on
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Logging: handlers below are moved behind a queue drained by one background
+# thread (apps.core.log_pipeline) so request threads never block on output.
+# Per-module levels: LOG_LEVELS="apps.pdf_converter=DEBUG,apps.quiz_system=WARNING"
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')  # 'text' or 'json'
+LOG_QUEUE_ENABLED = os.getenv('LOG_QUEUE_ENABLED', '1') == '1'
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+LOG_DEBUG_RATE = float(os.getenv('LOG_DEBUG_RATE', '10'))  # debug records per second per call site
+LOG_LEVELS = {
+    'apps.authentication': LOG_LEVEL,
+    'apps.core': LOG_LEVEL,
+    'apps.pdf_analyzer': LOG_LEVEL,
+    'apps.pdf_converter': LOG_LEVEL,
+    'apps.quiz_system': LOG_LEVEL,
+}
+LOG_LEVELS.update(
+    (name.strip(), level.strip().upper())
+    for name, level in (item.split('=', 1) for item in os.getenv('LOG_LEVELS', '').split(',') if '=' in item)
+)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+        'verbose': {'format': '%(asctime)s %(levelname)s %(name)s: %(message)s'},
+        'json': {'()': 'apps.core.log_pipeline.JsonFormatter'},
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'json' if LOG_FORMAT == 'json' else 'verbose',
+        },
+        'query_stats_file': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': QUERY_STATS_FILE,
+            'maxBytes': 50 * 1024 * 1024,
+            'backupCount': 3,
+            'formatter': 'message',
+        },
+    },
+    'root': {
+        'handlers': ['console'],
+        'level': LOG_LEVEL,
+    },
+    'loggers': {
+        **{name: {'level': level} for name, level in LOG_LEVELS.items()},
+        'apps.core.query_stats': {
+            'handlers': ['query_stats_file'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'apps.core.query_budget': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
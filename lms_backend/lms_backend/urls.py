@@ -6,6 +6,7 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from django.http import JsonResponse
+from apps.core.views import metrics
 
 def api_root(request):
     """API root endpoint providing documentation of all available endpoints"""
@@ -29,8 +30,11 @@ def api_root(request):
                     'upload': {'method': 'POST', 'url': '/api/pdf/upload/', 'description': 'Upload PDF for audio conversion'},
                     'documents': {'method': 'GET', 'url': '/api/pdf/documents/', 'description': 'List all PDF documents'},
                     'document_detail': {'method': 'GET', 'url': '/api/pdf/documents/<id>/', 'description': 'Get document details'},
+                    'document_text': {'method': 'GET', 'url': '/api/pdf/documents/<id>/text/', 'description': 'Full extracted text (plain text); document details carry a text_preview'},
                     'delete_document': {'method': 'DELETE', 'url': '/api/pdf/documents/<id>/delete/', 'description': 'Delete a document'},
-                    'retry_conversion': {'method': 'POST', 'url': '/api/pdf/documents/<id>/retry/', 'description': 'Retry PDF conversion'}
+                    'audio_playlist': {'method': 'GET', 'url': '/api/pdf/documents/<id>/audio/', 'description': 'Audio segments synthesized so far; play while the conversion runs, poll until complete'},
+                    'retry_conversion': {'method': 'POST', 'url': '/api/pdf/documents/<id>/retry/', 'description': 'Retry PDF conversion'},
+                    'conversion_queue': {'method': 'GET', 'url': '/api/pdf/queue/', 'description': 'Conversion queue depth (overall and yours)'}
                 }
             },
             'quiz_system': {
@@ -38,12 +42,19 @@ def api_root(request):
                 'endpoints': {
                     'create_quiz': {'method': 'POST', 'url': '/api/quiz/create/', 'description': 'Create a new quiz (teacher/admin)'},
                     'my_quizzes': {'method': 'GET', 'url': '/api/quiz/my-quizzes/', 'description': 'List my quizzes (teacher/admin)'},
+                    'question_bank': {'method': 'GET', 'url': '/api/quiz/bank/', 'description': 'List my question bank (teacher/admin)'},
+                    'assemble_from_bank': {'method': 'POST', 'url': '/api/quiz/bank/assemble/', 'description': 'Create a quiz from the question bank without AI generation (allow_duplicates=true fills it with near-duplicates)'},
+                    'export_bank': {'method': 'GET', 'url': '/api/quiz/bank/export/', 'description': 'Stream the question bank as JSON Lines (?gzip=1 to compress)'},
+                    'import_bank': {'method': 'POST', 'url': '/api/quiz/bank/import/', 'description': 'Import a JSON Lines (optionally gzip) file into the question bank'},
                     'quiz_detail': {'method': 'GET', 'url': '/api/quiz/<uuid>/', 'description': 'Get quiz details'},
                     'quiz_analytics': {'method': 'GET', 'url': '/api/quiz/<uuid>/analytics/', 'description': 'Get quiz analytics'},
+                    'clone_quiz': {'method': 'POST', 'url': '/api/quiz/<uuid>/clone/', 'description': 'Copy a quiz with a new quiz code'},
+                    'submit_batch': {'method': 'POST', 'url': '/api/quiz/<uuid>/submit-batch/', 'description': 'Submit many sessions\' answers at once (offline classroom sync)'},
                     'join_quiz': {'method': 'POST', 'url': '/api/quiz/join/', 'description': 'Join a quiz session'},
                     'quiz_session': {'method': 'GET', 'url': '/api/quiz/session/<uuid>/', 'description': 'Get quiz session details'},
+                    'autosave': {'method': 'POST', 'url': '/api/quiz/session/<uuid>/autosave/', 'description': 'Autosave in-progress answers (one IMMEDIATE-transaction upsert per request)'},
                     'submit_quiz': {'method': 'POST', 'url': '/api/quiz/session/<uuid>/submit/', 'description': 'Submit quiz answers'},
-                    'quiz_history': {'method': 'GET', 'url': '/api/quiz/history/', 'description': 'Get student quiz history'},
+                    'quiz_history': {'method': 'GET', 'url': '/api/quiz/history/', 'description': 'Get student quiz history (?page=N, or ?cursor= for keyset pages)'},
                     'list_sessions': {'method': 'GET', 'url': '/api/quiz/sessions/', 'description': 'List quiz sessions'},
                     'completed_sessions': {'method': 'GET', 'url': '/api/quiz/sessions/completed/', 'description': 'List completed sessions'}
                 }
@@ -57,6 +68,10 @@ def api_root(request):
                     'documents': {'method': 'GET', 'url': '/api/pdf-analysis/documents', 'description': 'List all uploaded PDF documents for the current user.'}
                 }
             },
+            'metrics': {
+                'url': '/metrics',
+                'description': 'Prometheus metrics (Bearer METRICS_TOKEN; without a token only with DEBUG on)'
+            },
             'admin': {
                 'base_url': '/admin/',
                 'description': 'Django admin interface'
@@ -67,6 +82,7 @@ def api_root(request):
 urlpatterns = [
     path('', api_root, name='api_root'),
     path('admin/', admin.site.urls),
+    path('metrics', metrics, name='metrics'),
     path('api/auth/', include('apps.authentication.urls')),
     path('api/pdf/', include('apps.pdf_converter.urls')),
     path('api/quiz/', include('apps.quiz_system.urls')),